@@ -0,0 +1,66 @@
+"""
+Micro-benchmark of the pandas column analyzers on a wide sample: a 1000-row sample
+(the pandas engine's sample size) of a 1000-column table mixing integers, floats,
+decimals, dates, timestamps, emails, URLs, categories and free text.
+
+Run from the backend directory:
+
+    python benchmarks/bench_schema_analyzer.py [--columns 1000] [--rows 1000] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import time
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from schema_analyzer import SchemaAnalyzer  # noqa: E402
+
+
+def build_fixture(columns: int, rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("2024-01-01")
+    generators = [
+        lambda i: rng.integers(0, 1000000, rows),
+        lambda i: rng.normal(100, 15, rows),
+        lambda i: [Decimal(f"{value:.2f}") for value in rng.random(rows) * 100],
+        lambda i: pd.Series(start + rng.integers(0, 365, rows)).dt.strftime("%Y-%m-%d").tolist(),
+        lambda i: start + np.arange(rows).astype("timedelta64[h]"),
+        lambda i: [f"user{n}@example.com" for n in rng.integers(0, 10 ** 6, rows)],
+        lambda i: [f"https://example.com/p/{n}" for n in rng.integers(0, 10 ** 6, rows)],
+        lambda i: rng.choice(["north", "south", "east", "west"], rows),
+        lambda i: [f"free text value {n} " * (n % 5 + 1) for n in rng.integers(0, 10 ** 6, rows)],
+    ]
+    data = {}
+    for i in range(columns):
+        values = pd.Series(generators[i % len(generators)](i))
+        values[rng.random(rows) < 0.05] = None
+        data[f"col_{i}_{'name' if i % 7 == 0 else 'value'}"] = values
+    return pd.DataFrame(data)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--columns", type=int, default=1000)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = build_fixture(args.columns, args.rows)
+    analyzer = SchemaAnalyzer(None, stats_engine="pandas")
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        analyzer._analyze_columns(df, list(df.columns))
+        timings.append(time.perf_counter() - started)
+    best = min(timings)
+    print(f"{args.columns} columns x {args.rows} rows: best {best:.3f}s of {args.repeat} "
+          f"({best / args.columns * 1000:.2f} ms/column)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+# bulk_loader.py
+import io
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional, Union
+
+import pandas as pd
+import psycopg2.extras
+from psycopg2 import sql as pg_sql
+
+logger = logging.getLogger(__name__)
+
+# dtype kinds that DataFrame.to_csv renders in a form PostgreSQL's CSV COPY parser accepts:
+# bool, signed/unsigned int (including the nullable Int64/boolean dtypes), float,
+# datetime64 and object (str / NaN) columns.
+COPY_SAFE_KINDS = {"b", "i", "u", "f", "M", "O"}
+
+CSV_NA_VALUES = [
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN',
+    '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>', 'N/A',
+    'NA', 'NULL', 'NaN', 'n/a', 'nan', 'null'
+]
+
+CsvSource = Union[bytes, str, Path]
+
+
+class CsvChunkReader:
+    """
+    Parses a CSV source (spooled file path or in-memory bytes) in fixed-size chunks
+    sized so that a parsed chunk plus its COPY buffer stays within a memory budget
+    """
+
+    # Parsed frame + to_csv buffer + COPY send buffer for one chunk
+    OVERHEAD_FACTOR = 3
+    SAMPLE_ROWS = 1000
+    MIN_CHUNK_ROWS = 1000
+
+    def __init__(self, source: CsvSource, memory_budget_bytes: int, max_chunk_rows: Optional[int] = None):
+        self.source = source
+        self.memory_budget_bytes = max(1, int(memory_budget_bytes))
+        self.max_chunk_rows = max_chunk_rows
+        self.chunk_rows: Optional[int] = None
+
+    def size_bytes(self) -> int:
+        if isinstance(self.source, bytes):
+            return len(self.source)
+        return os.path.getsize(self.source)
+
+    def head(self, n_bytes: int = 100) -> bytes:
+        if isinstance(self.source, bytes):
+            return self.source[:n_bytes]
+        with open(self.source, "rb") as f:
+            return f.read(n_bytes)
+
+    def estimate_total_rows(self) -> int:
+        """
+        Rough row count from the average raw line length of the first sample lines
+        """
+        head = self.head(256 * 1024)
+        lines = head.splitlines()[1:self.SAMPLE_ROWS + 1]
+        if not lines:
+            return 0
+        bytes_per_row = max(1.0, sum(len(line) + 1 for line in lines) / len(lines))
+        return int(max(0, self.size_bytes() - len(head.split(b"\n", 1)[0]) - 1) / bytes_per_row)
+
+    def _open(self):
+        if isinstance(self.source, bytes):
+            return io.BytesIO(self.source)
+        return self.source
+
+    def _read_csv(self, **kwargs):
+        return pd.read_csv(
+            self._open(),
+            keep_default_na=True,
+            na_values=CSV_NA_VALUES,
+            skip_blank_lines=True,
+            **kwargs
+        )
+
+    def estimate_chunk_rows(self) -> int:
+        """
+        Size chunks from the in-memory footprint of a small parsed sample
+        """
+        sample = self._read_csv(nrows=self.SAMPLE_ROWS)
+        if sample.empty:
+            rows = self.MIN_CHUNK_ROWS
+        else:
+            bytes_per_row = max(1.0, sample.memory_usage(index=False, deep=True).sum() / len(sample))
+            rows = int(self.memory_budget_bytes / (bytes_per_row * self.OVERHEAD_FACTOR))
+        rows = max(self.MIN_CHUNK_ROWS, rows)
+        if self.max_chunk_rows:
+            rows = min(rows, self.max_chunk_rows)
+        return rows
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        self.chunk_rows = self.estimate_chunk_rows()
+        logger.info(f"Parsing CSV in chunks of {self.chunk_rows} rows "
+                    f"(budget {self.memory_budget_bytes // (1024 * 1024)} MB)")
+        with self._read_csv(chunksize=self.chunk_rows) as reader:
+            for chunk in reader:
+                yield chunk
+
+
+class BulkLoader:
+    """
+    Loads pandas DataFrames into PostgreSQL using COPY FROM STDIN (CSV format),
+    falling back to per-row INSERTs for column types COPY cannot take verbatim
+    """
+
+    def __init__(self, db_connection, chunk_size: int = 50000, engine: str = "copy"):
+        self.connection = db_connection
+        self.chunk_size = max(1, int(chunk_size))
+        self.engine = engine
+
+    def supports_copy(self, df: pd.DataFrame) -> bool:
+        """
+        Check whether every column of the frame can be streamed through COPY
+        """
+        return all(dtype.kind in COPY_SAFE_KINDS for dtype in df.dtypes)
+
+    def load(self, table_name: str, df: pd.DataFrame) -> Dict[str, Any]:
+        """
+        Insert the frame into an existing table and return throughput stats.
+        The caller owns the transaction (nothing is committed here).
+        """
+        engine = self.engine
+        if engine == "copy" and not self.supports_copy(df):
+            unsupported = [str(col) for col, dtype in df.dtypes.items() if dtype.kind not in COPY_SAFE_KINDS]
+            logger.info(f"COPY cannot handle columns {unsupported}; using per-row inserts")
+            engine = "rows"
+
+        started = time.perf_counter()
+        cursor = self.connection.cursor()
+        if engine == "copy":
+            rows = self._copy_frame(cursor, table_name, df)
+        else:
+            rows = self._insert_rows(cursor, table_name, df)
+        elapsed = time.perf_counter() - started
+
+        stats = {
+            "engine": engine,
+            "rows": rows,
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(rows / elapsed, 1) if elapsed > 0 else float(rows),
+        }
+        logger.info(
+            f"Loaded {rows} rows into {table_name} via {engine} "
+            f"in {stats['seconds']}s ({stats['rows_per_second']} rows/sec)"
+        )
+        return stats
+
+    def _copy_statement(self, table_name: str, columns: List[str]) -> pg_sql.Composed:
+        column_list = pg_sql.SQL(", ").join(pg_sql.Identifier(col) for col in columns)
+        # Unquoted empty fields are NULL; FORCE_NULL also maps quoted "" to NULL, which
+        # matches read_csv treating empty strings as NaN.
+        return pg_sql.SQL(
+            "COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL '', FORCE_NULL ({}))"
+        ).format(pg_sql.Identifier(table_name), column_list, column_list)
+
+    def _copy_frame(self, cursor, table_name: str, df: pd.DataFrame) -> int:
+        """
+        Stream the frame in chunks; NaN/None/NaT are written as empty fields by to_csv
+        """
+        columns = [str(col) for col in df.columns]
+        statement = self._copy_statement(table_name, columns).as_string(cursor)
+        total_rows = len(df)
+        rows_copied = 0
+
+        for start in range(0, total_rows, self.chunk_size):
+            chunk = df.iloc[start:start + self.chunk_size]
+            buffer = io.StringIO()
+            chunk.to_csv(buffer, index=False, header=False, na_rep="")
+            buffer.seek(0)
+            cursor.copy_expert(statement, buffer)
+            rows_copied += len(chunk)
+            logger.info(f"Copied {rows_copied}/{total_rows} rows")
+
+        return rows_copied
+
+    def _insert_rows(self, cursor, table_name: str, df: pd.DataFrame) -> int:
+        """
+        Per-row fallback for frames containing types COPY cannot render (e.g. timedelta)
+        """
+        columns_str = pg_sql.SQL(", ").join(pg_sql.Identifier(str(col)) for col in df.columns)
+        insert_sql = pg_sql.SQL("INSERT INTO {} ({}) VALUES %s").format(
+            pg_sql.Identifier(table_name), columns_str
+        ).as_string(cursor)
+
+        # Map NaN/NaT to None in one vectorized pass instead of per value
+        values = df.astype(object).where(pd.notna(df), None)
+        rows_inserted = 0
+        for start in range(0, len(values), self.chunk_size):
+            chunk = values.iloc[start:start + self.chunk_size]
+            psycopg2.extras.execute_values(
+                cursor, insert_sql, chunk.itertuples(index=False, name=None), page_size=1000
+            )
+            rows_inserted += len(chunk)
+            logger.info(f"Inserted {rows_inserted} rows so far")
+        return rows_inserted
@@ -0,0 +1,148 @@
+# catalog_snapshot.py
+import hashlib
+from collections import defaultdict
+from typing import Dict, Any, Iterable, List, Optional
+
+
+class CatalogSnapshot:
+    """
+    In-memory copy of the columns, types, primary keys and foreign keys of every table
+    in a schema, read from pg_catalog in three queries. Column rows use the
+    information_schema.columns field names and data_type spellings so analyzer code
+    can use them interchangeably.
+    """
+
+    COLUMNS_QUERY = """
+        SELECT
+            c.relname AS table_name,
+            a.attname AS column_name,
+            CASE
+                WHEN t.typcategory = 'A' THEN 'ARRAY'
+                WHEN t.typtype = 'd' THEN format_type(t.typbasetype, NULL)
+                WHEN t.typtype IN ('e', 'c', 'r', 'm') OR tn.nspname <> 'pg_catalog' THEN 'USER-DEFINED'
+                ELSE format_type(a.atttypid, NULL)
+            END AS data_type,
+            CASE WHEN a.attnotnull THEN 'NO' ELSE 'YES' END AS is_nullable,
+            information_schema._pg_char_max_length(a.atttypid, a.atttypmod) AS character_maximum_length,
+            information_schema._pg_numeric_precision(a.atttypid, a.atttypmod) AS numeric_precision,
+            information_schema._pg_numeric_scale(a.atttypid, a.atttypmod) AS numeric_scale,
+            col_description(c.oid, a.attnum) AS description
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+        JOIN pg_type t ON t.oid = a.atttypid
+        JOIN pg_namespace tn ON tn.oid = t.typnamespace
+        WHERE n.nspname = %s AND c.relkind IN ('r', 'p', 'v', 'f')
+        ORDER BY c.relname, a.attnum
+    """
+
+    # Primary and foreign keys, one row per key column (composite keys keep their column pairing)
+    KEYS_QUERY = """
+        SELECT
+            con.contype,
+            src.relname AS table_name,
+            sa.attname AS column_name,
+            dst.relname AS foreign_table_name,
+            da.attname AS foreign_column_name
+        FROM pg_constraint con
+        JOIN pg_class src ON src.oid = con.conrelid
+        JOIN pg_namespace n ON n.oid = src.relnamespace
+        CROSS JOIN LATERAL unnest(con.conkey, con.confkey) WITH ORDINALITY AS k(src_attnum, dst_attnum, ord)
+        JOIN pg_attribute sa ON sa.attrelid = con.conrelid AND sa.attnum = k.src_attnum
+        LEFT JOIN pg_class dst ON dst.oid = con.confrelid
+        LEFT JOIN pg_attribute da ON da.attrelid = con.confrelid AND da.attnum = k.dst_attnum
+        WHERE n.nspname = %s AND con.contype IN ('p', 'f')
+        ORDER BY src.relname, con.conname, k.ord
+    """
+
+    # Physical file (changes on TRUNCATE / rewrite / table swap) and cumulative row
+    # modification counters of every table; views have no signature
+    SIGNATURES_QUERY = """
+        SELECT
+            c.relname AS table_name,
+            c.relkind,
+            c.relfilenode,
+            COALESCE(s.n_tup_ins, 0) AS n_tup_ins,
+            COALESCE(s.n_tup_upd, 0) AS n_tup_upd,
+            COALESCE(s.n_tup_del, 0) AS n_tup_del
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+        WHERE n.nspname = %s AND c.relkind IN ('r', 'p', 'v', 'f')
+    """
+
+    def __init__(self, columns: Iterable[Dict[str, Any]], keys: Iterable[Dict[str, Any]],
+                 signatures: Optional[Iterable[Dict[str, Any]]] = None):
+        self._columns: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for col in columns:
+            self._columns[col["table_name"]].append(dict(col))
+        self._primary_keys: Dict[str, List[str]] = defaultdict(list)
+        self._foreign_keys: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for key in keys:
+            if key["contype"] == "p":
+                self._primary_keys[key["table_name"]].append(key["column_name"])
+            else:
+                self._foreign_keys[key["table_name"]].append({
+                    "column_name": key["column_name"],
+                    "foreign_table_name": key["foreign_table_name"],
+                    "foreign_column_name": key["foreign_column_name"],
+                })
+        self._signatures: Dict[str, str] = {}
+        for row in signatures or []:
+            if row["relkind"] in ("r", "p"):
+                self._signatures[row["table_name"]] = ":".join(str(part) for part in (
+                    row["relfilenode"], row["n_tup_ins"], row["n_tup_upd"], row["n_tup_del"],
+                    self._columns_digest(row["table_name"]),
+                ))
+
+    @classmethod
+    def load(cls, db_connection, schema: str = "public") -> "CatalogSnapshot":
+        cursor = db_connection.cursor()
+        cursor.execute(cls.COLUMNS_QUERY, (schema,))
+        columns = cursor.fetchall()
+        cursor.execute(cls.KEYS_QUERY, (schema,))
+        keys = cursor.fetchall()
+        # Statistics views are cached for the rest of a transaction; read current counters
+        cursor.execute("SELECT pg_stat_clear_snapshot()")
+        cursor.execute(cls.SIGNATURES_QUERY, (schema,))
+        signatures = cursor.fetchall()
+        return cls(columns, keys, signatures)
+
+    def _columns_digest(self, table_name: str) -> str:
+        definition = "|".join(
+            f"{col['column_name']} {col['data_type']} {col['is_nullable']}" for col in self.columns(table_name)
+        )
+        return hashlib.md5(definition.encode()).hexdigest()[:12]
+
+    def table_signature(self, table_name: str) -> Optional[str]:
+        """
+        Changes whenever the table's rows or column definitions change (None for views,
+        whose contents cannot be tracked this way)
+        """
+        return self._signatures.get(table_name)
+
+    def table_names(self) -> List[str]:
+        return list(self._columns)
+
+    def has_table(self, table_name: str) -> bool:
+        return table_name in self._columns
+
+    def columns(self, table_name: str) -> List[Dict[str, Any]]:
+        return self._columns.get(table_name, [])
+
+    def column_names(self, table_name: str) -> List[str]:
+        return [col["column_name"] for col in self.columns(table_name)]
+
+    def columns_of_type(self, table_name: str, data_types: Iterable[str]) -> List[str]:
+        data_types = set(data_types)
+        return [col["column_name"] for col in self.columns(table_name) if col["data_type"] in data_types]
+
+    def primary_keys(self, table_name: str) -> List[str]:
+        return list(self._primary_keys.get(table_name, []))
+
+    def foreign_keys(self, table_name: str) -> List[Dict[str, Any]]:
+        return list(self._foreign_keys.get(table_name, []))
+
+    def first_foreign_key(self, table_name: str) -> Optional[Dict[str, Any]]:
+        foreign_keys = self._foreign_keys.get(table_name)
+        return foreign_keys[0] if foreign_keys else None
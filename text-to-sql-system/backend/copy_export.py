@@ -0,0 +1,132 @@
+# copy_export.py
+import logging
+import queue
+import threading
+import zlib
+from typing import Iterator, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+
+class ExportBudgetExceeded(Exception):
+    """
+    The export produced more bytes than its budget allows
+    """
+
+
+class ExportCancelled(Exception):
+    """
+    The consumer stopped reading (e.g. the client disconnected)
+    """
+
+
+_DONE = object()
+
+
+class CopyExport:
+    """
+    Runs `COPY (...) TO STDOUT` on a worker thread and hands its output over in chunks.
+
+    COPY rows go straight from the connection into a byte buffer (gzip-compressed when
+    `compress` is set) without being parsed into Python values. At most `queue_chunks`
+    chunks wait for the consumer, so a slow client slows the COPY down instead of
+    growing memory. Output beyond `max_bytes` (uncompressed) aborts the export.
+    """
+
+    def __init__(self, conn, copy_sql: str, max_bytes: int, compress: bool = True,
+                 chunk_bytes: int = 256 * 1024, queue_chunks: int = 8):
+        self.conn = conn
+        self.copy_sql = copy_sql
+        self.max_bytes = max_bytes
+        self.chunk_bytes = chunk_bytes
+        self.bytes_copied = 0
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        self._buffer: list = []
+        self._buffered = 0
+        self._queue: "queue.Queue[Union[bytes, BaseException, object]]" = queue.Queue(maxsize=queue_chunks)
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "CopyExport":
+        self._thread = threading.Thread(target=self._run, name="copy-export", daemon=True)
+        self._thread.start()
+        return self
+
+    # File interface used by cursor.copy_expert
+    def write(self, data: Union[bytes, str]) -> int:
+        if self._stopped.is_set():
+            raise ExportCancelled("Export cancelled")
+        if isinstance(data, str):
+            data = data.encode()
+        self.bytes_copied += len(data)
+        if self.bytes_copied > self.max_bytes:
+            raise ExportBudgetExceeded(f"Export exceeds its budget of {self.max_bytes // (1024 * 1024)} MB")
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self.chunk_bytes:
+            self._flush()
+        return len(data)
+
+    def _flush(self, final: bool = False) -> None:
+        data = b"".join(self._buffer)
+        self._buffer, self._buffered = [], 0
+        if self._compressor is not None:
+            data = self._compressor.compress(data) + (self._compressor.flush() if final else b"")
+        if data:
+            self._put(data)
+
+    def _put(self, item) -> None:
+        while True:
+            try:
+                self._queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                if self._stopped.is_set():
+                    raise ExportCancelled("Export cancelled")
+
+    def _run(self) -> None:
+        try:
+            self.conn.cursor().copy_expert(self.copy_sql, self)
+            self._flush(final=True)
+            self._put(_DONE)
+        except BaseException as e:
+            try:
+                self._put(e)
+            except ExportCancelled:
+                pass
+
+    def next_chunk(self) -> Optional[bytes]:
+        """
+        Next output chunk, or None once the export is complete; errors of the COPY
+        (or a blown budget) are raised here
+        """
+        item = self._queue.get()
+        if item is _DONE:
+            return None
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    def chunks(self) -> Iterator[bytes]:
+        while True:
+            chunk = self.next_chunk()
+            if chunk is None:
+                return
+            yield chunk
+
+    def cancel(self) -> None:
+        """
+        Stop the export: the COPY is cancelled on the server and the worker thread exits
+        """
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        if self._thread is not None and self._thread.is_alive():
+            try:
+                self.conn.cancel()
+            except Exception as e:
+                logger.warning(f"Could not cancel export query: {str(e)}")
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -0,0 +1,255 @@
+# cpu_pool.py
+import asyncio
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CpuTaskCancelled(Exception):
+    """
+    The task was cancelled (e.g. its client disconnected) before it finished
+    """
+
+
+class CpuPoolBusy(Exception):
+    """
+    No memory could be reserved for the task within the admission timeout
+    """
+
+
+class TaskChannel:
+    """
+    Picklable link between a task running in a worker process and its submitter: the
+    task reports progress through it, and each report checks for cancellation
+    """
+
+    def __init__(self, cancel_event, progress_queue=None):
+        self.cancel_event = cancel_event
+        self.progress_queue = progress_queue
+
+    def report(self, stage: Optional[str] = None, **kwargs) -> None:
+        if self.cancel_event.is_set():
+            raise CpuTaskCancelled("Task cancelled")
+        if self.progress_queue is not None:
+            self.progress_queue.put_nowait({"stage": stage, **kwargs})
+
+    def cancel(self) -> None:
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+
+def available_memory_bytes() -> Optional[int]:
+    """
+    MemAvailable from /proc/meminfo, or None where it cannot be read
+    """
+    try:
+        with open("/proc/meminfo") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class MemoryAdmission:
+    """
+    Admits tasks while their declared memory fits both the pool's budget and the memory the
+    system still has available. A task larger than the budget runs once nothing else does.
+    """
+
+    def __init__(self, budget_bytes: int, memory_probe: Callable[[], Optional[int]] = available_memory_bytes):
+        self.budget_bytes = budget_bytes
+        self.memory_probe = memory_probe
+        self.reserved_bytes = 0
+        self.running = 0
+        self._condition = threading.Condition()
+
+    def _fits(self, nbytes: int) -> bool:
+        if self.running == 0:
+            return True
+        if self.reserved_bytes + nbytes > self.budget_bytes:
+            return False
+        available = self.memory_probe()
+        return available is None or available >= nbytes
+
+    def acquire(self, nbytes: int, timeout: float) -> None:
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while not self._fits(nbytes):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise CpuPoolBusy(
+                        f"Could not reserve {nbytes // (1024 * 1024)} MB within {timeout:.0f}s "
+                        f"({self.reserved_bytes // (1024 * 1024)} MB reserved by {self.running} task(s))"
+                    )
+                # Re-check periodically: system memory can free up without a release()
+                self._condition.wait(min(remaining, 1.0))
+            self.reserved_bytes += nbytes
+            self.running += 1
+
+    def release(self, nbytes: int) -> None:
+        with self._condition:
+            self.reserved_bytes -= nbytes
+            self.running -= 1
+            self._condition.notify_all()
+
+
+class CpuWorkerPool:
+    """
+    Runs CPU-bound pipeline stages (CSV parsing, type inference, column analysis) in worker
+    processes so they neither block the event loop nor compete with it for the GIL.
+
+    A task is a module-level function called as fn(*args, channel=TaskChannel). With
+    max_workers=0 tasks run in a thread of this process instead.
+    """
+
+    def __init__(self, max_workers: int = 2, memory_budget_bytes: int = 1024 * 1024 * 1024,
+                 admission_timeout_s: float = 60.0, poll_interval_s: float = 0.2):
+        self.max_workers = max_workers
+        self.admission = MemoryAdmission(memory_budget_bytes)
+        self.admission_timeout_s = admission_timeout_s
+        self.poll_interval_s = poll_interval_s
+        self._context = multiprocessing.get_context("spawn")
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._manager = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            # A worker that died (e.g. killed for memory) leaves the executor broken; replace it
+            if self._executor is None or getattr(self._executor, "_broken", False):
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=self._context)
+            return self._executor
+
+    def _reset_executor(self, broken: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _channel(self, with_progress: bool) -> TaskChannel:
+        if self.max_workers <= 0:
+            return TaskChannel(threading.Event(), queue.SimpleQueue() if with_progress else None)
+        with self._lock:
+            if self._manager is None:
+                self._manager = self._context.Manager()
+            manager = self._manager
+        return TaskChannel(manager.Event(), manager.Queue() if with_progress else None)
+
+    def _submit(self, fn: Callable[..., Any], args: tuple, channel: TaskChannel) -> Future:
+        if self.max_workers <= 0:
+            future: Future = Future()
+            threading.Thread(target=self._run_inline, args=(future, fn, args, channel),
+                             name="cpu-task", daemon=True).start()
+            return future
+        executor = self._get_executor()
+        try:
+            return executor.submit(fn, *args, channel=channel)
+        except BrokenProcessPool:
+            self._reset_executor(executor)
+            return self._get_executor().submit(fn, *args, channel=channel)
+
+    @staticmethod
+    def _run_inline(future: Future, fn: Callable[..., Any], args: tuple, channel: TaskChannel) -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args, channel=channel))
+        except BaseException as e:
+            future.set_exception(e)
+
+    def _result(self, future: Future, channel: TaskChannel) -> Any:
+        """
+        Result of a finished task; a task that failed after being cancelled counts as cancelled
+        """
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            raise RuntimeError("A worker process died (possibly out of memory) while running the task")
+        except Exception:
+            if channel.cancelled:
+                raise CpuTaskCancelled("Task cancelled")
+            raise
+
+    @staticmethod
+    def _drain(channel: TaskChannel, progress: Optional[Callable[..., None]]) -> None:
+        if progress is None or channel.progress_queue is None:
+            return
+        while True:
+            try:
+                update = channel.progress_queue.get_nowait()
+            except (queue.Empty, EOFError, OSError):
+                return
+            progress(**update)
+
+    def _start(self, fn: Callable[..., Any], args: tuple, memory_bytes: int, with_progress: bool):
+        """
+        Submit an admitted task; its memory reservation is released when the task finishes
+        (not when its caller stops waiting)
+        """
+        try:
+            channel = self._channel(with_progress)
+            future = self._submit(fn, args, channel)
+        except BaseException:
+            self.admission.release(memory_bytes)
+            raise
+        future.add_done_callback(lambda _: self.admission.release(memory_bytes))
+        return future, channel
+
+    def run_blocking(self, fn: Callable[..., Any], *args, memory_bytes: int,
+                     progress: Optional[Callable[..., None]] = None,
+                     is_cancelled: Optional[Callable[[], bool]] = None) -> Any:
+        """
+        Run a task from a worker thread (e.g. a background ingestion job), forwarding its
+        progress reports and cancelling it once `is_cancelled()` returns True
+        """
+        self.admission.acquire(memory_bytes, self.admission_timeout_s)
+        future, channel = self._start(fn, args, memory_bytes, with_progress=progress is not None)
+        while not wait([future], timeout=self.poll_interval_s).done:
+            self._drain(channel, progress)
+            if is_cancelled and not channel.cancelled and is_cancelled():
+                logger.info("Cancelling CPU task")
+                channel.cancel()
+        self._drain(channel, progress)
+        return self._result(future, channel)
+
+    async def run(self, fn: Callable[..., Any], *args, memory_bytes: int,
+                  is_cancelled: Optional[Callable[[], Awaitable[bool]]] = None) -> Any:
+        """
+        Run a task from the event loop; the loop stays free while the task queues for memory
+        and runs. The task is cancelled once `await is_cancelled()` returns True (e.g.
+        Request.is_disconnected) or when the awaiting coroutine itself is cancelled.
+        """
+        await asyncio.to_thread(self.admission.acquire, memory_bytes, self.admission_timeout_s)
+        future, channel = await asyncio.to_thread(self._start, fn, args, memory_bytes, False)
+        try:
+            while not future.done():
+                await asyncio.wait({asyncio.wrap_future(future)}, timeout=self.poll_interval_s)
+                if not future.done() and is_cancelled and not channel.cancelled and await is_cancelled():
+                    logger.info("Client disconnected; cancelling CPU task")
+                    channel.cancel()
+        except asyncio.CancelledError:
+            channel.cancel()
+            future.cancel()
+            raise
+        return self._result(future, channel)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, manager = self._executor, self._manager
+            self._executor = self._manager = None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if manager:
+            manager.shutdown()
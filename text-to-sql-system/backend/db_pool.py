@@ -0,0 +1,266 @@
+# db_pool.py
+import asyncio
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class PoolTimeout(Exception):
+    """
+    No connection became available within the acquisition timeout
+    """
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """
+    psycopg2 connection whose close() hands it back to its pool, so code written
+    against the connect/close pattern reuses connections without changes
+    """
+
+    _pool: Optional["DatabasePool"] = None
+    _checked_out = False
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.putconn(self)
+        else:
+            super().close()
+
+
+class DatabasePool:
+    """
+    Thread-safe pool of psycopg2 connections (RealDictCursor by default).
+
+    Connections are opened on demand up to `max_size` and kept idle down to `min_size`;
+    callers beyond `max_size` wait up to `acquire_timeout_s`. A connection idle for longer
+    than `health_check_after_s` is pinged before reuse, and one idle for longer than
+    `max_idle_s` is closed while the pool is above `min_size`. Returned connections are
+    rolled back and get the pool's `autocommit` mode back, so session settings must be
+    made with SET LOCAL; settings every connection needs belong in the connect options.
+
+    Async handlers use `await pool.run(fn, *args)`, which runs fn(conn, *args) on a
+    pooled connection in a worker thread and keeps the event loop free.
+    """
+
+    def __init__(self, min_size: int = 1, max_size: int = 10, acquire_timeout_s: float = 5.0,
+                 health_check_after_s: float = 30.0, max_idle_s: float = 600.0, autocommit: bool = False,
+                 **connect_kwargs):
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max(1, max_size)
+        self.acquire_timeout_s = acquire_timeout_s
+        self.health_check_after_s = health_check_after_s
+        self.max_idle_s = max_idle_s
+        self.autocommit = autocommit
+        self.connect_kwargs = connect_kwargs
+        # Most recently returned last: reuse hot connections, let cold ones age out
+        self._idle: List[Tuple[PooledConnection, float]] = []
+        self._size = 0
+        self._waiting = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._stats = {
+            "acquired": 0, "created": 0, "discarded": 0, "timeouts": 0,
+            "health_check_failures": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0,
+        }
+
+    def _connect(self) -> PooledConnection:
+        conn = psycopg2.connect(connection_factory=PooledConnection, **self.connect_kwargs)
+        conn.cursor_factory = psycopg2.extras.RealDictCursor
+        conn.autocommit = self.autocommit
+        conn._pool = self
+        return conn
+
+    @staticmethod
+    def _close_quietly(conn: PooledConnection) -> None:
+        try:
+            psycopg2.extensions.connection.close(conn)
+        except Exception:
+            pass
+
+    @staticmethod
+    def _is_healthy(conn: PooledConnection) -> bool:
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            if not conn.autocommit:
+                conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def open(self) -> None:
+        """
+        Open `min_size` connections up front (otherwise they are opened on first use)
+        """
+        conns = []
+        with self._condition:
+            missing = self.min_size - self._size
+            self._size += max(0, missing)
+        try:
+            for _ in range(max(0, missing)):
+                conns.append(self._connect())
+        finally:
+            with self._condition:
+                self._size -= max(0, missing) - len(conns)
+                self._stats["created"] += len(conns)
+                now = time.monotonic()
+                self._idle.extend((conn, now) for conn in conns)
+                self._condition.notify_all()
+
+    def getconn(self, timeout: Optional[float] = None) -> PooledConnection:
+        """
+        Take a connection, waiting up to `timeout` (default: the pool's acquisition
+        timeout) when all `max_size` connections are in use
+        """
+        timeout = self.acquire_timeout_s if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        while True:
+            with self._condition:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+                self._waiting += 1
+                try:
+                    while not self._idle and self._size >= self.max_size:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._stats["timeouts"] += 1
+                            raise PoolTimeout(
+                                f"No database connection available within {timeout:.1f}s "
+                                f"({self._size} in use, max {self.max_size})"
+                            )
+                        self._condition.wait(remaining)
+                finally:
+                    self._waiting -= 1
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                else:
+                    conn, idle_since = None, None
+                    self._size += 1
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._condition:
+                        self._size -= 1
+                        self._condition.notify()
+                    raise
+                with self._condition:
+                    self._stats["created"] += 1
+            elif conn.closed or (time.monotonic() - idle_since > self.health_check_after_s
+                                 and not self._is_healthy(conn)):
+                logger.info("Discarding broken pooled database connection")
+                with self._condition:
+                    self._stats["health_check_failures"] += 1
+                self._discard(conn)
+                continue
+
+            conn._checked_out = True
+            waited_ms = (time.monotonic() - started) * 1000
+            with self._condition:
+                self._stats["acquired"] += 1
+                self._stats["wait_ms_total"] += waited_ms
+                self._stats["wait_ms_max"] = max(self._stats["wait_ms_max"], waited_ms)
+            return conn
+
+    def _discard(self, conn: PooledConnection) -> None:
+        self._close_quietly(conn)
+        with self._condition:
+            self._size -= 1
+            self._stats["discarded"] += 1
+            self._condition.notify()
+
+    def putconn(self, conn: PooledConnection) -> None:
+        """
+        Return a connection: its open transaction is rolled back, and a connection that
+        is broken (or that the pool no longer needs) is closed
+        """
+        if not conn._checked_out:
+            # Already returned (e.g. closed twice)
+            return
+        conn._checked_out = False
+        try:
+            status = conn.info.transaction_status
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                raise psycopg2.InterfaceError("connection is broken")
+            if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            if conn.autocommit != self.autocommit:
+                conn.autocommit = self.autocommit
+        except Exception:
+            self._discard(conn)
+            return
+
+        now = time.monotonic()
+        expired = []
+        with self._condition:
+            if self._closed:
+                expired.append(conn)
+            else:
+                self._idle.append((conn, now))
+                # Age out the coldest connections above min_size
+                while (len(self._idle) > 1 and self._size - len(expired) > self.min_size
+                       and now - self._idle[0][1] > self.max_idle_s):
+                    expired.append(self._idle.pop(0)[0])
+            self._size -= len(expired)
+            self._stats["discarded"] += len(expired)
+            self._condition.notify()
+        for stale in expired:
+            self._close_quietly(stale)
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None) -> Iterator[PooledConnection]:
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def call(self, fn: Callable[..., T], *args: Any) -> T:
+        with self.connection() as conn:
+            return fn(conn, *args)
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        """
+        Run fn(conn, *args) on a pooled connection in a worker thread
+        """
+        return await asyncio.to_thread(self.call, fn, *args)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._condition:
+            acquired = self._stats["acquired"]
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "waiting": self._waiting,
+                "acquired": acquired,
+                "created": self._stats["created"],
+                "discarded": self._stats["discarded"],
+                "timeouts": self._stats["timeouts"],
+                "health_check_failures": self._stats["health_check_failures"],
+                "wait_ms_avg": round(self._stats["wait_ms_total"] / acquired, 2) if acquired else 0.0,
+                "wait_ms_max": round(self._stats["wait_ms_max"], 2),
+            }
+
+    def closeall(self) -> None:
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._condition.notify_all()
+        for conn, _ in idle:
+            self._close_quietly(conn)
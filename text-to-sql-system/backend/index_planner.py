@@ -0,0 +1,170 @@
+# index_planner.py
+import hashlib
+import logging
+from typing import Dict, Any, List, Optional
+
+from psycopg2 import sql as pg_sql
+
+logger = logging.getLogger(__name__)
+
+
+class IndexPlanner:
+    """
+    Plans and creates indexes for an uploaded table from the SchemaAnalyzer column
+    statistics and PostgreSQL's planner statistics (pg_stats, refreshed by ANALYZE)
+    """
+
+    # BRIN only beats a B-tree on large tables whose rows are stored in value order
+    BRIN_MIN_ROWS = 100000
+    BRIN_MIN_CORRELATION = 0.9
+    # A filter column is worth indexing when some value selects at most this fraction of rows
+    MAX_VALUE_FRACTION = 0.1
+
+    def __init__(self, db_connection, min_rows: int = 10000, min_table_bytes: int = 1024 * 1024,
+                 max_indexes: int = 6):
+        self.connection = db_connection
+        self.min_rows = min_rows
+        self.min_table_bytes = min_table_bytes
+        self.max_indexes = max_indexes
+
+    def plan(self, table_name: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Decide which indexes the table should have; nothing is created here
+        """
+        cursor = self.connection.cursor()
+        row_count = schema.get("row_count") or 0
+        cursor.execute("SELECT pg_relation_size(%s::regclass) AS size",
+                       (pg_sql.Identifier("public", table_name).as_string(cursor),))
+        table_bytes = cursor.fetchone()["size"]
+
+        plan = {"row_count": row_count, "table_bytes": table_bytes, "indexes": []}
+        if row_count < self.min_rows or table_bytes < self.min_table_bytes:
+            plan["skipped"] = (f"table below thresholds ({self.min_rows} rows, "
+                               f"{self.min_table_bytes // 1024} KB)")
+            return plan
+
+        cursor.execute(
+            """
+            SELECT attname, n_distinct, correlation, most_common_freqs
+            FROM pg_stats
+            WHERE schemaname = 'public' AND tablename = %s
+            """,
+            (table_name,)
+        )
+        column_stats = {row["attname"]: row for row in cursor.fetchall()}
+        plan["indexes"] = self.choose_indexes(schema, column_stats, self._indexed_columns(cursor, table_name))
+        return plan
+
+    def choose_indexes(self, schema: Dict[str, Any], column_stats: Dict[str, Dict[str, Any]],
+                       indexed_columns: List[str]) -> List[Dict[str, Any]]:
+        """
+        Pick index candidates in priority order: id columns, time columns, selective filter columns
+        """
+        row_count = schema.get("row_count") or 0
+        candidates = {"id": [], "time": [], "filter": []}
+
+        for col in schema.get("columns", []):
+            name = col["name"]
+            if col.get("is_primary_key") or name in indexed_columns:
+                continue
+            stats = col.get("stats", {})
+            pg_stats = column_stats.get(name, {})
+            col_type = str(col.get("type", "")).lower()
+
+            if self._looks_like_id(name, col_type, stats, pg_stats):
+                candidates["id"].append({"column": name, "method": "btree", "reason": "id column"})
+            elif stats.get("data_type") == "datetime" or col_type in ("date", "timestamp without time zone", "timestamp with time zone"):
+                correlation = abs(pg_stats.get("correlation") or 0)
+                if row_count >= self.BRIN_MIN_ROWS and correlation >= self.BRIN_MIN_CORRELATION:
+                    candidates["time"].append({"column": name, "method": "brin",
+                                               "reason": f"naturally ordered timestamps (correlation {correlation:.2f})"})
+                elif stats.get("appears_to_be_time_series"):
+                    candidates["time"].append({"column": name, "method": "btree", "reason": "time-series column"})
+            elif stats.get("appears_to_be_categorical"):
+                fraction = self._most_selective_fraction(pg_stats)
+                if fraction is not None and fraction <= self.MAX_VALUE_FRACTION:
+                    candidates["filter"].append({"column": name, "method": "btree",
+                                                 "reason": f"filter column (values select down to {fraction:.1%} of rows)"})
+
+        chosen = candidates["id"] + candidates["time"] + candidates["filter"]
+        return chosen[:self.max_indexes]
+
+    @staticmethod
+    def _looks_like_id(name: str, col_type: str, stats: Dict[str, Any], pg_stats: Dict[str, Any]) -> bool:
+        lowered = name.lower()
+        if lowered == "id" or lowered.endswith("_id"):
+            return True
+        # n_distinct = -1 means every row holds a distinct value
+        unique = pg_stats.get("n_distinct") == -1 or stats.get("is_unique")
+        return bool(unique) and ("int" in col_type or col_type == "text")
+
+    @staticmethod
+    def _most_selective_fraction(pg_stats: Dict[str, Any]) -> Optional[float]:
+        freqs = pg_stats.get("most_common_freqs")
+        if freqs:
+            return min(freqs)
+        n_distinct = pg_stats.get("n_distinct")
+        if n_distinct and n_distinct > 0:
+            return 1 / n_distinct
+        return None
+
+    @staticmethod
+    def _indexed_columns(cursor, table_name: str) -> List[str]:
+        """
+        Leading columns of the table's existing indexes
+        """
+        cursor.execute(
+            """
+            SELECT a.attname
+            FROM pg_index i
+            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+            WHERE i.indrelid = %s::regclass
+            """,
+            (pg_sql.Identifier("public", table_name).as_string(cursor),)
+        )
+        return [row["attname"] for row in cursor.fetchall()]
+
+    @staticmethod
+    def index_name(table_name: str, column: str, method: str) -> str:
+        """
+        Name of a planned index: cut to fit PostgreSQL's 63-byte limit, with a hash of
+        the full names so that columns sharing a prefix still get distinct names
+        """
+        digest = hashlib.sha1(f"{table_name}.{column}.{method}".encode()).hexdigest()[:8]
+        return f"{table_name[:30]}_{column[:12]}_{digest}_{method}_idx"
+
+    def apply(self, table_name: str, plan: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Create the planned indexes, each in its own transaction; a failed index is
+        recorded in the plan and does not affect the others, and an index whose name is
+        already taken is recorded as "exists"
+        """
+        cursor = self.connection.cursor()
+        for index in plan["indexes"]:
+            index_name = self.index_name(table_name, index["column"], index["method"])
+            index["name"] = index_name
+            try:
+                cursor.execute(
+                    "SELECT to_regclass(%s) IS NOT NULL AS existing",
+                    (pg_sql.Identifier("public", index_name).as_string(cursor),)
+                )
+                if cursor.fetchone()["existing"]:
+                    self.connection.commit()
+                    index["status"] = "exists"
+                    logger.info(f"Index {index_name} already exists")
+                    continue
+                cursor.execute(
+                    pg_sql.SQL("CREATE INDEX {} ON {} USING " + index["method"] + " ({})").format(
+                        pg_sql.Identifier(index_name), pg_sql.Identifier(table_name),
+                        pg_sql.Identifier(index["column"])
+                    )
+                )
+                self.connection.commit()
+                index["status"] = "created"
+                logger.info(f"Created {index['method']} index {index_name} ({index['reason']})")
+            except Exception as e:
+                self.connection.rollback()
+                index["status"] = "failed"
+                index["error"] = str(e)
+                logger.warning(f"Failed to create index {index_name}: {str(e)}")
+        return plan
@@ -0,0 +1,180 @@
+# ingestion_jobs.py
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionJob:
+    """
+    Progress record for one background CSV ingestion
+    """
+
+    def __init__(self, table_name: str, filename: str):
+        self.id = uuid.uuid4().hex
+        self.table_name = table_name
+        self.filename = filename
+        self.status = "queued"
+        self.stage = "queued"
+        self.rows_loaded = 0
+        self.rows_total_estimate: Optional[int] = None
+        self.error: Optional[str] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._load_started_at: Optional[float] = None
+        self.cancel_requested = False
+        self._lock = threading.Lock()
+
+    def update(self, stage: Optional[str] = None, rows_loaded: Optional[int] = None,
+               rows_total_estimate: Optional[int] = None) -> None:
+        """
+        Progress callback handed to the ingest pipeline (called from a worker thread)
+        """
+        with self._lock:
+            if stage:
+                self.stage = stage
+                if stage == "loading" and self._load_started_at is None:
+                    self._load_started_at = time.time()
+            if rows_loaded is not None:
+                self.rows_loaded = rows_loaded
+            if rows_total_estimate is not None:
+                self.rows_total_estimate = rows_total_estimate
+
+    def cancel(self) -> None:
+        """
+        Ask the pipeline to stop; it notices at its next progress report
+        """
+        self.cancel_requested = True
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            now = self.finished_at or time.time()
+            load_elapsed = now - self._load_started_at if self._load_started_at else 0.0
+            rows_per_second = self.rows_loaded / load_elapsed if load_elapsed > 0 else None
+
+            eta_seconds = None
+            if self.status == "running" and rows_per_second and self.rows_total_estimate:
+                remaining = max(0, self.rows_total_estimate - self.rows_loaded)
+                eta_seconds = round(remaining / rows_per_second, 1)
+
+            return {
+                "job_id": self.id,
+                "table_name": self.table_name,
+                "filename": self.filename,
+                "status": self.status,
+                "cancel_requested": self.cancel_requested,
+                "stage": self.stage,
+                "rows_loaded": self.rows_loaded,
+                "rows_total_estimate": self.rows_total_estimate,
+                "rows_per_second": round(rows_per_second, 1) if rows_per_second else None,
+                "eta_seconds": eta_seconds,
+                "elapsed_seconds": round(now - self.started_at, 3) if self.started_at else None,
+                "error": self.error,
+                "result": self.result,
+            }
+
+
+class IngestionJobManager:
+    """
+    Runs ingestion jobs on a bounded worker pool and keeps their status for polling.
+    Per-table serialization is handled by the pipeline itself (PostgreSQL advisory locks),
+    so uploads to different tables load in parallel.
+    """
+
+    def __init__(self, max_workers: int = 2, max_retained_jobs: int = 200):
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="ingest")
+        self.max_retained_jobs = max_retained_jobs
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        table_name: str,
+        filename: str,
+        run: Callable[[IngestionJob], Dict[str, Any]],
+        on_finish: Optional[Callable[[], None]] = None,
+    ) -> IngestionJob:
+        """
+        Queue `run(job)`; its return value is stored as the job result
+        """
+        job = IngestionJob(table_name, filename)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict_finished()
+        self.executor.submit(self._run, job, run, on_finish)
+        logger.info(f"Queued ingestion job {job.id} for table '{table_name}'")
+        return job
+
+    def _run(self, job: IngestionJob, run: Callable[[IngestionJob], Dict[str, Any]],
+             on_finish: Optional[Callable[[], None]]) -> None:
+        """
+        Run a job; its terminal status is published only after `on_finish` has run, so a
+        client that sees a finished job also sees its cleanup done
+        """
+        job.started_at = time.time()
+        job.status = "running"
+        result: Optional[Dict[str, Any]] = None
+        error: Optional[BaseException] = None
+        try:
+            if job.cancel_requested:
+                raise RuntimeError("Cancelled before start")
+            result = run(job)
+        except BaseException as e:
+            error = e
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            if on_finish:
+                try:
+                    on_finish()
+                except Exception as e:
+                    logger.warning(f"Ingestion job {job.id} cleanup failed: {str(e)}")
+            with job._lock:
+                job.finished_at = time.time()
+                if error is None:
+                    job.result = result
+                    job.stage = "done"
+                    job.status = "succeeded"
+                elif job.cancel_requested:
+                    job.status = "cancelled"
+                else:
+                    job.error = str(error)
+                    job.status = "failed"
+        if error is None:
+            logger.info(f"Ingestion job {job.id} finished")
+        elif job.status == "cancelled":
+            logger.info(f"Ingestion job {job.id} cancelled")
+        else:
+            logger.error(f"Ingestion job {job.id} failed: {str(error)}")
+
+    def _evict_finished(self) -> None:
+        while len(self._jobs) > self.max_retained_jobs:
+            finished = next((job_id for job_id, job in self._jobs.items()
+                             if job.status in ("succeeded", "failed", "cancelled")), None)
+            if finished is None:
+                break
+            del self._jobs[finished]
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[IngestionJob]:
+        job = self.get(job_id)
+        if job and job.status in ("queued", "running"):
+            job.cancel()
+        return job
+
+    def list(self) -> List[IngestionJob]:
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
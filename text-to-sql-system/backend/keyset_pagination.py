@@ -0,0 +1,328 @@
+# keyset_pagination.py
+import base64
+import hashlib
+import json
+import re
+from typing import Any, List, Optional, Sequence, Tuple
+
+from psycopg2 import sql as pg_sql
+
+# Column types whose values survive a round trip through the cursor token as text
+# (bool, integers, floats, numeric, text types, date/time types, uuid)
+PAGEABLE_TYPE_OIDS = frozenset({
+    16, 20, 21, 23, 700, 701, 1700, 25, 1043, 1042, 19,
+    1082, 1083, 1266, 1114, 1184, 2950,
+})
+
+
+class PageCursorError(ValueError):
+    """
+    The cursor token is malformed or was issued for a different query
+    """
+
+
+def top_level_sql(sql: str) -> str:
+    """
+    `sql` with string literals, quoted identifiers and everything inside parentheses
+    blanked out (same length, so offsets still match), leaving the top-level clauses
+    """
+    out = []
+    depth = 0
+    quote = None
+    for ch in sql:
+        if quote:
+            if ch == quote:
+                quote = None
+            out.append(" ")
+        elif ch in ("'", '"'):
+            quote = ch
+            out.append(" ")
+        elif ch == "(":
+            depth += 1
+            out.append(" ")
+        elif ch == ")":
+            depth -= 1
+            out.append(" ")
+        else:
+            out.append(ch if depth == 0 else " ")
+    return "".join(out)
+
+
+def has_top_level_limit(sql: str) -> bool:
+    return re.search(r'\blimit\b', top_level_sql(sql), flags=re.IGNORECASE) is not None
+
+
+def projects_table_rows(sql: str, table_name: str) -> bool:
+    """
+    Whether `sql` selects bare columns of `table_name` alone: no join, set operation,
+    grouping, function call or alias, so that each result row is one row of the table
+    and a unique index of the table is unique in the result as well
+    """
+    top = top_level_sql(sql)
+    if re.search(r'\b(join|union|intersect|except|group|having|window|as)\b', top, flags=re.IGNORECASE):
+        return False
+    match = re.match(
+        r'\s*select\b(?:\s+distinct\b)?(.*?)\bfrom\b(.*?)(?=\b(?:where|order|limit|offset|fetch)\b|\Z)',
+        top, flags=re.IGNORECASE | re.DOTALL
+    )
+    if not match:
+        return False
+    start, end = match.span(1)
+    commas = [i for i in range(start, end) if top[i] == ","]
+    for item_start, item_end in zip([start] + [i + 1 for i in commas], commas + [end]):
+        if not re.fullmatch(r'\s*(?:(?:"[^"]+"|\w+)\s*\.\s*)?(?:"[^"]+"|\w+|\*)\s*', sql[item_start:item_end]):
+            return False
+    source = re.fullmatch(r'\s*(?:(?:"public"|public)\s*\.\s*)?(?:"([^"]+)"|(\w+))(?:\s+(?:"[^"]+"|\w+))?\s*',
+                          sql[match.start(2):match.end(2)])
+    if not source:
+        return False
+    name = source.group(1) if source.group(1) is not None else source.group(2).lower()
+    return name == table_name
+
+
+def split_order_by(sql: str) -> Tuple[str, List[Tuple[str, bool, bool]]]:
+    """
+    Split the top-level ORDER BY off `sql`: (sql without it, [(expression, descending,
+    nulls_first), ...]). An ORDER BY followed by LIMIT/OFFSET/FETCH decides which rows
+    the query returns, so it stays and no items are returned.
+    """
+    top = top_level_sql(sql)
+    matches = list(re.finditer(r'\border\s+by\b', top, flags=re.IGNORECASE))
+    if not matches:
+        return sql, []
+    order_by = matches[-1]
+    if re.search(r'\b(limit|offset|fetch|for)\b', top[order_by.end():], flags=re.IGNORECASE):
+        return sql, []
+    items = []
+    start = order_by.end()
+    ends = [i for i in range(start, len(top)) if top[i] == ","] + [len(sql)]
+    for end in ends:
+        item = re.fullmatch(
+            r'\s*(.*?)(?:\s+(asc|desc))?(?:\s+nulls\s+(first|last))?\s*',
+            sql[start:end], flags=re.IGNORECASE | re.DOTALL
+        )
+        descending = (item.group(2) or "").lower() == "desc"
+        nulls = (item.group(3) or "").lower()
+        # PostgreSQL default: NULLS LAST ascending, NULLS FIRST descending
+        items.append((item.group(1), descending, nulls == "first" if nulls else descending))
+        start = end + 1
+    return sql[:order_by.start()].rstrip(), items
+
+
+def _output_column(expression: str, columns: Sequence[str]) -> Optional[str]:
+    """
+    Output column an ORDER BY expression refers to (by position, name or qualified name)
+    """
+    if expression.isdigit():
+        position = int(expression) - 1
+        return columns[position] if 0 <= position < len(columns) else None
+    match = re.fullmatch(r'(?:(?:"[^"]+"|\w+)\s*\.\s*)?(?:"([^"]+)"|(\w+))', expression)
+    if not match:
+        return None
+    name = match.group(1) if match.group(1) is not None else match.group(2).lower()
+    return name if name in columns else None
+
+
+class SortKey:
+    """
+    One column of a page's sort key
+    """
+
+    __slots__ = ("column", "descending", "nulls_first", "nullable")
+
+    def __init__(self, column: str, descending: bool = False, nulls_first: bool = False, nullable: bool = True):
+        self.column = column
+        self.descending = descending
+        self.nulls_first = nulls_first
+        self.nullable = nullable
+
+    def order_sql(self) -> pg_sql.Composable:
+        return pg_sql.SQL("{} {} NULLS {}").format(
+            pg_sql.Identifier(self.column),
+            pg_sql.SQL("DESC" if self.descending else "ASC"),
+            pg_sql.SQL("FIRST" if self.nulls_first else "LAST"),
+        )
+
+    def equal_sql(self, value: Optional[str]) -> pg_sql.Composable:
+        if value is None:
+            return pg_sql.SQL("{} IS NULL").format(pg_sql.Identifier(self.column))
+        return pg_sql.SQL("{} = {}").format(pg_sql.Identifier(self.column), pg_sql.Literal(value))
+
+    def after_sql(self, value: Optional[str]) -> Optional[pg_sql.Composable]:
+        """
+        Condition for values sorting after `value`, None if nothing sorts after it
+        """
+        column = pg_sql.Identifier(self.column)
+        if value is None:
+            return pg_sql.SQL("{} IS NOT NULL").format(column) if self.nulls_first else None
+        after = pg_sql.SQL("{} {} {}").format(
+            column, pg_sql.SQL("<" if self.descending else ">"), pg_sql.Literal(value)
+        )
+        if self.nullable and not self.nulls_first:
+            after = pg_sql.SQL("({} OR {} IS NULL)").format(after, column)
+        return after
+
+
+class PagePlan:
+    """
+    How a query is paged: its sort key and whether its own top-level ORDER BY was
+    folded into that key (and dropped from the wrapped query).
+
+    The sort key is the query's ORDER BY columns, then the columns of a unique index of
+    the source table when the query is a plain projection of that table with all of
+    them, then the remaining result columns.
+    A key ending in NOT NULL unique columns is unique. A key that is not unique can still
+    tie on rows that differ only in columns left out of the key (json, arrays, bytea,
+    intervals); the token counts the rows already returned from the last row's tie group.
+    """
+
+    def __init__(self, keys: List[SortKey], unique: bool, order_folded: bool):
+        self.keys = keys
+        self.unique = unique
+        self.order_folded = order_folded
+
+    @classmethod
+    def for_result(cls, sql: str, description: Sequence[Any],
+                   unique_indexes: Sequence[Sequence[Tuple[str, bool]]] = (),
+                   table_name: Optional[str] = None) -> "PagePlan":
+        """
+        Plan from the query's result columns (a cursor description) and the unique
+        indexes of the source table `table_name`, each a list of (column, not_null).
+        The indexes are only used when the query projects that table's rows as they are
+        (see projects_table_rows); a join or alias can repeat an indexed column's values.
+        """
+        if table_name is None or not projects_table_rows(sql, table_name):
+            unique_indexes = ()
+        names = [col.name for col in description]
+        eligible = [
+            col.name for col in description
+            if col.type_code in PAGEABLE_TYPE_OIDS and names.count(col.name) == 1
+        ]
+        keys: List[SortKey] = []
+
+        def add(key: SortKey) -> None:
+            if all(existing.column != key.column for existing in keys):
+                keys.append(key)
+
+        _, order_items = split_order_by(sql)
+        order_folded = bool(order_items)
+        for expression, descending, nulls_first in order_items:
+            column = _output_column(expression.strip(), names)
+            if column is None or column not in eligible:
+                # Paging order keeps the ORDER BY items up to the first one it cannot follow
+                order_folded = False
+                break
+            add(SortKey(column, descending, nulls_first))
+
+        for index_columns in unique_indexes:
+            if all(column in eligible for column, _ in index_columns):
+                for column, not_null in index_columns:
+                    add(SortKey(column, nullable=not not_null))
+                if all(not_null for _, not_null in index_columns):
+                    return cls(keys, unique=True, order_folded=order_folded)
+                break
+
+        for column in eligible:
+            add(SortKey(column))
+        return cls(keys, unique=False, order_folded=order_folded)
+
+    def source_sql(self, sql: str) -> str:
+        return split_order_by(sql)[0] if self.order_folded else sql
+
+    def page_query(self, sql: str, page_size: int, last: Optional[List[Optional[str]]] = None,
+                   skip: int = 0) -> pg_sql.Composed:
+        """
+        The query for the page after the row whose key values are `last` (the first page
+        if None): a seek on the sort key instead of an OFFSET over the earlier pages.
+        Fetches one extra row to tell whether there is a next page.
+        """
+        if last is None:
+            where = pg_sql.SQL("")
+        else:
+            branches = []
+            for i, key in enumerate(self.keys):
+                after = key.after_sql(last[i])
+                if after is not None:
+                    branches.append(pg_sql.SQL(" AND ").join(
+                        [k.equal_sql(v) for k, v in zip(self.keys[:i], last[:i])] + [after]
+                    ))
+            if not self.unique:
+                # The rest of the last row's tie group; `skip` of them were returned already
+                branches.append(pg_sql.SQL(" AND ").join(k.equal_sql(v) for k, v in zip(self.keys, last)))
+            if not branches:
+                branches.append(pg_sql.SQL("FALSE"))
+            where = pg_sql.SQL(" WHERE ") + pg_sql.SQL(" OR ").join(
+                pg_sql.SQL("({})").format(branch) for branch in branches
+            )
+        order = pg_sql.SQL(", ").join(key.order_sql() for key in self.keys)
+        query = pg_sql.SQL("SELECT * FROM ({}) AS page_source{}").format(pg_sql.SQL(self.source_sql(sql)), where)
+        if self.keys:
+            query += pg_sql.SQL(" ORDER BY {}").format(order)
+        query += pg_sql.SQL(" LIMIT {}").format(pg_sql.Literal(page_size + 1))
+        if skip:
+            query += pg_sql.SQL(" OFFSET {}").format(pg_sql.Literal(skip))
+        return query
+
+    def key_values(self, description: Sequence[Any], row: Sequence[Any]) -> List[Optional[str]]:
+        positions = {col.name: i for i, col in enumerate(description)}
+        return [_token_value(row[positions[key.column]]) for key in self.keys]
+
+    def next_cursor(self, sql: str, description: Sequence[Any], rows: Sequence[Sequence[Any]],
+                    previous_last: Optional[List[Optional[str]]] = None, previous_skip: int = 0) -> str:
+        """
+        Token for the page after `rows` (the rows of the current page, in order)
+        """
+        last = self.key_values(description, rows[-1])
+        skip = 0
+        if not self.unique:
+            for row in reversed(rows):
+                if self.key_values(description, row) != last:
+                    break
+                skip += 1
+            if skip == len(rows) and last == previous_last:
+                # The whole page belonged to the previous page's tie group
+                skip += previous_skip
+        state = {
+            "q": query_digest(sql),
+            "k": [[key.column, key.descending, key.nulls_first, key.nullable] for key in self.keys],
+            "u": self.unique,
+            "o": self.order_folded,
+            "v": last,
+            "s": skip,
+        }
+        return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).decode().rstrip("=")
+
+    @classmethod
+    def from_cursor(cls, sql: str, token: str) -> Tuple["PagePlan", List[Optional[str]], int]:
+        """
+        (plan, last key values, skip) carried by a token from next_cursor
+        """
+        try:
+            state = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+            keys = [SortKey(str(c), bool(d), bool(n), bool(nullable)) for c, d, n, nullable in state["k"]]
+            last = [None if v is None else str(v) for v in state["v"]]
+            skip = int(state["s"])
+            digest = state["q"]
+            plan = cls(keys, unique=bool(state["u"]), order_folded=bool(state["o"]))
+        except Exception:
+            raise PageCursorError("Invalid page cursor")
+        if digest != query_digest(sql):
+            raise PageCursorError("Page cursor belongs to a different query")
+        if len(last) != len(keys) or skip < 0:
+            raise PageCursorError("Invalid page cursor")
+        return plan, last, skip
+
+
+def query_digest(sql: str) -> str:
+    return hashlib.sha256(sql.encode()).hexdigest()[:16]
+
+
+def _token_value(value: Any) -> Optional[str]:
+    """
+    Key value as PostgreSQL input text
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
@@ -1,16 +1,17 @@
 # main.py - FastAPI Application with PostgreSQL support
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Depends
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Depends, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-from typing import Optional, Dict, Any, List
-import pandas as pd
+from typing import Optional, Dict, Any, List, Callable, Awaitable, AsyncIterator, Literal, Union
 import psycopg2
+import psycopg2.extensions
 import psycopg2.extras
 from psycopg2 import sql as pg_sql
 import os
 import json
+import hashlib
 import httpx
 import re
 import asyncio
@@ -18,10 +19,27 @@ import ast
 from contextlib import asynccontextmanager
 import logging
 import time
+import tempfile
 from dotenv import load_dotenv
 from pathlib import Path
 from prompting_service import PromptingService
 from schema_analyzer import SchemaAnalyzer
+from ingestion_jobs import IngestionJob, IngestionJobManager
+from bulk_loader import BulkLoader, CsvChunkReader, CsvSource
+from type_inference import ColumnTypeInference, pg_type_from_catalog
+from index_planner import IndexPlanner
+from schema_tracker import SchemaTracker
+from sketches import ColumnSketchBuilder, SketchIndex
+from db_pool import DatabasePool, PoolTimeout
+from copy_export import CopyExport
+from result_cache import ResultCache, referenced_tables
+from schema_cache import SchemaCache
+from keyset_pagination import PageCursorError, PagePlan, has_top_level_limit
+from result_encoding import (
+    ARROW_STREAM_MEDIA_TYPE, PARQUET_MEDIA_TYPE, ResultSet, arrow_ipc_bytes, arrow_table, parquet_bytes,
+    require_pyarrow,
+)
+from cpu_pool import CpuPoolBusy, CpuTaskCancelled, CpuWorkerPool, TaskChannel
 from typing import TYPE_CHECKING
 
 # Load environment variables (explicit project root .env)
@@ -48,9 +66,54 @@ class Settings:
     LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "1024"))
     LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.0"))
     LLM_HEALTH_TTL = int(os.getenv("LLM_HEALTH_TTL", "300"))
+    # Send a table's prompt prefix to the primary LLM after uploads (for servers with prefix caching)
+    LLM_WARMUP_ON_UPLOAD = os.getenv("LLM_WARMUP_ON_UPLOAD", "False").lower() == "true"
+    LLM_WARMUP_TTL_S = float(os.getenv("LLM_WARMUP_TTL_S", "600"))
     DEBUG = os.getenv("DEBUG", "False").lower() == "true"
     DEFAULT_QUERY_LIMIT = int(os.getenv("DEFAULT_QUERY_LIMIT", "500"))
     STATEMENT_TIMEOUT_MS = int(os.getenv("STATEMENT_TIMEOUT_MS", "5000"))
+    INGEST_ENGINE = os.getenv("INGEST_ENGINE", "copy").lower()  # copy | rows
+    INGEST_CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", "50000"))
+    INGEST_MEMORY_BUDGET_MB = int(os.getenv("INGEST_MEMORY_BUDGET_MB", "256"))
+    UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None
+    UPLOAD_READ_CHUNK_BYTES = 1024 * 1024
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+    INGEST_SWAP_LOCK_TIMEOUT_MS = int(os.getenv("INGEST_SWAP_LOCK_TIMEOUT_MS", "10000"))
+    SCHEMA_STATS_ENGINE = os.getenv("SCHEMA_STATS_ENGINE", "sql").lower()  # sql | pandas
+    SCHEMA_STATS_EXACT_MAX_ROWS = int(os.getenv("SCHEMA_STATS_EXACT_MAX_ROWS", "500000"))
+    INDEX_PLANNER_ENABLED = os.getenv("INDEX_PLANNER_ENABLED", "True").lower() == "true"
+    INDEX_MIN_ROWS = int(os.getenv("INDEX_MIN_ROWS", "10000"))
+    INDEX_MIN_TABLE_KB = int(os.getenv("INDEX_MIN_TABLE_KB", "1024"))
+    INDEX_MAX_PER_TABLE = int(os.getenv("INDEX_MAX_PER_TABLE", "6"))
+    SCHEMA_REFRESH_INTERVAL_S = int(os.getenv("SCHEMA_REFRESH_INTERVAL_S", "300"))  # 0 disables
+    CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", "2"))  # 0 runs CPU-bound stages in a thread
+    CPU_POOL_MEMORY_MB = int(os.getenv("CPU_POOL_MEMORY_MB", "1024"))
+    CPU_POOL_ADMISSION_TIMEOUT_S = float(os.getenv("CPU_POOL_ADMISSION_TIMEOUT_S", "60"))
+    # Memory of a worker process itself (interpreter, pandas), reserved on top of each task's data
+    CPU_TASK_BASE_MB = 128
+    DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+    DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+    DB_POOL_ACQUIRE_TIMEOUT_S = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT_S", "5"))
+    DB_POOL_HEALTH_CHECK_AFTER_S = float(os.getenv("DB_POOL_HEALTH_CHECK_AFTER_S", "30"))
+    DB_POOL_MAX_IDLE_S = float(os.getenv("DB_POOL_MAX_IDLE_S", "600"))
+    # Connections that run generated SQL; a dedicated read-only role is recommended
+    QUERY_DB_USER = os.getenv("QUERY_DB_USER") or POSTGRES_USER
+    QUERY_DB_PASSWORD = os.getenv("QUERY_DB_PASSWORD", POSTGRES_PASSWORD)
+    QUERY_POOL_MAX_SIZE = int(os.getenv("QUERY_POOL_MAX_SIZE", "10"))
+    STREAM_FETCH_ROWS = int(os.getenv("STREAM_FETCH_ROWS", "2000"))
+    STREAM_QUERY_LIMIT = int(os.getenv("STREAM_QUERY_LIMIT", "1000000"))
+    # A streaming transaction idles while the client reads; this bounds how long it may
+    STREAM_IDLE_TIMEOUT_MS = int(os.getenv("STREAM_IDLE_TIMEOUT_MS", "60000"))
+    SCHEMA_CACHE_MAX_ENTRIES = int(os.getenv("SCHEMA_CACHE_MAX_ENTRIES", "128"))  # 0 disables the cache
+    SCHEMA_CACHE_TTL_S = float(os.getenv("SCHEMA_CACHE_TTL_S", "60"))
+    RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "256"))  # 0 disables the cache
+    RESULT_CACHE_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", "256"))
+    RESULT_CACHE_TTL_S = float(os.getenv("RESULT_CACHE_TTL_S", "300"))
+    PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "10000"))
+    EXPORT_MAX_ROWS = int(os.getenv("EXPORT_MAX_ROWS", "10000000"))
+    EXPORT_MAX_MB = int(os.getenv("EXPORT_MAX_MB", "2048"))  # uncompressed
+    EXPORT_TIMEOUT_MS = int(os.getenv("EXPORT_TIMEOUT_MS", "300000"))
+    EXPORT_CHUNK_BYTES = 256 * 1024
     
     @property
     def postgres_url(self):
@@ -66,22 +129,88 @@ class Settings:
 
 settings = Settings()
 
+# Background CSV ingestion jobs (per process)
+ingestion_jobs = IngestionJobManager(max_workers=settings.INGEST_WORKERS)
+
+# Worker processes for CPU-bound stages (CSV parsing, type inference, schema analysis)
+cpu_pool = CpuWorkerPool(
+    max_workers=settings.CPU_POOL_WORKERS,
+    memory_budget_bytes=settings.CPU_POOL_MEMORY_MB * 1024 * 1024,
+    admission_timeout_s=settings.CPU_POOL_ADMISSION_TIMEOUT_S,
+)
+
+# Query results by table data version (per process)
+result_cache = ResultCache(
+    max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+    max_bytes=settings.RESULT_CACHE_MAX_MB * 1024 * 1024,
+    ttl_s=settings.RESULT_CACHE_TTL_S,
+)
+
+# Table schemas with their annotations, frozen (per process)
+schema_cache = SchemaCache(max_entries=settings.SCHEMA_CACHE_MAX_ENTRIES, ttl_s=settings.SCHEMA_CACHE_TTL_S)
+
+
+def invalidate_table_caches(table_name: str) -> None:
+    """
+    Forget the cached schema and query results of a table whose data or name changed
+    """
+    schema_cache.invalidate(table_name)
+    result_cache.invalidate_table(table_name)
+
+
 # Simple in-memory cache for LLM health (per process)
 _llm_health_cache: Optional[Dict[str, Any]] = None
 _llm_health_cache_at: Optional[float] = None
 
-# Database setup
+# When each prompt prefix was last sent to the primary LLM for warm-up, by digest (per process)
+_llm_warmed_prefixes: Dict[str, float] = {}
+# Warm-ups started after uploads (the event loop keeps only weak references to tasks)
+_llm_warmup_tasks: set = set()
+
+# Database setup: one connection pool per process (connections open on first use)
+db_pool = DatabasePool(
+    min_size=settings.DB_POOL_MIN_SIZE,
+    max_size=settings.DB_POOL_MAX_SIZE,
+    acquire_timeout_s=settings.DB_POOL_ACQUIRE_TIMEOUT_S,
+    health_check_after_s=settings.DB_POOL_HEALTH_CHECK_AFTER_S,
+    max_idle_s=settings.DB_POOL_MAX_IDLE_S,
+    dbname=settings.POSTGRES_DB,
+    user=settings.POSTGRES_USER,
+    password=settings.POSTGRES_PASSWORD,
+    host=settings.POSTGRES_SERVER,
+    port=settings.POSTGRES_PORT
+)
+
+
+# Generated SQL runs on its own pool whose sessions start read-only, confined to the public
+# schema and under the statement timeout, so a query needs no setup round trips. The
+# connections run in autocommit: each query is a single read-only statement.
+query_pool = DatabasePool(
+    min_size=settings.DB_POOL_MIN_SIZE,
+    max_size=settings.QUERY_POOL_MAX_SIZE,
+    acquire_timeout_s=settings.DB_POOL_ACQUIRE_TIMEOUT_S,
+    health_check_after_s=settings.DB_POOL_HEALTH_CHECK_AFTER_S,
+    max_idle_s=settings.DB_POOL_MAX_IDLE_S,
+    autocommit=True,
+    dbname=settings.POSTGRES_DB,
+    user=settings.QUERY_DB_USER,
+    password=settings.QUERY_DB_PASSWORD,
+    host=settings.POSTGRES_SERVER,
+    port=settings.POSTGRES_PORT,
+    options=(
+        "-c search_path=public"
+        f" -c statement_timeout={settings.STATEMENT_TIMEOUT_MS}"
+        f" -c idle_in_transaction_session_timeout={settings.STATEMENT_TIMEOUT_MS}"
+        " -c default_transaction_read_only=on"
+    ),
+)
+
+
 def get_db_connection():
-    conn = psycopg2.connect(
-        dbname=settings.POSTGRES_DB,
-        user=settings.POSTGRES_USER,
-        password=settings.POSTGRES_PASSWORD,
-        host=settings.POSTGRES_SERVER,
-        port=settings.POSTGRES_PORT
-    )
-    # Set the cursor to return dictionaries
-    conn.cursor_factory = psycopg2.extras.RealDictCursor
-    return conn
+    """
+    Pooled connection returning dictionaries; close() hands it back to the pool
+    """
+    return db_pool.getconn()
 
 from decimal import Decimal
 import json
@@ -121,6 +250,36 @@ class CustomJSONEncoder(json.JSONEncoder):
                 pass
         return super().default(obj)
 
+def get_schema_tracker() -> SchemaTracker:
+    return SchemaTracker(
+        get_db_connection,
+        stats_engine=settings.SCHEMA_STATS_ENGINE,
+        exact_stats_max_rows=settings.SCHEMA_STATS_EXACT_MAX_ROWS,
+    )
+
+def _refresh_schemas_task(channel: TaskChannel) -> Dict[str, Any]:
+    """
+    Worker-process body of one schema refresh pass
+    """
+    return get_schema_tracker().refresh_all()
+
+async def _refresh_schemas_periodically(interval_s: int) -> None:
+    """
+    Background refresher: re-analyze the uploaded tables whose data changed since their
+    schema was stored, off the request path
+    """
+    while True:
+        await asyncio.sleep(interval_s)
+        try:
+            summary = await cpu_pool.run(_refresh_schemas_task, memory_bytes=settings.CPU_TASK_BASE_MB * 1024 * 1024)
+            for table_name in summary["refreshed"]:
+                invalidate_table_caches(table_name)
+            if summary["refreshed"] or summary["skipped"]:
+                logger.info(f"Schema refresh: refreshed {summary['refreshed']}, skipped {summary['skipped']}, "
+                            f"schema version {summary['schema_version']}")
+        except Exception as e:
+            logger.warning(f"Schema refresh failed: {str(e)}")
+
 # Initialize database on startup
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -166,16 +325,35 @@ async def lifespan(app: FastAPI):
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
         ''')
+        SchemaTracker.ensure_tables(cursor)
         conn.commit()
         conn.close()
+        db_pool.open()
+        query_pool.open()
         logger.info("Database initialized")
     except Exception as e:
         logger.error(f"Database initialization failed: {str(e)}")
         logger.error("Backend will start, but DB-dependent endpoints will fail until PostgreSQL is reachable.")
+
+    try:
+        warmed = schema_cache.put_many(await DataService().load_schemas_with_annotations())
+        logger.info(f"Schema cache warmed with {warmed} table(s)")
+    except Exception as e:
+        logger.warning(f"Schema cache warm-up failed: {str(e)}")
+    
+    refresh_task = None
+    if settings.SCHEMA_REFRESH_INTERVAL_S > 0:
+        refresh_task = asyncio.create_task(_refresh_schemas_periodically(settings.SCHEMA_REFRESH_INTERVAL_S))
     
     yield
     
     # Cleanup on shutdown if needed
+    if refresh_task:
+        refresh_task.cancel()
+    ingestion_jobs.shutdown()
+    cpu_pool.shutdown()
+    db_pool.closeall()
+    query_pool.closeall()
     logger.info("Application shutting down")
 
 # Create FastAPI app
@@ -194,8 +372,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Result-Cache"],
 )
 
+
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request: Request, exc: PoolTimeout):
+    logger.warning(f"Database pool exhausted: {str(exc)}")
+    return JSONResponse(status_code=503, content={"detail": f"Database busy, retry later: {str(exc)}"})
+
 # Mount static files for frontend (for production use)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -226,6 +411,17 @@ class RunSqlRequest(BaseModel):
     sql_query: str
 
 
+class PageRequest(BaseModel):
+    table_name: str
+    sql_query: str
+    page_size: Optional[int] = None
+    cursor: Optional[str] = None
+
+
+class WarmupRequest(BaseModel):
+    table_name: str
+
+
 class RenameTableRequest(BaseModel):
     old_name: str
     new_name: str
@@ -245,10 +441,16 @@ class ExplainSqlRequest(BaseModel):
     natural_query: Optional[str] = None
     result_sample: Optional[List[Dict[str, Any]]] = None
 
+# `records`: one object per row; `columns`: {"columns": [...], "rows": [[...], ...]}
+ResultShape = Literal["records", "columns"]
+# JSON for the browser; Arrow IPC stream or Parquet for programmatic clients
+ResultFormat = Literal["json", "arrow", "parquet"]
+
+
 class QueryResponse(BaseModel):
     natural_language_response: str
     sql_query: str
-    data: List[Dict[str, Any]]
+    data: Union[List[Dict[str, Any]], Dict[str, Any]]
     explanation: str
     visualization_type: str
     status: Optional[str] = None
@@ -294,6 +496,38 @@ class LLMService:
 
         return self._clean_llm_response(text)
 
+    async def warm_up(self, table_schema: dict) -> Dict[str, Any]:
+        """
+        Send a table's text-to-SQL prompt prefix to the primary LLM for one output token,
+        so that a server with prefix caching has it computed before the first question.
+        Skipped when the same prefix was sent within LLM_WARMUP_TTL_S; there is no Gemini
+        fallback, as it has no cache to warm.
+        """
+        prefix = self.prompting_service.text_to_sql_prefix(table_schema)
+        digest = hashlib.sha256(prefix.encode()).hexdigest()
+        now = time.monotonic()
+        warmed_at = _llm_warmed_prefixes.get(digest)
+        if warmed_at is not None and now - warmed_at < settings.LLM_WARMUP_TTL_S:
+            return {"status": "skipped", "prefix_chars": len(prefix)}
+
+        started = time.perf_counter()
+        async with httpx.AsyncClient() as client:
+            response = await client.post(
+                self.endpoint,
+                json={"prompt": prefix, "max_tokens": 1, "temperature": self.temperature},
+                timeout=self.timeout
+            )
+        if response.status_code != 200:
+            raise LLMError(detail=f"Primary LLM warm-up failed: {response.text[:500]}")
+        for stale in [d for d, at in _llm_warmed_prefixes.items() if now - at >= settings.LLM_WARMUP_TTL_S]:
+            del _llm_warmed_prefixes[stale]
+        _llm_warmed_prefixes[digest] = now
+        return {
+            "status": "warmed",
+            "prefix_chars": len(prefix),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+
     def _clean_llm_response(self, text: str) -> str:
         """Clean up LLM response by removing markdown code blocks."""
         # Clean up response formatting
@@ -400,35 +634,23 @@ class LLMService:
             logger.error(f"Error generating SQL: {str(e)}")
             raise LLMError(detail=f"Failed to generate SQL: {str(e)}")
     
-    async def analyze_results(self, natural_query: str, sql_query: str, results: List[Dict], table_schema: dict) -> Dict:
+    async def analyze_results(self, natural_query: str, sql_query: str, results: ResultSet, table_schema: dict) -> Dict:
         """
         Analyze the SQL results using the LLM and provide natural language explanation
         """
         try:
-            # Limit the results to prevent token overflow
-            max_results = 5  # Define max_results here with a default value
-            result_sample = results[:max_results] if results else []
-            total_results = len(results) if results else 0
-            
-            # Convert Decimal objects to float for JSON serialization
-            # This creates a deep copy of the results with Decimal converted to float
-            serializable_results = json.loads(json.dumps(results, cls=CustomJSONEncoder))
-            
-            # Format the results for better readability
-            results_str = json.dumps(serializable_results[:max_results], indent=2)
-            
-            # Extract schema information
-            columns_info = "\n".join([
-                f"- {col.get('name', '')}: {col.get('type', '')}"
-                for col in table_schema.get("columns", [])
-            ])
+            # Limit the results to prevent token overflow; only the sample is turned into records
+            max_results = 5
+            result_sample = results.records(max_results)
+            total_results = len(results)
             
             prompt = self.prompting_service.create_analysis_prompt(
                 natural_query, 
                 sql_query, 
                 table_schema, 
-                serializable_results,
-                max_results=max_results  # Pass max_results here
+                result_sample,
+                max_results=max_results,
+                total_results=total_results
             )
             
             # Call the LLM to analyze the results
@@ -446,8 +668,8 @@ class LLMService:
 
             # If we can't parse as JSON, return a minimal fallback response
             logger.error(f"Error parsing LLM response as JSON: {analysis_text}")
-            row_count = len(serializable_results) if serializable_results else 0
-            column_names = list(serializable_results[0].keys()) if row_count else []
+            row_count = total_results
+            column_names = results.columns if row_count else []
             summary = "Query executed successfully."
             if row_count:
                 summary = f"Returned {row_count} rows."
@@ -456,7 +678,7 @@ class LLMService:
             return {
                 "natural_language_response": summary,
                 "explanation": "",
-                "visualization_type": _infer_visualization_type(serializable_results, table_schema)
+                "visualization_type": _infer_visualization_type(result_sample, table_schema)
             }
         
         except Exception as e:
@@ -542,49 +764,297 @@ class LLMError(Exception):
         self.detail = detail
 
 
+INGEST_MODES = ("replace", "append", "upsert")
+
+
 # Data service for handling CSV and database operations
 class DataService:
     def __init__(self):
-        pass
-    async def process_csv(self, file_content: bytes, table_name: str) -> dict:
+        self.last_ingest_stats: Optional[Dict[str, Any]] = None
+
+    @staticmethod
+    def _clean_column_names(original_columns: List[Any]) -> List[str]:
+        cleaned_columns: List[str] = []
+        for col in original_columns:
+            # Replace spaces and special characters with underscores
+            cleaned_col = re.sub(r'[^\w]', '_', str(col))
+            
+            # Ensure column name doesn't start with a number
+            if cleaned_col and cleaned_col[0].isdigit():
+                cleaned_col = 'col_' + cleaned_col
+                
+            # Avoid duplicate column names
+            counter = 1
+            base_col = cleaned_col
+            while cleaned_col in cleaned_columns:
+                cleaned_col = f"{base_col}_{counter}"
+                counter += 1
+                
+            cleaned_columns.append(cleaned_col)
+        return cleaned_columns
+
+    @staticmethod
+    def _alter_column_types(cursor, table_names: List[str], changes: Dict[str, str]) -> None:
+        """
+        Retype table columns after a chunk did not fit their inferred type
+        """
+        for col, pg_type in changes.items():
+            logger.info(f"Changing type of column '{col}' to {pg_type}")
+            for table_name in table_names:
+                cursor.execute(
+                    pg_sql.SQL("ALTER TABLE {} ALTER COLUMN {} TYPE " + pg_type + " USING {}::" + pg_type).format(
+                        pg_sql.Identifier(table_name), pg_sql.Identifier(col), pg_sql.Identifier(col)
+                    )
+                )
+
+    @staticmethod
+    def _create_table(cursor, table_name: str, column_types: Dict[str, str],
+                      unlogged: bool = False, temporary: bool = False) -> None:
+        columns = [
+            pg_sql.SQL("{} " + pg_type).format(pg_sql.Identifier(col))
+            for col, pg_type in column_types.items()
+        ]
+        if temporary:
+            # Arrival order, so the last occurrence of a duplicated key wins an upsert
+            columns.append(pg_sql.SQL("__ingest_seq BIGSERIAL"))
+        prefix = "CREATE TEMPORARY TABLE" if temporary else ("CREATE UNLOGGED TABLE" if unlogged else "CREATE TABLE")
+        create_table_sql = pg_sql.SQL(prefix + " {} ({})").format(
+            pg_sql.Identifier(table_name), pg_sql.SQL(", ").join(columns)
+        )
+        logger.info(f"Create table SQL: {create_table_sql.as_string(cursor)}")
+        cursor.execute(create_table_sql)
+
+    @staticmethod
+    def _existing_column_types(cursor, table_name: str) -> Optional[Dict[str, str]]:
         """
-        Process a CSV file and store it in the PostgreSQL database
+        Column types of an existing table, or None if it does not exist
         """
+        cursor.execute("SELECT to_regclass(%s) AS oid", (pg_sql.Identifier("public", table_name).as_string(cursor),))
+        result = cursor.fetchone()
+        if not result or result["oid"] is None:
+            return None
+        cursor.execute(
+            """
+            SELECT a.attname AS column_name, format_type(a.atttypid, a.atttypmod) AS data_type
+            FROM pg_attribute a
+            WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+            ORDER BY a.attnum
+            """,
+            (pg_sql.Identifier("public", table_name).as_string(cursor),)
+        )
+        return {row["column_name"]: pg_type_from_catalog(row["data_type"]) for row in cursor.fetchall()}
+
+    @staticmethod
+    def _ensure_unique_key(cursor, table_name: str, key_column: str) -> None:
+        """
+        ON CONFLICT needs a unique index on the upsert key; an existing one on exactly
+        that column is used as it is
+        """
+        cursor.execute(
+            """
+            SELECT 1
+            FROM pg_index i
+            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+            WHERE i.indrelid = %s::regclass AND i.indisunique AND i.indisvalid AND i.indnkeyatts = 1
+              AND i.indpred IS NULL AND i.indexprs IS NULL AND a.attname = %s
+            """,
+            (pg_sql.Identifier("public", table_name).as_string(cursor), key_column)
+        )
+        if cursor.fetchone():
+            return
+        # Names are cut to PostgreSQL's 63-byte limit; the hash keeps cut names distinct
+        digest = hashlib.sha1(f"{table_name}.{key_column}".encode()).hexdigest()[:8]
+        index_name = f"{table_name[:30]}_{key_column[:12]}_{digest}_upsert_key"
         try:
+            cursor.execute(
+                pg_sql.SQL("CREATE UNIQUE INDEX IF NOT EXISTS {} ON {} ({})").format(
+                    pg_sql.Identifier(index_name), pg_sql.Identifier(table_name), pg_sql.Identifier(key_column)
+                )
+            )
+        except psycopg2.IntegrityError as e:
+            raise ValueError(f"Column '{key_column}' already has duplicate values and cannot be used as an upsert key: {str(e)}")
+
+    @staticmethod
+    def _merge_upsert(cursor, source_table: str, table_name: str, columns: List[str], key_column: str) -> Dict[str, int]:
+        """
+        INSERT ... ON CONFLICT from the COPY-loaded temp table; within the file the last row per key wins
+        """
+        column_list = pg_sql.SQL(", ").join(pg_sql.Identifier(col) for col in columns)
+        updates = [col for col in columns if col != key_column]
+        if updates:
+            on_conflict = pg_sql.SQL("DO UPDATE SET {}").format(pg_sql.SQL(", ").join(
+                pg_sql.SQL("{} = EXCLUDED.{}").format(pg_sql.Identifier(col), pg_sql.Identifier(col))
+                for col in updates
+            ))
+        else:
+            on_conflict = pg_sql.SQL("DO NOTHING")
+        cursor.execute(
+            pg_sql.SQL(
+                "WITH upserted AS ("
+                " INSERT INTO {target} ({cols})"
+                " SELECT DISTINCT ON ({key}) {cols} FROM {source} WHERE {key} IS NOT NULL ORDER BY {key}, __ingest_seq DESC"
+                " ON CONFLICT ({key}) {on_conflict}"
+                " RETURNING (xmax = 0) AS inserted"
+                ") SELECT COUNT(*) FILTER (WHERE inserted) AS rows_inserted,"
+                " COUNT(*) FILTER (WHERE NOT inserted) AS rows_updated FROM upserted"
+            ).format(
+                target=pg_sql.Identifier(table_name),
+                cols=column_list,
+                key=pg_sql.Identifier(key_column),
+                source=pg_sql.Identifier(source_table),
+                on_conflict=on_conflict,
+            )
+        )
+        counts = cursor.fetchone()
+        cursor.execute(pg_sql.SQL("DROP TABLE IF EXISTS {}").format(pg_sql.Identifier(source_table)))
+        logger.info(f"Upsert into '{table_name}': {counts['rows_inserted']} inserted, {counts['rows_updated']} updated")
+        return {"rows_inserted": counts["rows_inserted"], "rows_updated": counts["rows_updated"]}
+
+    @staticmethod
+    def _non_null_counts(cursor, table_name: str, columns) -> Dict[str, int]:
+        """
+        Non-null value count of each of `columns` in the table
+        """
+        columns = sorted(columns)
+        if not columns:
+            return {}
+        cursor.execute(
+            pg_sql.SQL("SELECT {} FROM {}").format(
+                pg_sql.SQL(", ").join(
+                    pg_sql.SQL("count({}) AS {}").format(pg_sql.Identifier(col), pg_sql.Identifier(f"c{i}"))
+                    for i, col in enumerate(columns)
+                ),
+                pg_sql.Identifier(table_name),
+            )
+        )
+        row = cursor.fetchone()
+        return {col: row[f"c{i}"] for i, col in enumerate(columns)}
+
+    @staticmethod
+    def _stored_schema(cursor, table_name: str) -> Optional[Dict[str, Any]]:
+        cursor.execute("SELECT schema FROM uploaded_tables WHERE table_name = %s", (table_name,))
+        result = cursor.fetchone()
+        if not result or not result["schema"]:
+            return None
+        schema = result["schema"]
+        return json.loads(schema) if isinstance(schema, str) else schema
+
+    @staticmethod
+    def _staging_table_name(table_name: str) -> str:
+        # Stay within PostgreSQL's 63-byte identifier limit
+        return f"{table_name[:40]}__staging_{uuid.uuid4().hex[:8]}"
+
+    @staticmethod
+    def _swap_in_staging_table(conn, staging_name: str, table_name: str) -> None:
+        """
+        Make a fully loaded staging table durable, gather planner stats on it, then
+        replace `table_name` with it in one short transaction.
+        """
+        cursor = conn.cursor()
+        staging = pg_sql.Identifier(staging_name)
+        # Both run before the swap so readers of the live table are never blocked by them
+        cursor.execute(pg_sql.SQL("ALTER TABLE {} SET LOGGED").format(staging))
+        cursor.execute(pg_sql.SQL("ANALYZE {}").format(staging))
+        conn.commit()
+
+        retired_name = f"{table_name[:40]}__retired_{uuid.uuid4().hex[:8]}"
+        cursor.execute("SET LOCAL lock_timeout = %s", (settings.INGEST_SWAP_LOCK_TIMEOUT_MS,))
+        cursor.execute(
+            pg_sql.SQL("ALTER TABLE IF EXISTS {} RENAME TO {}").format(
+                pg_sql.Identifier(table_name), pg_sql.Identifier(retired_name)
+            )
+        )
+        cursor.execute(pg_sql.SQL("ALTER TABLE {} RENAME TO {}").format(staging, pg_sql.Identifier(table_name)))
+        cursor.execute(pg_sql.SQL("DROP TABLE IF EXISTS {}").format(pg_sql.Identifier(retired_name)))
+        conn.commit()
+
+    @staticmethod
+    def _drop_table_quietly(conn, table_name: str) -> None:
+        try:
+            cursor = conn.cursor()
+            cursor.execute(pg_sql.SQL("DROP TABLE IF EXISTS {}").format(pg_sql.Identifier(table_name)))
+            conn.commit()
+            logger.info(f"Dropped leftover table '{table_name}'")
+        except Exception as e:
+            logger.warning(f"Failed to drop leftover table '{table_name}': {str(e)}")
+
+    async def process_csv(
+        self,
+        source: CsvSource,
+        table_name: str,
+        mode: str = "replace",
+        key_column: Optional[str] = None,
+        is_cancelled: Optional[Callable[[], Awaitable[bool]]] = None
+    ) -> dict:
+        """
+        Process a CSV file and store it in the PostgreSQL database.
+        The pipeline runs in the CPU worker pool so the event loop keeps serving other
+        requests; it is cancelled once `await is_cancelled()` returns True.
+        """
+        try:
+            result = await cpu_pool.run(
+                _ingest_task, source, table_name, mode, key_column,
+                memory_bytes=_ingest_memory_bytes(source), is_cancelled=is_cancelled
+            )
+        finally:
+            invalidate_table_caches(table_name)
+        self.last_ingest_stats = result["ingest"]
+        return result["schema"]
+
+    def process_csv_sync(
+        self,
+        source: CsvSource,
+        table_name: str,
+        progress: Optional[Callable[..., None]] = None,
+        mode: str = "replace",
+        key_column: Optional[str] = None
+    ) -> dict:
+        """
+        Blocking ingest pipeline shared by /api/upload and background ingestion jobs.
+        `source` is either the path of an upload spooled to disk or raw bytes;
+        it is parsed and loaded chunk by chunk so memory stays within INGEST_MEMORY_BUDGET_MB.
+        `mode` is one of INGEST_MODES: replace the table, append to it, or upsert on `key_column`.
+        `progress(stage=..., rows_loaded=..., rows_total_estimate=...)` is called as stages advance.
+        """
+        def report(stage: Optional[str] = None, **kwargs) -> None:
+            if progress:
+                progress(stage=stage, **kwargs)
+
+        try:
+            if mode not in INGEST_MODES:
+                raise ValueError(f"Invalid ingest mode '{mode}'. Use one of: {', '.join(INGEST_MODES)}")
+            if mode == "upsert" and not key_column:
+                raise ValueError("Upsert mode requires a key column")
+            
             # Step 1: Check file content
             logger.info("STEP 1: Checking file content")
-            if not file_content:
+            reader = CsvChunkReader(
+                source,
+                memory_budget_bytes=settings.INGEST_MEMORY_BUDGET_MB * 1024 * 1024,
+                max_chunk_rows=settings.INGEST_CHUNK_ROWS,
+            )
+            file_size = reader.size_bytes()
+            if not file_size:
                 logger.error("File content is empty")
                 raise ValueError("Uploaded file is empty")
             
-            logger.info(f"File content size: {len(file_content)} bytes")
-            logger.info(f"First 100 bytes: {file_content[:100]}")
+            logger.info(f"File content size: {file_size} bytes")
+            logger.info(f"First 100 bytes: {reader.head(100)}")
             
-            # Step 2: Parse CSV with pandas
+            # Step 2: Parse the first CSV chunk with pandas
             logger.info("STEP 2: Parsing CSV with pandas")
+            report("parsing", rows_total_estimate=reader.estimate_total_rows())
             try:
-                # First, convert bytes to string to check content
-                file_text = file_content.decode('utf-8', errors='replace')
-                logger.info(f"CSV text preview: {file_text[:200]}")
-                
-                # Now parse with pandas
-                df = pd.read_csv(
-                    pd.io.common.BytesIO(file_content),
-                    keep_default_na=True,
-                    na_values=['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', 
-                            '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>', 'N/A', 
-                            'NA', 'NULL', 'NaN', 'n/a', 'nan', 'null'],
-                    skip_blank_lines=True
-                )
-                
-                logger.info(f"DataFrame created successfully with shape: {df.shape}")
+                chunks = iter(reader)
+                df = next(chunks, None)
+                logger.info(f"First chunk parsed with shape: {None if df is None else df.shape}")
             except Exception as e:
                 logger.error(f"Failed to parse CSV: {str(e)}")
                 raise ValueError(f"Failed to parse CSV file: {str(e)}")
             
             # Step 3: Check dataframe
             logger.info("STEP 3: Checking dataframe")
-            if df.empty:
+            if df is None or df.empty:
                 logger.error("DataFrame is empty")
                 raise ValueError("CSV file contains no data")
             
@@ -594,33 +1064,19 @@ class DataService:
             # Step 4: Clean column names
             logger.info("STEP 4: Cleaning column names")
             original_columns = df.columns.tolist()
-            cleaned_columns = []
-            
-            for col in original_columns:
-                # Replace spaces and special characters with underscores
-                cleaned_col = re.sub(r'[^\w]', '_', str(col))
-                
-                # Ensure column name doesn't start with a number
-                if cleaned_col and cleaned_col[0].isdigit():
-                    cleaned_col = 'col_' + cleaned_col
-                    
-                # Avoid duplicate column names
-                counter = 1
-                base_col = cleaned_col
-                while cleaned_col in cleaned_columns:
-                    cleaned_col = f"{base_col}_{counter}"
-                    counter += 1
-                    
-                cleaned_columns.append(cleaned_col)
+            cleaned_columns = self._clean_column_names(original_columns)
             
             logger.info(f"Original columns: {original_columns}")
             logger.info(f"Cleaned columns: {cleaned_columns}")
             
-            # Rename columns if needed
+            # Accept the upsert key by its original CSV header as well as its cleaned name
+            if key_column in original_columns and key_column not in cleaned_columns:
+                key_column = cleaned_columns[original_columns.index(key_column)]
+            
+            # Rename columns if needed (positionally, so every chunk gets the same names)
             if original_columns != cleaned_columns:
-                column_mapping = {original: cleaned for original, cleaned in zip(original_columns, cleaned_columns)}
-                df = df.rename(columns=column_mapping)
-                logger.info(f"Renamed columns: {column_mapping}")
+                df.columns = cleaned_columns
+                logger.info(f"Renamed columns: {dict(zip(original_columns, cleaned_columns))}")
             
             # Step 5: Connect to database
             logger.info("STEP 5: Connecting to database")
@@ -631,101 +1087,191 @@ class DataService:
                 logger.error(f"Database connection failed: {str(e)}")
                 raise ValueError(f"Failed to connect to database: {str(e)}")
             
+            staging_name = None
             try:
-                # Step 6: Check if table exists
-                logger.info("STEP 6: Checking if table exists")
                 cursor = conn.cursor()
-                cursor.execute(f"SELECT to_regclass('public.{table_name}')")
-                exists_result = cursor.fetchone()
-                logger.info(f"Table existence check result: {exists_result}")
+
+                # Serialize concurrent uploads of the same table (session lock, released before the
+                # connection goes back to the pool); uploads to different tables proceed in parallel
+                report("waiting_for_lock")
+                cursor.execute("SELECT pg_advisory_lock(hashtext(%s))", (f"ingest:{table_name}",))
+
+                # Step 6: Check if table exists (re-uploads are loaded beside it and swapped in)
+                logger.info("STEP 6: Checking if table exists")
+                report("creating_table")
+                existing_types = self._existing_column_types(cursor, table_name)
+                table_exists = existing_types is not None
+                logger.info(f"Table '{table_name}' exists: {table_exists}")
                 
-                # FIXED: Access the result using the column name instead of index
-                if exists_result and exists_result['to_regclass'] is not None:
-                    logger.info(f"Table '{table_name}' exists, dropping it")
-                    cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
-                    conn.commit()
+                if mode != "replace" and not table_exists:
+                    logger.info(f"Table '{table_name}' does not exist; creating it instead of {mode}")
+                    mode = "replace"
                 
-                # Step 7: Create PostgreSQL table
-                logger.info("STEP 7: Creating PostgreSQL table")
-                pg_dtype_map = {
-                    'int64': 'INTEGER',
-                    'int32': 'INTEGER',
-                    'float64': 'FLOAT',
-                    'float32': 'FLOAT',
-                    'bool': 'BOOLEAN',
-                    'datetime64[ns]': 'TIMESTAMP',
-                    'timedelta64[ns]': 'INTERVAL',
-                    'object': 'TEXT',
-                    'category': 'TEXT'
-                }
+                if mode == "upsert" and key_column not in cleaned_columns:
+                    raise ValueError(f"Key column '{key_column}' not found in CSV columns")
                 
-                columns = []
-                for col in df.columns:
-                    dtype = str(df[col].dtype)
-                    pg_type = pg_dtype_map.get(dtype, 'TEXT')
-                    columns.append(f'"{col}" {pg_type}')
+                # Types are inferred from the first chunk (dates, booleans, integer width, decimals);
+                # an existing table keeps the types of the columns it already has
+                type_inference = ColumnTypeInference()
+                column_types = type_inference.infer(df, existing_types if mode != "replace" else None)
+                if mode == "replace":
+                    # Step 7: Create an UNLOGGED staging table
+                    logger.info("STEP 7: Creating PostgreSQL staging table")
+                    staging_name = self._staging_table_name(table_name)
+                    try:
+                        self._create_table(cursor, staging_name, column_types, unlogged=True)
+                        conn.commit()
+                        logger.info(f"Staging table '{staging_name}' created successfully")
+                    except Exception as e:
+                        logger.error(f"Failed to create table: {str(e)}")
+                        conn.rollback()
+                        staging_name = None
+                        raise ValueError(f"Failed to create table: {str(e)}")
+                    load_target = staging_name
+                    widen_targets = [staging_name]
+                else:
+                    # Step 7: Evolve the existing table and prepare the load target
+                    logger.info(f"STEP 7: Preparing '{table_name}' for {mode}")
+                    new_columns = {col: pg_type for col, pg_type in column_types.items() if col not in existing_types}
+                    for col, pg_type in new_columns.items():
+                        logger.info(f"Adding column '{col}' ({pg_type})")
+                        cursor.execute(
+                            pg_sql.SQL("ALTER TABLE {} ADD COLUMN {} " + pg_type).format(
+                                pg_sql.Identifier(table_name), pg_sql.Identifier(col)
+                            )
+                        )
+                    load_target = table_name
+                    widen_targets = [table_name]
+                    if mode == "upsert":
+                        self._ensure_unique_key(cursor, table_name, key_column)
+                        load_target = self._staging_table_name(table_name)
+                        self._create_table(cursor, load_target, column_types, temporary=True)
+                        widen_targets.append(load_target)
                 
-                create_table_sql = f"CREATE TABLE {table_name} ({', '.join(columns)})"
-                logger.info(f"Create table SQL: {create_table_sql}")
+                # Step 8: Insert data chunk by chunk, widening column types when a chunk does not fit them
+                logger.info(f"STEP 8: Inserting data (mode: {mode}, engine: {settings.INGEST_ENGINE})")
                 
                 try:
-                    cursor.execute(create_table_sql)
-                    conn.commit()
-                    logger.info("Table created successfully")
-                except Exception as e:
-                    logger.error(f"Failed to create table: {str(e)}")
-                    conn.rollback()
-                    raise ValueError(f"Failed to create table: {str(e)}")
-                
-                # Step 8: Insert data
-                logger.info("STEP 8: Inserting data")
-                rows_inserted = 0
-                
-                try:
-                    for _, row in df.iterrows():
-                        placeholders = ', '.join(['%s'] * len(row))
-                        columns_str = ', '.join([f'"{col}"' for col in df.columns])
-                        insert_sql = f"INSERT INTO {table_name} ({columns_str}) VALUES ({placeholders})"
-                        
-                        # Handle NaN values by converting to None (NULL in SQL)
-                        values = [None if pd.isna(val) else val for val in row]
-                        
-                        cursor.execute(insert_sql, values)
-                        rows_inserted += 1
-                        
-                        # Log progress for large files
-                        if rows_inserted % 1000 == 0:
-                            logger.info(f"Inserted {rows_inserted} rows so far")
+                    loader = BulkLoader(conn, chunk_size=settings.INGEST_CHUNK_ROWS, engine=settings.INGEST_ENGINE)
+                    started = time.perf_counter()
+                    rows_inserted = 0
+                    engines_used = set()
+                    # HyperLogLog / MinHash sketches of the key-like columns, built as the chunks pass
+                    sketch_builder = ColumnSketchBuilder()
+                    report("loading", rows_loaded=0)
+                    while df is not None:
+                        df.columns = cleaned_columns
+                        df, type_changes = type_inference.conform(df)
+                        self._alter_column_types(cursor, widen_targets, type_changes)
+                        sketch_builder.update(df, type_inference.column_types)
+                        chunk_stats = loader.load(load_target, df)
+                        rows_inserted += chunk_stats["rows"]
+                        engines_used.add(chunk_stats["engine"])
+                        report(rows_loaded=rows_inserted)
+                        df = next(chunks, None)
                     
+                    merge_counts = None
+                    if mode == "upsert":
+                        merge_counts = self._merge_upsert(cursor, load_target, table_name, cleaned_columns, key_column)
                     conn.commit()
-                    logger.info(f"Successfully inserted {rows_inserted} rows")
+                    elapsed = time.perf_counter() - started
+                    self.last_ingest_stats = {
+                        "mode": mode,
+                        "engine": "+".join(sorted(engines_used)),
+                        "rows": rows_inserted,
+                        "seconds": round(elapsed, 3),
+                        "rows_per_second": round(rows_inserted / elapsed, 1) if elapsed > 0 else float(rows_inserted),
+                        "chunk_rows": reader.chunk_rows,
+                    }
+                    if merge_counts:
+                        self.last_ingest_stats.update(merge_counts)
+                    logger.info(f"Successfully inserted {rows_inserted} rows "
+                                f"({self.last_ingest_stats['rows_per_second']} rows/sec)")
                 except Exception as e:
                     logger.error(f"Failed to insert data: {str(e)}")
                     conn.rollback()
                     raise ValueError(f"Failed to insert data: {str(e)}")
                 
-                # Step 9: Analyze schema
-                logger.info("STEP 9: Analyzing schema")
+                if mode == "replace":
+                    # Step 9: Swap the staging table in; readers see the old table or the new one, never neither
+                    logger.info("STEP 9: Swapping staging table into place")
+                    report("swapping")
+                    try:
+                        self._swap_in_staging_table(conn, staging_name, table_name)
+                        staging_name = None
+                        logger.info(f"Table '{table_name}' replaced atomically")
+                    except Exception as e:
+                        logger.error(f"Failed to swap in staging table: {str(e)}")
+                        conn.rollback()
+                        raise ValueError(f"Failed to replace table: {str(e)}")
+                else:
+                    # Step 9: Refresh planner statistics after the incremental load
+                    logger.info("STEP 9: Analyzing updated table")
+                    cursor.execute(pg_sql.SQL("ANALYZE {}").format(pg_sql.Identifier(table_name)))
+                    conn.commit()
+                
+                # Step 10: Analyze schema (only the columns touched by an incremental load)
+                logger.info("STEP 10: Analyzing schema")
+                report("analyzing")
                 try:
-                    analyzer = SchemaAnalyzer(conn)
-                    detailed_schema = analyzer.analyze_table(table_name)
+                    sketch_index = SketchIndex.load(cursor)
+                    if mode == "replace" or table_name in sketch_index.tables:
+                        if mode != "replace":
+                            previous_sketches = sketch_index.table(table_name)
+                            counts = None
+                            if mode == "upsert":
+                                counts = self._non_null_counts(
+                                    cursor, table_name, set(sketch_builder.sketches) | set(previous_sketches)
+                                )
+                            sketch_builder.merge(previous_sketches, counts)
+                        table_sketches = sketch_builder.finish(type_inference.column_types)
+                        sketch_index.set_table(table_name, table_sketches)
+                    else:
+                        # Rows loaded before sketches existed are not covered; leave the table unsketched
+                        table_sketches = None
+                    analyzer = SchemaAnalyzer(
+                        conn,
+                        stats_engine=settings.SCHEMA_STATS_ENGINE,
+                        exact_stats_max_rows=settings.SCHEMA_STATS_EXACT_MAX_ROWS,
+                        sketch_index=sketch_index,
+                    )
+                    previous_schema = self._stored_schema(cursor, table_name) if mode != "replace" else None
+                    if previous_schema:
+                        detailed_schema = analyzer.refresh_columns(table_name, previous_schema, cleaned_columns)
+                    else:
+                        detailed_schema = analyzer.analyze_table(table_name)
                     logger.info("Schema analysis completed successfully")
                 except Exception as e:
                     logger.error(f"Schema analysis failed: {str(e)}")
                     raise ValueError(f"Schema analysis failed: {str(e)}")
                 
-                # Step 10: Save schema to uploaded_tables
-                logger.info("STEP 10: Saving schema to uploaded_tables")
+                # Step 11: Index the table from the analyzed column statistics
+                if settings.INDEX_PLANNER_ENABLED:
+                    logger.info("STEP 11: Planning indexes")
+                    report("indexing")
+                    try:
+                        planner = IndexPlanner(
+                            conn,
+                            min_rows=settings.INDEX_MIN_ROWS,
+                            min_table_bytes=settings.INDEX_MIN_TABLE_KB * 1024,
+                            max_indexes=settings.INDEX_MAX_PER_TABLE,
+                        )
+                        detailed_schema["index_plan"] = planner.apply(table_name, planner.plan(table_name, detailed_schema))
+                    except Exception as e:
+                        # Indexes only speed queries up; a failed plan must not fail the upload
+                        logger.warning(f"Index planning failed: {str(e)}")
+                        conn.rollback()
+                
+                # Step 12: Save schema to uploaded_tables
+                logger.info("STEP 12: Saving schema to uploaded_tables")
+                report("saving_schema")
                 try:
-                    json_schema = json.dumps(detailed_schema)
-                    logger.info(f"Schema JSON length: {len(json_schema)}")
-                    
-                    cursor.execute(
-                        "INSERT INTO uploaded_tables (table_name, schema) VALUES (%s, %s) ON CONFLICT (table_name) DO UPDATE SET schema = EXCLUDED.schema",
-                        (table_name, json_schema)
-                    )
+                    # Recorded with the table's data signature so the background refresher can tell
+                    # when the stored statistics go stale
+                    version = SchemaTracker.save(cursor, table_name, detailed_schema,
+                                                 sketches=SketchIndex.serialize(table_sketches) if table_sketches is not None else None)
                     conn.commit()
-                    logger.info("Schema saved to uploaded_tables")
+                    logger.info(f"Schema saved to uploaded_tables (version {version})")
                 except Exception as e:
                     logger.error(f"Failed to save schema: {str(e)}")
                     conn.rollback()
@@ -740,11 +1286,20 @@ class DataService:
                     conn.rollback()
                 except:
                     pass
+                if staging_name:
+                    self._drop_table_quietly(conn, staging_name)
                 raise ValueError(f"Database error: {str(e)}")
             finally:
+                try:
+                    conn.rollback()
+                    conn.cursor().execute("SELECT pg_advisory_unlock(hashtext(%s))", (f"ingest:{table_name}",))
+                    conn.commit()
+                except Exception:
+                    logger.warning("Failed to release the ingest lock; discarding the connection")
+                    psycopg2.extensions.connection.close(conn)
                 try:
                     conn.close()
-                    logger.info("Database connection closed")
+                    logger.info("Database connection returned to the pool")
                 except:
                     logger.warning("Failed to close database connection")
         
@@ -755,65 +1310,216 @@ class DataService:
         except Exception as e:
             logger.error(f"Unexpected error in process_csv: {str(e)}", exc_info=True)
             raise ValueError(f"Unexpected error: {str(e)}")
-    async def execute_query(self, sql_query: str) -> List[Dict]:
+    async def execute_query(
+        self,
+        sql_query: str,
+        statement_timeout_ms: Optional[int] = None,
+        build: Callable[[Any, List[tuple]], Any] = ResultSet.from_rows
+    ) -> Any:
         """
-        Execute SQL query and return results
+        Execute SQL query and return its rows as a columnar, JSON-ready ResultSet (or
+        whatever `build(description, rows)` makes of the fetched tuples, e.g. an Arrow table).
+        Read-only mode, search_path and the default statement timeout come with the
+        execution pool's sessions; a different `statement_timeout_ms` is sent as SET LOCAL
+        in the same round trip (the statements share an implicit transaction).
         """
+        def run(conn) -> ResultSet:
+            # Plain tuples; ResultSet converts them column by column
+            cursor = conn.cursor(cursor_factory=psycopg2.extensions.cursor)
+            prefix = ""
+            if statement_timeout_ms is not None and statement_timeout_ms != settings.STATEMENT_TIMEOUT_MS:
+                prefix = pg_sql.SQL("SET LOCAL statement_timeout = {}; ").format(
+                    pg_sql.Literal(int(statement_timeout_ms))
+                ).as_string(cursor)
+            cursor.execute(prefix + sql_query)
+            return build(cursor.description, cursor.fetchall())
+
         try:
-            conn = get_db_connection()
-            try:
-                # Execute the query
-                cursor = conn.cursor()
-                # Enforce read-only, timeouts, and public schema
-                cursor.execute("SET search_path TO public")
-                cursor.execute("SET statement_timeout = %s", (settings.STATEMENT_TIMEOUT_MS,))
-                cursor.execute("SET idle_in_transaction_session_timeout = %s", (settings.STATEMENT_TIMEOUT_MS,))
-                cursor.execute("SET TRANSACTION READ ONLY")
-                cursor.execute(sql_query)
-                
-                # Fetch the results
-                rows = cursor.fetchall()
-                
-                # RealDictCursor already returns dictionaries
-                results = list(rows)
-                
-                logger.info(f"Executed SQL query: {sql_query[:100]}")
-                logger.info(f"Query returned {len(results)} rows")
-                
-                return results
-            
-            finally:
-                conn.close()
-        
+            results = await query_pool.run(run)
+            logger.info(f"Executed SQL query: {sql_query[:100]}")
+            logger.info(f"Query returned {len(results)} rows")
+            return results
+        except PoolTimeout:
+            raise
         except Exception as e:
             logger.error(f"Error executing SQL query: {str(e)}")
             raise HTTPException(status_code=400, detail=f"SQL Error: {str(e)}")
 
-    async def get_table_schema(self, table_name: str) -> dict:
+    async def cached_query(
+        self,
+        sql_query: str,
+        table_name: str,
+        data_version: Optional[int],
+        build: Callable[[Any, List[tuple]], Any] = ResultSet.from_rows
+    ) -> tuple:
         """
-        Get the schema for a specific table
+        execute_query through the result cache, keyed by the normalized SQL and the data
+        version of the table it reads. Queries that read any other table (or that cannot
+        be scanned for table names) are not cached, as that table's changes would not
+        invalidate them. `data_version` comes from the schema cache, so after a change
+        made through another worker a result can be served stale for up to
+        SCHEMA_CACHE_TTL_S. Returns (result, "hit" | "miss" | "off").
+        """
+        if (not result_cache.enabled or data_version is None
+                or referenced_tables(sql_query) != {table_name}):
+            return await self.execute_query(sql_query, build=build), "off"
+        key = ResultCache.key(table_name, data_version, sql_query, build.__qualname__)
+        cached = result_cache.get(key)
+        if cached is not None:
+            return cached, "hit"
+        generation = result_cache.generation(table_name)
+        results = await self.execute_query(sql_query, build=build)
+        size = await asyncio.to_thread(
+            results.approx_bytes if isinstance(results, ResultSet) else lambda: getattr(results, "nbytes", 0)
+        )
+        result_cache.put(key, results, size, generation)
+        return results, "miss"
+
+    async def stream_query(self, sql_query: str, fetch_rows: Optional[int] = None) -> AsyncIterator[ResultSet]:
         """
+        Execute SQL query through a named server-side cursor and yield its rows in batches
+        (ResultSets) of `fetch_rows`, so only one batch is held in memory at a time.
+        The connection is held until the iterator is exhausted or closed.
+        """
+        fetch_rows = fetch_rows or settings.STREAM_FETCH_ROWS
+        conn = await asyncio.to_thread(query_pool.getconn)
         try:
-            conn = get_db_connection()
-            try:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "SELECT schema FROM uploaded_tables WHERE table_name = %s",
-                    (table_name,)
-                )
-                result = cursor.fetchone()
+            # Named cursors live inside a transaction (read-only by the session default);
+            # the pool restores autocommit when the connection comes back
+            conn.autocommit = False
+            cursor = conn.cursor()
+            await asyncio.to_thread(
+                cursor.execute, "SET LOCAL idle_in_transaction_session_timeout = %s", (settings.STREAM_IDLE_TIMEOUT_MS,)
+            )
+            cursor = conn.cursor(name=f"stream_{uuid.uuid4().hex}", cursor_factory=psycopg2.extensions.cursor)
+            cursor.itersize = fetch_rows
+            await asyncio.to_thread(cursor.execute, sql_query)
+            logger.info(f"Streaming SQL query: {sql_query[:100]}")
+            streamed = 0
+            while True:
+                rows = await asyncio.to_thread(cursor.fetchmany, cursor.itersize)
+                if not rows:
+                    break
+                streamed += len(rows)
+                yield ResultSet.from_rows(cursor.description, rows)
+            logger.info(f"Query streamed {streamed} rows")
+        finally:
+            # Rolling back closes the server-side cursor. Not awaited: a cancelled stream
+            # must not wait for a fetch still running in its thread.
+            asyncio.get_running_loop().run_in_executor(None, conn.close)
 
-                if not result:
-                    logger.error(f"Table '{table_name}' not found")
-                    raise HTTPException(status_code=404, detail=f"Table '{table_name}' not found")
+    async def fetch_page(self, sql_query: str, table_name: str, page_size: int,
+                         cursor_token: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Execute SQL query one page at a time with keyset pagination: the query is wrapped
+        as a subquery, ordered by a stable sort key and resumed after the last row of the
+        previous page (carried in an opaque cursor token), so a deep page costs about the
+        same as the first one. Returns the page as a ResultSet plus the next token.
+        """
+        if cursor_token:
+            try:
+                plan, last, skip = PagePlan.from_cursor(sql_query, cursor_token)
+            except PageCursorError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        else:
+            plan, last, skip = None, None, 0
+
+        def unique_indexes(cursor) -> List[List[tuple]]:
+            cursor.execute("""
+                SELECT array_agg(a.attname::text ORDER BY k.ord), array_agg(a.attnotnull ORDER BY k.ord)
+                FROM pg_index i
+                CROSS JOIN LATERAL unnest(i.indkey) WITH ORDINALITY AS k(attnum, ord)
+                JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+                WHERE i.indrelid = to_regclass(quote_ident(%s))
+                  AND i.indisunique AND i.indpred IS NULL AND i.indexprs IS NULL
+                GROUP BY i.indexrelid, i.indisprimary
+                ORDER BY i.indisprimary DESC, count(*)
+            """, (table_name,))
+            return [list(zip(names, not_null)) for names, not_null in cursor.fetchall()]
+
+        def run(conn) -> Dict[str, Any]:
+            cursor = conn.cursor(cursor_factory=psycopg2.extensions.cursor)
+            page_plan = plan
+            if page_plan is None:
+                # First page: pick the sort key from the result's columns
+                cursor.execute(pg_sql.SQL("SELECT * FROM ({}) AS page_source LIMIT 0").format(pg_sql.SQL(sql_query)))
+                page_plan = PagePlan.for_result(sql_query, cursor.description, unique_indexes(cursor), table_name)
+            cursor.execute(page_plan.page_query(sql_query, page_size, last, skip))
+            rows = cursor.fetchall()
+            has_more = len(rows) > page_size
+            rows = rows[:page_size]
+            return {
+                "results": ResultSet.from_rows(cursor.description, rows),
+                "next_cursor": page_plan.next_cursor(sql_query, cursor.description, rows, last, skip)
+                if has_more else None,
+                "sort_key": [key.column for key in page_plan.keys],
+            }
 
-                schema = result["schema"]
-                return schema
+        try:
+            page = await query_pool.run(run)
+            logger.info(f"Fetched page of {len(page['results'])} rows: {sql_query[:100]}")
+            return page
+        except PoolTimeout:
+            raise
+        except Exception as e:
+            logger.error(f"Error executing SQL query: {str(e)}")
+            raise HTTPException(status_code=400, detail=f"SQL Error: {str(e)}")
 
-            finally:
+    async def export_query(self, sql_query: str, copy_format: str = "csv", compress: bool = True) -> AsyncIterator[bytes]:
+        """
+        Run SQL query as COPY (...) TO STDOUT (CSV with header, or PostgreSQL binary) and
+        yield the output in chunks, gzip-compressed when `compress` is set. Rows never
+        become Python values; the export runs under EXPORT_TIMEOUT_MS and EXPORT_MAX_MB.
+        """
+        options = "FORMAT csv, HEADER" if copy_format == "csv" else "FORMAT binary"
+        copy_sql = f"COPY ({sql_query}) TO STDOUT WITH ({options})"
+        conn = await asyncio.to_thread(query_pool.getconn)
+        export = None
+        try:
+            # SET LOCAL needs a transaction; the pool restores autocommit afterwards
+            conn.autocommit = False
+            await asyncio.to_thread(
+                conn.cursor().execute, "SET LOCAL statement_timeout = %s", (settings.EXPORT_TIMEOUT_MS,)
+            )
+            export = CopyExport(conn, copy_sql, max_bytes=settings.EXPORT_MAX_MB * 1024 * 1024,
+                                compress=compress, chunk_bytes=settings.EXPORT_CHUNK_BYTES).start()
+            logger.info(f"Exporting SQL query: {sql_query[:100]}")
+            while True:
+                chunk = await asyncio.to_thread(export.next_chunk)
+                if chunk is None:
+                    break
+                yield chunk
+            logger.info(f"Export finished: {export.bytes_copied} bytes")
+        finally:
+            def release():
+                if export is not None:
+                    export.cancel()
+                    export.join()
                 conn.close()
+            # Not awaited, as in stream_query; the COPY thread is stopped before the
+            # connection goes back to the pool
+            asyncio.get_running_loop().run_in_executor(None, release)
+
+    async def get_table_schema(self, table_name: str) -> dict:
+        """
+        Get the schema for a specific table
+        """
+        def run(conn):
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT schema FROM uploaded_tables WHERE table_name = %s",
+                (table_name,)
+            )
+            return cursor.fetchone()
 
-        except HTTPException:
+        try:
+            result = await db_pool.run(run)
+            if not result:
+                logger.error(f"Table '{table_name}' not found")
+                raise HTTPException(status_code=404, detail=f"Table '{table_name}' not found")
+            return result["schema"]
+
+        except (HTTPException, PoolTimeout):
             raise
         except Exception as e:
             logger.error(f"Error getting table schema: {str(e)}")
@@ -832,71 +1538,122 @@ class DataService:
         return schema
 
     async def save_schema_annotations(self, table_name: str, annotations: List[Dict[str, Any]]) -> None:
+        def run(conn) -> None:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                INSERT INTO schema_annotations (table_name, annotations, updated_at)
+                VALUES (%s, %s, CURRENT_TIMESTAMP)
+                ON CONFLICT (table_name) DO UPDATE SET
+                    annotations = EXCLUDED.annotations,
+                    updated_at = CURRENT_TIMESTAMP
+                """,
+                (table_name, json.dumps(annotations))
+            )
+            conn.commit()
+
         try:
-            conn = get_db_connection()
-            try:
-                cursor = conn.cursor()
-                cursor.execute(
-                    """
-                    INSERT INTO schema_annotations (table_name, annotations, updated_at)
-                    VALUES (%s, %s, CURRENT_TIMESTAMP)
-                    ON CONFLICT (table_name) DO UPDATE SET
-                        annotations = EXCLUDED.annotations,
-                        updated_at = CURRENT_TIMESTAMP
-                    """,
-                    (table_name, json.dumps(annotations))
-                )
-                conn.commit()
-            finally:
-                conn.close()
+            await db_pool.run(run)
+        except PoolTimeout:
+            raise
         except Exception as e:
             logger.error(f"Error saving schema annotations: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Error saving annotations: {str(e)}")
+        finally:
+            schema_cache.invalidate(table_name)
+
+    @staticmethod
+    def _normalize_annotations(annotations: Any) -> Dict[str, Any]:
+        if isinstance(annotations, str):
+            annotations = json.loads(annotations)
+        if isinstance(annotations, list):
+            return {"columns": annotations, "aliases": [], "metrics": []}
+        if isinstance(annotations, dict):
+            annotations.setdefault("columns", [])
+            annotations.setdefault("aliases", [])
+            annotations.setdefault("metrics", [])
+            return annotations
+        return {"columns": [], "aliases": [], "metrics": []}
+
+    async def load_schemas_with_annotations(self, table_name: Optional[str] = None) -> List[tuple]:
+        """
+        (table name, schema) of one table, or of the most recently changed tables up to the
+        schema cache size, in one query. Each schema carries its `annotations`, its
+        `data_version` (the result cache key) and an `annotations_version` (with the data
+        version, the compiled prompt context key).
+        """
+        def run(conn):
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT u.table_name, u.schema, u.version, a.annotations,
+                       a.updated_at::text AS annotations_version
+                FROM uploaded_tables u
+                LEFT JOIN schema_annotations a ON a.table_name = u.table_name
+                WHERE %(table_name)s::text IS NULL OR u.table_name = %(table_name)s
+                ORDER BY u.version DESC NULLS LAST
+                LIMIT %(limit)s
+                """,
+                {"table_name": table_name, "limit": max(1, settings.SCHEMA_CACHE_MAX_ENTRIES)}
+            )
+            return cursor.fetchall()
+
+        try:
+            rows = await db_pool.run(run)
+        except PoolTimeout:
+            raise
+        except Exception as e:
+            logger.error(f"Error getting table schema: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Error getting table schema: {str(e)}")
+
+        schemas = []
+        for row in rows:
+            schema = row["schema"]
+            if isinstance(schema, str):
+                try:
+                    schema = json.loads(schema)
+                except Exception:
+                    schema = {}
+            schema = schema or {}
+            schema["annotations"] = self._normalize_annotations(row["annotations"])
+            # Cache keys; not part of the prompts
+            schema["data_version"] = row["version"]
+            schema["annotations_version"] = row["annotations_version"]
+            schemas.append((row["table_name"], schema))
+        return schemas
 
     async def get_schema_annotations(self, table_name: str) -> Dict[str, Any]:
+        def run(conn):
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT annotations FROM schema_annotations WHERE table_name = %s",
+                (table_name,)
+            )
+            return cursor.fetchone()
+
         try:
-            conn = get_db_connection()
-            try:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "SELECT annotations FROM schema_annotations WHERE table_name = %s",
-                    (table_name,)
-                )
-                result = cursor.fetchone()
-                if not result:
-                    return {"columns": [], "aliases": [], "metrics": []}
-                annotations = result.get("annotations")
-                if isinstance(annotations, str):
-                    annotations = json.loads(annotations)
-                if isinstance(annotations, list):
-                    return {"columns": annotations, "aliases": [], "metrics": []}
-                if isinstance(annotations, dict):
-                    annotations.setdefault("columns", [])
-                    annotations.setdefault("aliases", [])
-                    annotations.setdefault("metrics", [])
-                    return annotations
-                return {"columns": [], "aliases": [], "metrics": []}
-            finally:
-                conn.close()
+            result = await db_pool.run(run)
+            return self._normalize_annotations(result.get("annotations") if result else None)
+        except PoolTimeout:
+            raise
         except Exception as e:
             logger.error(f"Error fetching schema annotations: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Error fetching annotations: {str(e)}")
 
     async def log_query_history(self, table_name: str, natural_query: str, sql_query: str, status: str, error: Optional[str] = None) -> None:
+        def run(conn) -> None:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                INSERT INTO query_history (table_name, natural_query, sql_query, status, error)
+                VALUES (%s, %s, %s, %s, %s)
+                """,
+                (table_name, natural_query, sql_query, status, error)
+            )
+            conn.commit()
+
         try:
-            conn = get_db_connection()
-            try:
-                cursor = conn.cursor()
-                cursor.execute(
-                    """
-                    INSERT INTO query_history (table_name, natural_query, sql_query, status, error)
-                    VALUES (%s, %s, %s, %s, %s)
-                    """,
-                    (table_name, natural_query, sql_query, status, error)
-                )
-                conn.commit()
-            finally:
-                conn.close()
+            await db_pool.run(run)
         except Exception as e:
             logger.error(f"Error logging query history: {str(e)}")
 
@@ -907,83 +1664,91 @@ class DataService:
             raise HTTPException(status_code=400, detail="Invalid new table name.")
         if old_name == new_name:
             return
+
+        def run(conn) -> None:
+            cursor = conn.cursor()
+            # Rename actual table
+            cursor.execute(
+                pg_sql.SQL("ALTER TABLE {} RENAME TO {}")
+                .format(pg_sql.Identifier(old_name), pg_sql.Identifier(new_name))
+            )
+            # Update metadata tables
+            cursor.execute(
+                "UPDATE uploaded_tables SET table_name = %s, version = nextval('schema_version_seq') WHERE table_name = %s",
+                (new_name, old_name)
+            )
+            cursor.execute(
+                "UPDATE schema_annotations SET table_name = %s WHERE table_name = %s",
+                (new_name, old_name)
+            )
+            cursor.execute(
+                "UPDATE query_history SET table_name = %s WHERE table_name = %s",
+                (new_name, old_name)
+            )
+            cursor.execute(
+                "UPDATE dashboard_pins SET table_name = %s WHERE table_name = %s",
+                (new_name, old_name)
+            )
+            conn.commit()
+
         try:
-            conn = get_db_connection()
-            try:
-                cursor = conn.cursor()
-                # Rename actual table
-                cursor.execute(
-                    pg_sql.SQL("ALTER TABLE {} RENAME TO {}")
-                    .format(pg_sql.Identifier(old_name), pg_sql.Identifier(new_name))
-                )
-                # Update metadata tables
-                cursor.execute(
-                    "UPDATE uploaded_tables SET table_name = %s WHERE table_name = %s",
-                    (new_name, old_name)
-                )
-                cursor.execute(
-                    "UPDATE schema_annotations SET table_name = %s WHERE table_name = %s",
-                    (new_name, old_name)
-                )
-                cursor.execute(
-                    "UPDATE query_history SET table_name = %s WHERE table_name = %s",
-                    (new_name, old_name)
-                )
-                cursor.execute(
-                    "UPDATE dashboard_pins SET table_name = %s WHERE table_name = %s",
-                    (new_name, old_name)
-                )
-                conn.commit()
-            finally:
-                conn.close()
+            await db_pool.run(run)
+        except PoolTimeout:
+            raise
         except Exception as e:
             logger.error(f"Error renaming table: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Error renaming table: {str(e)}")
+        finally:
+            invalidate_table_caches(old_name)
+            invalidate_table_caches(new_name)
 
     async def get_query_history(self, limit: int = 20) -> List[Dict[str, Any]]:
+        def run(conn) -> List[Dict[str, Any]]:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT * FROM query_history ORDER BY created_at DESC LIMIT %s",
+                (limit,)
+            )
+            return list(cursor.fetchall())
+
         try:
-            conn = get_db_connection()
-            try:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "SELECT * FROM query_history ORDER BY created_at DESC LIMIT %s",
-                    (limit,)
-                )
-                return list(cursor.fetchall())
-            finally:
-                conn.close()
+            return await db_pool.run(run)
+        except PoolTimeout:
+            raise
         except Exception as e:
             logger.error(f"Error fetching query history: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Error fetching history: {str(e)}")
 
     async def pin_dashboard(self, table_name: str, natural_query: str, sql_query: str, visualization_type: str) -> None:
+        def run(conn) -> None:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                INSERT INTO dashboard_pins (table_name, natural_query, sql_query, visualization_type)
+                VALUES (%s, %s, %s, %s)
+                """,
+                (table_name, natural_query, sql_query, visualization_type)
+            )
+            conn.commit()
+
         try:
-            conn = get_db_connection()
-            try:
-                cursor = conn.cursor()
-                cursor.execute(
-                    """
-                    INSERT INTO dashboard_pins (table_name, natural_query, sql_query, visualization_type)
-                    VALUES (%s, %s, %s, %s)
-                    """,
-                    (table_name, natural_query, sql_query, visualization_type)
-                )
-                conn.commit()
-            finally:
-                conn.close()
+            await db_pool.run(run)
+        except PoolTimeout:
+            raise
         except Exception as e:
             logger.error(f"Error pinning dashboard: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Error pinning dashboard: {str(e)}")
 
     async def get_dashboard_pins(self) -> List[Dict[str, Any]]:
+        def run(conn) -> List[Dict[str, Any]]:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM dashboard_pins ORDER BY created_at DESC")
+            return list(cursor.fetchall())
+
         try:
-            conn = get_db_connection()
-            try:
-                cursor = conn.cursor()
-                cursor.execute("SELECT * FROM dashboard_pins ORDER BY created_at DESC")
-                return list(cursor.fetchall())
-            finally:
-                conn.close()
+            return await db_pool.run(run)
+        except PoolTimeout:
+            raise
         except Exception as e:
             logger.error(f"Error fetching dashboard pins: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Error fetching dashboard pins: {str(e)}")
@@ -1032,7 +1797,7 @@ def _is_safe_select_only(sql: str) -> bool:
         "insert", "update", "delete", "drop", "alter", "create", "truncate",
         "grant", "revoke", "vacuum", "analyze", "explain", "execute", "merge",
         "call", "copy", "set", "show", "refresh", "load", "do", "begin",
-        "commit", "rollback"
+        "commit", "rollback", "set_config"
     ]
     if re.search(r'\b(' + "|".join(forbidden) + r')\b', sql_lower):
         return False
@@ -1040,7 +1805,8 @@ def _is_safe_select_only(sql: str) -> bool:
 
 
 def _enforce_limit(sql: str, default_limit: int) -> str:
-    if re.search(r'\blimit\b', sql, flags=re.IGNORECASE):
+    # Only a LIMIT of the outer query caps the result, not one in a subquery or CTE
+    if has_top_level_limit(sql):
         return sql
     return f"{sql.strip()} LIMIT {default_limit}"
 
@@ -1132,25 +1898,96 @@ def _infer_visualization_type(results: List[Dict[str, Any]], table_schema: dict)
     return "table"
 
 
-def validate_and_prepare_sql(sql_query: str, table_schema: dict) -> str:
+def validate_sql(sql_query: str, table_schema: dict) -> str:
     sql_query = _sanitize_sql(sql_query)
     if not _is_safe_select_only(sql_query):
         raise HTTPException(status_code=400, detail="Unsafe SQL detected. Only SELECT queries are allowed.")
     _validate_identifiers(sql_query, table_schema)
-    return _enforce_limit(sql_query, settings.DEFAULT_QUERY_LIMIT)
+    return sql_query
+
+
+def validate_and_prepare_sql(sql_query: str, table_schema: dict, limit: Optional[int] = None) -> str:
+    return _enforce_limit(validate_sql(sql_query, table_schema), limit or settings.DEFAULT_QUERY_LIMIT)
+
+
+RESULT_CACHE_HEADER = "X-Result-Cache"
+
+
+def _negotiate_result_format(http_request: Request, requested: Optional[str]) -> str:
+    """
+    Result format from the `format` query parameter, else from the Accept header
+    """
+    if requested:
+        return requested
+    accept = http_request.headers.get("accept", "")
+    if ARROW_STREAM_MEDIA_TYPE in accept:
+        return "arrow"
+    if PARQUET_MEDIA_TYPE in accept:
+        return "parquet"
+    return "json"
+
+
+async def _binary_result_response(data_service: "DataService", sql_query: str, result_format: str,
+                                  table_name: str, data_version: Optional[int]) -> Response:
+    """
+    Execute SQL and answer with an Arrow IPC stream or a Parquet file; the SQL travels in
+    the schema metadata
+    """
+    try:
+        require_pyarrow()
+    except RuntimeError as e:
+        raise HTTPException(status_code=406, detail=str(e))
+    table, cache_status = await data_service.cached_query(sql_query, table_name, data_version, build=arrow_table)
+    table = table.replace_schema_metadata({"sql_query": sql_query})
+    if result_format == "arrow":
+        body = await asyncio.to_thread(arrow_ipc_bytes, table)
+        return Response(content=body, media_type=ARROW_STREAM_MEDIA_TYPE,
+                        headers={RESULT_CACHE_HEADER: cache_status})
+    body = await asyncio.to_thread(parquet_bytes, table)
+    return Response(content=body, media_type=PARQUET_MEDIA_TYPE, headers={
+        "Content-Disposition": 'attachment; filename="result.parquet"',
+        RESULT_CACHE_HEADER: cache_status,
+    })
 
 
 async def _get_schema_with_annotations(table_name: str, data_service: "DataService") -> dict:
-    schema = await data_service.get_table_schema(table_name)
-    annotations = await data_service.get_schema_annotations(table_name)
-    if isinstance(schema, str):
-        try:
-            schema = json.loads(schema)
-        except Exception:
-            schema = {}
-    schema = schema or {}
-    schema["annotations"] = annotations
-    return schema
+    """
+    Schema of a table with its annotations, read-only and shared between requests
+    (served from the schema cache)
+    """
+    schema = schema_cache.get(table_name)
+    if schema is not None:
+        return schema
+    generation = schema_cache.generation(table_name)
+    loaded = await data_service.load_schemas_with_annotations(table_name)
+    if not loaded:
+        logger.error(f"Table '{table_name}' not found")
+        raise HTTPException(status_code=404, detail=f"Table '{table_name}' not found")
+    return schema_cache.put(table_name, loaded[0][1], generation)
+
+
+async def _warm_up_llm(table_name: str) -> None:
+    try:
+        schema = await _get_schema_with_annotations(table_name, get_data_service())
+        result = await LLMService().warm_up(schema)
+        logger.info(f"LLM warm-up for '{table_name}': {result}")
+    except Exception as e:
+        logger.warning(f"LLM warm-up for '{table_name}' failed: {getattr(e, 'detail', None) or str(e)}")
+
+
+def _schedule_llm_warm_up(table_name: str, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+    """
+    Warm the LLM for a freshly uploaded table in the background (LLM_WARMUP_ON_UPLOAD);
+    pass the event loop when calling from a worker thread
+    """
+    if not settings.LLM_WARMUP_ON_UPLOAD:
+        return
+    if loop is not None:
+        asyncio.run_coroutine_threadsafe(_warm_up_llm(table_name), loop)
+        return
+    task = asyncio.create_task(_warm_up_llm(table_name))
+    _llm_warmup_tasks.add(task)
+    task.add_done_callback(_llm_warmup_tasks.discard)
 
 
 def _detect_clarification_questions(query: str, table_schema: dict) -> List[str]:
@@ -1202,6 +2039,77 @@ def _detect_clarification_questions(query: str, table_schema: dict) -> List[str]
     return questions[:2]
 
 
+async def _spool_upload(file: UploadFile) -> str:
+    """
+    Copy an upload to a temporary file on disk without reading it into memory at once.
+    """
+    fd, path = tempfile.mkstemp(suffix=".csv", dir=settings.UPLOAD_SPOOL_DIR)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                block = await file.read(settings.UPLOAD_READ_CHUNK_BYTES)
+                if not block:
+                    break
+                out.write(block)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def _remove_spooled_upload(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        logger.warning(f"Failed to remove spooled upload {path}")
+
+
+def _ingest_memory_bytes(source: CsvSource) -> int:
+    """
+    Memory reserved in the CPU pool for one ingest: the parsed chunks (bounded by the
+    ingest memory budget; small files need less) plus the worker's own footprint
+    """
+    size = os.path.getsize(source) if isinstance(source, str) else len(source)
+    # Parsed pandas chunks take a few times the size of their CSV text
+    data_bytes = min(size * 4, settings.INGEST_MEMORY_BUDGET_MB * 1024 * 1024)
+    return data_bytes + settings.CPU_TASK_BASE_MB * 1024 * 1024
+
+
+def _ingest_task(source: CsvSource, table_name: str, mode: str, key_column: Optional[str],
+                 channel: TaskChannel) -> Dict[str, Any]:
+    """
+    Worker-process body of an upload: the whole ingest pipeline, reporting its progress
+    (and picking up cancellation) through `channel`
+    """
+    data_service = DataService()
+    schema = data_service.process_csv_sync(
+        source, table_name, progress=channel.report, mode=mode, key_column=key_column
+    )
+    return {"schema": schema, "ingest": data_service.last_ingest_stats}
+
+
+def _run_ingestion_job(job: IngestionJob, spool_path: str, mode: str, key_column: Optional[str]) -> Dict[str, Any]:
+    """
+    Worker-thread body of a background upload; the pipeline itself runs in the CPU pool
+    """
+    try:
+        result = cpu_pool.run_blocking(
+            _ingest_task, spool_path, job.table_name, mode, key_column,
+            memory_bytes=_ingest_memory_bytes(spool_path),
+            progress=job.update,
+            is_cancelled=lambda: job.cancel_requested,
+        )
+    finally:
+        invalidate_table_caches(job.table_name)
+    schema = result["schema"]
+    return {
+        "table_name": job.table_name,
+        "row_count": schema.get("row_count"),
+        "column_count": len(schema.get("columns", [])),
+        "ingest": result["ingest"],
+    }
+
+
 # Dependency injections
 def get_llm_service():
     return LLMService()
@@ -1213,12 +2121,19 @@ def get_data_service():
 # API endpoints
 @app.post("/api/upload")
 async def upload_file(
+    request: Request,
     file: UploadFile = File(...),
     table_name: str = Form(...),
+    background: bool = Form(False),
+    mode: str = Form("replace"),
+    key_column: Optional[str] = Form(None),
     data_service: DataService = Depends(get_data_service)
 ):
     """
-    Upload and process a CSV file
+    Upload and process a CSV file.
+    mode: replace (default) swaps in a new table, append adds rows, upsert inserts or
+    updates rows matched on key_column; new CSV columns are added to the table.
+    With background=true the file is queued as an ingestion job and a job id is returned immediately.
     """
     logger.info(f"Received upload request for file: {file.filename}, table: {table_name}")
     
@@ -1229,40 +2144,84 @@ async def upload_file(
             logger.error(f"Invalid table name '{table_name}': {msg}")
             raise HTTPException(status_code=400, detail=msg)
             
+        if mode not in INGEST_MODES:
+            msg = f"Invalid mode '{mode}'. Use one of: {', '.join(INGEST_MODES)}"
+            logger.error(msg)
+            raise HTTPException(status_code=400, detail=msg)
+        if mode == "upsert" and not key_column:
+            msg = "Upsert mode requires key_column"
+            logger.error(msg)
+            raise HTTPException(status_code=400, detail=msg)
+            
         # Check file extension
         if not file.filename.lower().endswith('.csv'):
             msg = "Only CSV files are supported"
             logger.error(f"Invalid file type: {file.filename}")
             raise HTTPException(status_code=400, detail=msg)
         
-        # Read the file content
-        logger.info("Reading file content")
-        file_content = await file.read()
+        # Spool the upload to disk in fixed-size reads instead of holding it in memory
+        logger.info("Spooling file content to disk")
+        spool_path = await _spool_upload(file)
+        file_size = os.path.getsize(spool_path)
         
-        if not file_content:
+        if not file_size:
+            os.remove(spool_path)
             msg = "Uploaded file is empty"
             logger.error(msg)
             raise HTTPException(status_code=400, detail=msg)
         
-        logger.info(f"File content read successfully, size: {len(file_content)} bytes")
+        logger.info(f"File spooled to {spool_path}, size: {file_size} bytes")
+        
+        if background:
+            loop = asyncio.get_running_loop()
+
+            def run(job: IngestionJob) -> Dict[str, Any]:
+                result = _run_ingestion_job(job, spool_path, mode, key_column)
+                _schedule_llm_warm_up(job.table_name, loop)
+                return result
+
+            job = ingestion_jobs.submit(
+                table_name,
+                file.filename,
+                run=run,
+                on_finish=lambda: _remove_spooled_upload(spool_path),
+            )
+            return JSONResponse(status_code=202, content={
+                "message": "File accepted for background processing",
+                "table_name": table_name,
+                "job_id": job.id,
+                "status_url": f"/api/upload/jobs/{job.id}"
+            })
         
         # Process the CSV
         logger.info("Processing CSV file")
         try:
-            schema = await data_service.process_csv(file_content, table_name)
+            schema = await data_service.process_csv(
+                spool_path, table_name, mode=mode, key_column=key_column, is_cancelled=request.is_disconnected
+            )
             logger.info("CSV processed successfully")
+            _schedule_llm_warm_up(table_name)
             
             return {
                 "message": "File uploaded and processed successfully",
                 "table_name": table_name,
-                "schema": schema
+                "schema": schema,
+                "ingest": data_service.last_ingest_stats
             }
+        except CpuTaskCancelled:
+            logger.info(f"Upload of '{table_name}' cancelled: client disconnected")
+            raise HTTPException(status_code=499, detail="Client closed request")
+        except CpuPoolBusy as e:
+            logger.warning(f"Upload of '{table_name}' rejected: {str(e)}")
+            raise HTTPException(status_code=503, detail=f"Server busy, retry later: {str(e)}")
         except ValueError as e:
             logger.error(f"CSV processing error: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Error processing CSV: {str(e)}")
         except Exception as e:
             logger.error(f"Unexpected error processing CSV: {str(e)}", exc_info=True)
             raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+        finally:
+            _remove_spooled_upload(spool_path)
             
     except HTTPException:
         # Re-raise HTTP exceptions
@@ -1270,10 +2229,39 @@ async def upload_file(
     except Exception as e:
         logger.error(f"Unhandled exception in upload_file: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
-    
+
+
+@app.get("/api/upload/jobs")
+async def list_upload_jobs():
+    return {"jobs": [job.to_dict() for job in ingestion_jobs.list()]}
+
+
+@app.get("/api/upload/jobs/{job_id}")
+async def get_upload_job(job_id: str):
+    """
+    Stage, rows loaded, throughput and ETA of a background upload
+    """
+    job = ingestion_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Upload job '{job_id}' not found")
+    return job.to_dict()
+
+
+@app.post("/api/upload/jobs/{job_id}/cancel")
+async def cancel_upload_job(job_id: str):
+    """
+    Stop a queued or running background upload; a replace upload leaves the existing table untouched
+    """
+    job = ingestion_jobs.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Upload job '{job_id}' not found")
+    return job.to_dict()
+
+
 @app.post("/api/query", response_model=QueryResponse)
 async def process_query(
     request: QueryRequest,
+    shape: ResultShape = "records",
     llm_service: LLMService = Depends(get_llm_service),
     data_service: DataService = Depends(get_data_service)
 ):
@@ -1325,23 +2313,20 @@ async def process_query(
                 await data_service.log_query_history(request.table_name, request.query, sql_query, "error", exec_err.detail)
                 raise
         
-        # Convert Decimal objects to float for JSON serialization
-        serializable_results = json.loads(json.dumps(results, cls=CustomJSONEncoder))
-        
         # Analyze the results
         analysis = await llm_service.analyze_results(request.query, sql_query, results, schema)
         
-        # Prepare the response
-        response = QueryResponse(
-            natural_language_response=analysis["natural_language_response"],
-            sql_query=sql_query,
-            data=serializable_results,  # Use the serializable results here
-            explanation=analysis["explanation"],
-            visualization_type=analysis["visualization_type"]
-        )
-        
         await data_service.log_query_history(request.table_name, request.query, sql_query, "success")
-        return response
+        # Result values are JSON-ready already: encode the response in a single pass
+        return JSONResponse(content={
+            "natural_language_response": analysis["natural_language_response"],
+            "sql_query": sql_query,
+            "data": results.payload(shape),
+            "explanation": analysis["explanation"],
+            "visualization_type": analysis["visualization_type"],
+            "status": None,
+            "clarification_questions": None,
+        })
         
     except Exception as e:
         logger.error(f"Error in process_query: {str(e)}")
@@ -1361,15 +2346,14 @@ async def read_root():
 async def health_check():
     try:
         # Test database connection
-        conn = get_db_connection()
-        conn.cursor().execute("SELECT 1")
-        conn.close()
+        await db_pool.run(lambda conn: conn.cursor().execute("SELECT 1"))
         
         return {
             "status": "ok", 
             "version": "1.0.0",
             "database": "connected",
-            "postgresql_version": os.getenv("POSTGRES_VERSION", "Unknown")
+            "postgresql_version": os.getenv("POSTGRES_VERSION", "Unknown"),
+            "db_pool": {"default": db_pool.metrics(), "query": query_pool.metrics()}
         }
     except Exception as e:
         logger.error(f"Health check failed: {str(e)}")
@@ -1379,6 +2363,31 @@ async def health_check():
         }
 
 
+@app.get("/api/db/pool")
+async def db_pool_metrics():
+    """
+    Size, usage, acquisition waits and timeouts of the connection pools (this process only):
+    `default` for application tables, `query` for generated SQL
+    """
+    return {"default": db_pool.metrics(), "query": query_pool.metrics()}
+
+
+@app.get("/api/cache/schemas")
+async def schema_cache_metrics():
+    """
+    Entries, hits, misses and invalidations of the schema cache (this process only)
+    """
+    return schema_cache.metrics()
+
+
+@app.get("/api/cache/results")
+async def result_cache_metrics():
+    """
+    Entries, size, hits, misses and evictions of the query result cache (this process only)
+    """
+    return result_cache.metrics()
+
+
 @app.get("/api/llm/health")
 async def llm_health_check():
     """
@@ -1417,6 +2426,25 @@ async def llm_health_check():
     return result
 
 
+@app.post("/api/llm/warmup")
+async def llm_warmup(
+    request: WarmupRequest,
+    llm_service: LLMService = Depends(get_llm_service),
+    data_service: DataService = Depends(get_data_service)
+):
+    """
+    Send a table's prompt prefix to the primary LLM so that its first question is
+    answered from the server's prefix cache; call when the user selects a table
+    """
+    schema = await _get_schema_with_annotations(request.table_name, data_service)
+    try:
+        return await llm_service.warm_up(schema)
+    except Exception as e:
+        detail = getattr(e, "detail", None) or str(e)
+        logger.warning(f"LLM warm-up for '{request.table_name}' failed: {detail}")
+        raise HTTPException(status_code=502, detail=f"LLM warm-up failed: {detail}")
+
+
 @app.get("/api/llm/test")
 async def llm_test():
     """
@@ -1464,15 +2492,15 @@ async def llm_test():
 # Get available tables
 @app.get("/api/tables")
 async def get_tables():
+    def run(conn) -> List[str]:
+        cursor = conn.cursor()
+        cursor.execute("SELECT table_name FROM uploaded_tables")
+        return [row["table_name"] for row in cursor.fetchall()]
+
     try:
-        conn = get_db_connection()
-        try:
-            cursor = conn.cursor()
-            cursor.execute("SELECT table_name FROM uploaded_tables")
-            tables = [row["table_name"] for row in cursor.fetchall()]
-            return {"tables": tables}
-        finally:
-            conn.close()
+        return {"tables": await db_pool.run(run)}
+    except PoolTimeout:
+        raise
     except Exception as e:
         logger.error(f"Error getting tables: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1484,6 +2512,27 @@ async def get_schema(table: str, data_service: DataService = Depends(get_data_se
     return {"schema": schema}
 
 
+@app.get("/api/schema/version")
+async def get_schema_version():
+    """
+    Current schema version and per-table versions; every stored schema change bumps them
+    """
+    def run(conn) -> Dict[str, Any]:
+        cursor = conn.cursor()
+        return {
+            "schema_version": SchemaTracker.schema_version(cursor),
+            "tables": SchemaTracker.table_versions(cursor),
+        }
+
+    try:
+        return await db_pool.run(run)
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting schema version: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/api/schema/annotations")
 async def get_schema_annotations(table: str, data_service: DataService = Depends(get_data_service)):
     annotations = await data_service.get_schema_annotations(table)
@@ -1572,13 +2621,20 @@ async def explain_sql(
 @app.post("/api/query/drilldown")
 async def drilldown_query(
     request: DrilldownRequest,
+    http_request: Request,
+    shape: ResultShape = "records",
+    result_format: Optional[ResultFormat] = Query(None, alias="format"),
     data_service: DataService = Depends(get_data_service)
 ):
     schema = await _get_schema_with_annotations(request.table_name, data_service)
     sql_query = validate_and_prepare_sql(request.sql_query, schema)
-    results = await data_service.execute_query(sql_query)
-    serializable_results = json.loads(json.dumps(results, cls=CustomJSONEncoder))
-    return {"data": serializable_results}
+    result_format = _negotiate_result_format(http_request, result_format)
+    if result_format != "json":
+        return await _binary_result_response(
+            data_service, sql_query, result_format, request.table_name, schema.get("data_version")
+        )
+    results, cache_status = await data_service.cached_query(sql_query, request.table_name, schema.get("data_version"))
+    return JSONResponse(content={"data": results.payload(shape)}, headers={RESULT_CACHE_HEADER: cache_status})
 
 
 @app.post("/api/table/rename")
@@ -1593,22 +2649,139 @@ async def rename_table(
 @app.post("/api/query/run-sql")
 async def run_sql(
     request: RunSqlRequest,
+    http_request: Request,
+    shape: ResultShape = "records",
+    result_format: Optional[ResultFormat] = Query(None, alias="format"),
     data_service: DataService = Depends(get_data_service)
 ):
     """
     Execute user-edited SQL with safety validation.
+    Answers with JSON unless Arrow (`Accept: application/vnd.apache.arrow.stream` or
+    `format=arrow`) or Parquet (`format=parquet`) is requested.
     """
     schema = await _get_schema_with_annotations(request.table_name, data_service)
     sql_query = validate_and_prepare_sql(request.sql_query, schema)
-    results = await data_service.execute_query(sql_query)
-    serializable_results = json.loads(json.dumps(results, cls=CustomJSONEncoder))
-    return {
+    result_format = _negotiate_result_format(http_request, result_format)
+    if result_format != "json":
+        return await _binary_result_response(
+            data_service, sql_query, result_format, request.table_name, schema.get("data_version")
+        )
+    results, cache_status = await data_service.cached_query(sql_query, request.table_name, schema.get("data_version"))
+    return JSONResponse(content={
         "natural_language_response": "SQL executed successfully.",
         "sql_query": sql_query,
-        "data": serializable_results,
+        "data": results.payload(shape),
         "explanation": "",
         "visualization_type": "table"
-    }
+    }, headers={RESULT_CACHE_HEADER: cache_status})
+
+
+@app.post("/api/query/page")
+async def page_sql(
+    request: PageRequest,
+    shape: ResultShape = "records",
+    data_service: DataService = Depends(get_data_service)
+):
+    """
+    Execute validated SQL one page at a time (no LIMIT cap on the whole result). Pass the
+    returned `next_cursor` back with the same SQL to get the following page; it is null
+    on the last page.
+    """
+    schema = await _get_schema_with_annotations(request.table_name, data_service)
+    sql_query = validate_sql(request.sql_query, schema)
+    page_size = min(max(1, request.page_size or settings.DEFAULT_QUERY_LIMIT), settings.PAGE_SIZE_MAX)
+    page = await data_service.fetch_page(sql_query, request.table_name, page_size, request.cursor)
+    return JSONResponse(content={
+        "sql_query": sql_query,
+        "data": page["results"].payload(shape),
+        "row_count": len(page["results"]),
+        "page_size": page_size,
+        "next_cursor": page["next_cursor"],
+        "has_more": page["next_cursor"] is not None,
+        "sort_key": page["sort_key"],
+    })
+
+
+@app.post("/api/query/stream")
+async def stream_sql(
+    request: RunSqlRequest,
+    data_service: DataService = Depends(get_data_service)
+):
+    """
+    Execute validated SQL and stream the rows as NDJSON (one JSON object per line), up to
+    STREAM_QUERY_LIMIT rows. Rows are sent as they are fetched; an error after the first
+    rows arrives as a final {"error": ...} line.
+    """
+    schema = await _get_schema_with_annotations(request.table_name, data_service)
+    sql_query = validate_and_prepare_sql(request.sql_query, schema, limit=settings.STREAM_QUERY_LIMIT)
+    batches = data_service.stream_query(sql_query)
+    # Fetch the first batch up front so that SQL errors still get a proper status code
+    try:
+        first = await anext(batches, None)
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        logger.error(f"Error executing SQL query: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"SQL Error: {str(e)}")
+
+    async def body():
+        try:
+            if first is not None:
+                yield first.ndjson()
+            async for batch in batches:
+                yield batch.ndjson()
+        except Exception as e:
+            logger.error(f"Error streaming SQL query: {str(e)}")
+            yield (json.dumps({"error": f"SQL Error: {str(e)}"}) + "\n").encode()
+        finally:
+            await batches.aclose()
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+@app.post("/api/query/export")
+async def export_sql(
+    request: RunSqlRequest,
+    copy_format: Literal["csv", "binary"] = Query("csv", alias="format"),
+    compress: bool = True,
+    data_service: DataService = Depends(get_data_service)
+):
+    """
+    Export the full result of validated SQL (up to EXPORT_MAX_ROWS rows) as a CSV file or
+    PostgreSQL binary COPY file, gzip-compressed unless compress=false. An export that
+    fails midway (timeout, byte budget) ends with an aborted response, not a short file.
+    """
+    schema = await _get_schema_with_annotations(request.table_name, data_service)
+    sql_query = validate_and_prepare_sql(request.sql_query, schema, limit=settings.EXPORT_MAX_ROWS)
+    # A LIMIT written in the query itself may be larger than the export's row budget
+    sql_query = f"SELECT * FROM ({sql_query}) AS export LIMIT {settings.EXPORT_MAX_ROWS}"
+    chunks = data_service.export_query(sql_query, copy_format, compress)
+    # Wait for the first chunk so that SQL errors still get a proper status code
+    try:
+        first = await anext(chunks, None)
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        logger.error(f"Error exporting SQL query: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"SQL Error: {str(e)}")
+
+    async def body():
+        try:
+            if first is not None:
+                yield first
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+    filename = f"{request.table_name}_export.{'csv' if copy_format == 'csv' else 'pgcopy'}"
+    if compress:
+        filename += ".gz"
+    media_type = "application/gzip" if compress else ("text/csv" if copy_format == "csv" else "application/octet-stream")
+    return StreamingResponse(body(), media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "X-Export-Row-Limit": str(settings.EXPORT_MAX_ROWS),
+    })
 
 
 # Database connection test endpoint
@@ -1619,12 +2792,13 @@ async def test_connections():
     }
     
     # Test PostgreSQL
-    try:
-        conn = get_db_connection()
+    def run(conn) -> str:
         cursor = conn.cursor()
         cursor.execute("SELECT version()")
-        version = cursor.fetchone()["version"]
-        conn.close()
+        return cursor.fetchone()["version"]
+
+    try:
+        version = await db_pool.run(run)
         results["postgresql"] = {"status": "success", "message": f"Connected: {version}"}
     except Exception as e:
         results["postgresql"] = {"status": "error", "message": str(e)}
@@ -1,17 +1,39 @@
 # prompting_service.py
 import json
+import threading
+from collections import OrderedDict
 from typing import Dict, List, Any, Optional
 
-class PromptingService:
+# Stands for the question while the text-to-SQL template is rendered (cannot occur in
+# stored schemas: PostgreSQL text and JSONB reject NUL characters)
+_QUESTION_SLOT = "\x00question\x00"
+
+
+class CompiledPromptContext:
     """
-    Service responsible for creating structured prompts for different LLM tasks
-    with PostgreSQL-specific considerations
+    The schema-derived parts of a table's prompts (column list, relationships, sample
+    queries, aliases, metrics), rendered once per schema version; building a prompt then
+    only splices in the request's question, SQL or result sample.
+
+    `text_to_sql_prefix` is the text-to-SQL prompt up to the question, byte-identical for
+    every question on the same schema version, so an LLM server with prefix caching
+    reuses its computed state for that part across questions.
     """
-    
+
+    def __init__(self, schema: Dict[str, Any]):
+        self.table_name = schema.get("table_name", "unknown")
+        self.row_count = schema.get("row_count", "unknown")
+        self.columns_brief = "\n".join([
+            f"- {col.get('name', '')}: {col.get('type', '')}"
+            for col in schema.get("columns", [])
+        ])
+        self.text_to_sql_prefix, self.text_to_sql_lead, self.text_to_sql_tail = self._render_text_to_sql(schema)
+
     @staticmethod
-    def create_text_to_sql_prompt(query: str, schema: Dict[str, Any]) -> str:
+    def _render_text_to_sql(schema: Dict[str, Any]) -> tuple:
         """
-        Create a prompt for converting natural language to PostgreSQL compatible SQL
+        The text-to-SQL prompt around the question: (prefix, start of the question's
+        line, text after the question)
         """
         # Extract column information for better context
         columns_info = []
@@ -80,8 +102,11 @@ class PromptingService:
             to_table = rel.get("to_table", "")
             to_col = rel.get("to_column", "")
             
+            if "overlap" in rel:
+                rel_type = f"{rel_type}, {rel['overlap']:.0%} of values match"
+            
             relationships_info.append(
-                f"- {from_col} in {schema.get('table_name', '')} relates to {to_col} in {to_table} ({rel_type})"
+                f"- {from_col} in {rel.get('from_table') or schema.get('table_name', '')} relates to {to_col} in {to_table} ({rel_type})"
             )
         
         relationships_str = "\n".join(relationships_info)
@@ -100,11 +125,24 @@ class PromptingService:
         if sample_queries_str:
             sample_queries_str = "\n\n## Sample Queries:\n" + sample_queries_str
         
+        # Instructions first, then the table, then the question: everything before the
+        # question line is the same for every question on this schema version
         prompt = f"""
         # Text-to-SQL Conversion Task
 
         You are an expert SQL query generator. Your task is to convert the user's natural language question into a precise, efficient PostgreSQL query.
 
+        ## Requirements:
+        1. Generate only the SQL query with no explanations or comments
+        2. The query must be valid for PostgreSQL syntax
+        3. Use double quotes around table and column names to handle spaces and special characters
+        4. Use appropriate JOIN operations if they would be helpful
+        5. Use appropriate aggregation functions when needed (COUNT, SUM, AVG, etc.)
+        6. Include ORDER BY, GROUP BY, or HAVING clauses when implied by the question
+        7. Handle potential NULL values appropriately with COALESCE or IS NULL checks
+        8. Make the query as efficient as possible
+        9. Use PostgreSQL's specific functions when appropriate (e.g., date_trunc, array_agg)
+
         ## Database Information
         Table name: {schema.get("table_name", "unknown")}
         Row count: {schema.get("row_count", "unknown")}
@@ -118,24 +156,65 @@ class PromptingService:
 
         ## Task
         Convert this natural language question to a SQL query:
-        "{query}"
-
-        ## Requirements:
-        1. Generate only the SQL query with no explanations or comments
-        2. The query must be valid for PostgreSQL syntax
-        3. Use double quotes around table and column names to handle spaces and special characters
-        4. Use appropriate JOIN operations if they would be helpful
-        5. Use appropriate aggregation functions when needed (COUNT, SUM, AVG, etc.)
-        6. Include ORDER BY, GROUP BY, or HAVING clauses when implied by the question
-        7. Handle potential NULL values appropriately with COALESCE or IS NULL checks
-        8. Make the query as efficient as possible
-        9. Use PostgreSQL's specific functions when appropriate (e.g., date_trunc, array_agg)
+        "{_QUESTION_SLOT}"
 
         SQL query:
         ```sql
         """
-        
-        return prompt
+        head, _, tail = prompt.rpartition(_QUESTION_SLOT)
+        # Split at the start of the question's line so the prefix ends on a token boundary
+        cut = head.rfind("\n") + 1
+        return head[:cut], head[cut:], tail
+
+
+class PromptingService:
+    """
+    Service responsible for creating structured prompts for different LLM tasks
+    with PostgreSQL-specific considerations
+    """
+    
+    # Compiled contexts by (table, schema version, annotations version)
+    COMPILED_CACHE_SIZE = 128
+    _compiled: "OrderedDict[tuple, CompiledPromptContext]" = OrderedDict()
+    _compiled_lock = threading.Lock()
+
+    @classmethod
+    def compile(cls, schema: Dict[str, Any]) -> "CompiledPromptContext":
+        """
+        Compiled prompt context of a schema. Cached when the schema carries its version
+        (`data_version`, and `annotations_version` for its annotations), as schemas from
+        the schema cache do; otherwise compiled for this call only.
+        """
+        version = schema.get("data_version")
+        if version is None:
+            return CompiledPromptContext(schema)
+        key = (schema.get("table_name"), version, schema.get("annotations_version"))
+        with cls._compiled_lock:
+            context = cls._compiled.get(key)
+            if context is not None:
+                cls._compiled.move_to_end(key)
+                return context
+        context = CompiledPromptContext(schema)
+        with cls._compiled_lock:
+            cls._compiled[key] = context
+            while len(cls._compiled) > cls.COMPILED_CACHE_SIZE:
+                cls._compiled.popitem(last=False)
+        return context
+
+    @classmethod
+    def create_text_to_sql_prompt(cls, query: str, schema: Dict[str, Any]) -> str:
+        """
+        Create a prompt for converting natural language to PostgreSQL compatible SQL
+        """
+        context = cls.compile(schema)
+        return context.text_to_sql_prefix + context.text_to_sql_lead + query + context.text_to_sql_tail
+
+    @classmethod
+    def text_to_sql_prefix(cls, schema: Dict[str, Any]) -> str:
+        """
+        The question-independent start of a table's text-to-SQL prompts
+        """
+        return cls.compile(schema).text_to_sql_prefix
     
     @staticmethod
     def create_analysis_prompt(
@@ -143,23 +222,22 @@ class PromptingService:
         sql_query: str, 
         schema: Dict[str, Any], 
         results: List[Dict[str, Any]], 
-        max_results: int = 5
+        max_results: int = 5,
+        total_results: Optional[int] = None
     ) -> str:
         """
-        Create a prompt for analyzing SQL results
+        Create a prompt for analyzing SQL results; `results` may be just the leading
+        rows when `total_results` gives the full count
         """
         # Limit the results to prevent token overflow
         result_sample = results[:max_results] if results else []
-        total_results = len(results) if results else 0
+        if total_results is None:
+            total_results = len(results) if results else 0
         
         # Format the results for better readability
         results_str = json.dumps(result_sample, indent=2) if result_sample else "[]"
         
-        # Extract schema information
-        columns_info = "\n".join([
-            f"- {col.get('name', '')}: {col.get('type', '')}"
-            for col in schema.get("columns", [])
-        ])
+        context = PromptingService.compile(schema)
         
         prompt = f"""
         # Data Analysis Task
@@ -175,9 +253,9 @@ class PromptingService:
         ```
 
         ## Database Schema
-        Table: {schema.get("table_name", "unknown")}
+        Table: {context.table_name}
         Columns:
-        {columns_info}
+        {context.columns_brief}
 
         ## Query Results
         Showing {len(result_sample)} out of {total_results} rows:
@@ -217,11 +295,7 @@ class PromptingService:
         """
         Create a prompt for analyzing and fixing SQL errors
         """
-        # Extract column information
-        columns_info = "\n".join([
-            f"- {col.get('name', '')}: {col.get('type', '')}"
-            for col in schema.get("columns", [])
-        ])
+        context = PromptingService.compile(schema)
         
         prompt = f"""
         # SQL Error Analysis Task
@@ -239,9 +313,9 @@ class PromptingService:
         ```
 
         ## Database Schema
-        Table: {schema.get("table_name", "unknown")}
+        Table: {context.table_name}
         Columns:
-        {columns_info}
+        {context.columns_brief}
 
         ## Your Task
         1. Analyze the error message and identify the issue in the SQL query
@@ -275,10 +349,7 @@ class PromptingService:
         """
         Create a prompt for regenerating SQL using context from errors or sample output.
         """
-        columns_info = "\n".join([
-            f"- {col.get('name', '')}: {col.get('type', '')}"
-            for col in schema.get("columns", [])
-        ])
+        context = PromptingService.compile(schema)
 
         sample = result_sample[:max_results] if result_sample else []
         results_str = json.dumps(sample, indent=2) if sample else "[]"
@@ -329,9 +400,9 @@ class PromptingService:
         {user_block}
 
         ## Database Schema
-        Table: {schema.get("table_name", "unknown")}
+        Table: {context.table_name}
         Columns:
-        {columns_info}
+        {context.columns_brief}
         {current_sql_block}
         {error_block}
         {results_block}
@@ -359,10 +430,7 @@ class PromptingService:
         """
         Create a prompt for explaining a SQL query.
         """
-        columns_info = "\n".join([
-            f"- {col.get('name', '')}: {col.get('type', '')}"
-            for col in schema.get("columns", [])
-        ])
+        context = PromptingService.compile(schema)
 
         sample = result_sample[:max_results] if result_sample else []
         results_str = json.dumps(sample, indent=2) if sample else "[]"
@@ -394,9 +462,9 @@ class PromptingService:
         ```
 
         ## Database Schema
-        Table: {schema.get("table_name", "unknown")}
+        Table: {context.table_name}
         Columns:
-        {columns_info}
+        {context.columns_brief}
         {results_block}
 
         ## Your Task
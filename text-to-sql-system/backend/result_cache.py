@@ -0,0 +1,196 @@
+# result_cache.py
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Hashable, Optional, Tuple
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Cache form of a query: whitespace collapsed and unquoted text lowercased (keywords and
+    unquoted identifiers are case-insensitive); string literals and quoted identifiers are
+    kept as they are. Queries with backslashes (possible E'' escapes) or dollar signs
+    (possible $tag$ literals) are only trimmed.
+    """
+    sql = sql.strip().rstrip(";").strip()
+    if "\\" in sql or "$" in sql:
+        return sql
+    parts = re.split(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""", sql)
+    return "".join(
+        part if i % 2 else re.sub(r"\s+", " ", part).lower()
+        for i, part in enumerate(parts)
+    )
+
+
+# Words that end a FROM item instead of naming its alias
+_FROM_ITEM_END = frozenset({
+    "where", "join", "inner", "left", "right", "full", "cross", "natural", "on", "using", "group",
+    "order", "limit", "offset", "having", "union", "intersect", "except", "window", "fetch", "for",
+    "tablesample", "returning",
+})
+
+
+def referenced_tables(sql: str) -> Optional[FrozenSet[str]]:
+    """
+    Names after every FROM and JOIN (and comma-separated FROM items) in `sql`, at any
+    depth, quoted or not; unquoted names are lowercased, and names in another schema
+    keep it ("schema.table"). None when the SQL has backslashes, dollar signs or
+    comments, which the scan does not follow. Over-reports rather than misses: FROM
+    inside EXTRACT(... FROM x) or a CTE name shows up as a table too.
+    """
+    if "\\" in sql or "$" in sql:
+        return None
+    sql = re.sub(r"'(?:[^']|'')*'", "''", sql)
+    if "--" in sql or "/*" in sql:
+        return None
+    tokens = re.findall(r'"(?:[^"]|"")*"|\w+|\S', sql)
+    words = [token.lower() if not token.startswith('"') else None for token in tokens]
+
+    def name_at(i: int) -> Optional[str]:
+        token = tokens[i] if i < len(tokens) else ""
+        if token.startswith('"'):
+            return token[1:-1].replace('""', '"')
+        return token.lower() if re.fullmatch(r'[A-Za-z_]\w*', token) else None
+
+    tables = set()
+    for i, word in enumerate(words):
+        if word not in ("from", "join"):
+            continue
+        j = i + 1
+        while True:
+            while j < len(words) and words[j] in ("only", "lateral"):
+                j += 1
+            name = name_at(j)
+            if name is None:
+                break
+            if j + 2 < len(tokens) and tokens[j + 1] == "." and name_at(j + 2) is not None:
+                schema, name = name, name_at(j + 2)
+                j += 2
+                if schema != "public":
+                    name = f"{schema}.{name}"
+            j += 1
+            if j < len(tokens) and tokens[j] == "(":
+                # A function in FROM, not a table
+                break
+            tables.add(name)
+            if j < len(words) and words[j] == "as":
+                j += 1
+            if j < len(words) and name_at(j) is not None and words[j] not in _FROM_ITEM_END:
+                j += 1
+            if j < len(tokens) and tokens[j] == ",":
+                j += 1
+                continue
+            break
+    return frozenset(tables)
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache of query results, bounded by entry count and by (estimated)
+    bytes, with a time-to-live.
+
+    Entries are keyed by (table, data version, normalized SQL, variant). The data version
+    is the table's schema version, which moves whenever the table is reloaded, appended
+    to, upserted or renamed, so once the caller sees the new version stale results are
+    not looked up again; invalidate_table() drops them right away and keeps a query that
+    was running during the change from storing its result. Both only happen in the
+    process that made the change: another process keeps using the version from its
+    schema cache until that entry expires.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 256 * 1024 * 1024, ttl_s: float = 300.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self._entries: "OrderedDict[Tuple, Tuple[Any, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    @staticmethod
+    def key(table_name: str, data_version: Optional[int], sql_query: str, variant: Hashable = None) -> Tuple:
+        return (table_name, data_version, normalize_sql(sql_query), variant)
+
+    def generation(self, table_name: str) -> int:
+        """
+        Current invalidation count of a table; pass it to put() to drop results computed
+        before an invalidation
+        """
+        with self._lock:
+            return self._generations.get(table_name, 0)
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            value, size, expires_at = entry
+            if time.monotonic() >= expires_at:
+                self._remove(key)
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def put(self, key: Tuple, value: Any, size: int, generation: Optional[int] = None) -> bool:
+        """
+        Store a result of `size` bytes; results larger than a quarter of the byte budget
+        are not cached. Returns whether the result was stored.
+        """
+        if not self.enabled or size > self.max_bytes // 4:
+            return False
+        with self._lock:
+            if generation is not None and generation != self._generations.get(key[0], 0):
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + self.ttl_s)
+            self._bytes += size
+            self._stats["stores"] += 1
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+        return True
+
+    def _remove(self, key: Tuple) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def invalidate_table(self, table_name: str) -> int:
+        """
+        Drop every cached result of a table; returns how many were dropped
+        """
+        with self._lock:
+            self._generations[table_name] = self._generations.get(table_name, 0) + 1
+            stale = [key for key in self._entries if key[0] == table_name]
+            for key in stale:
+                self._remove(key)
+            self._stats["invalidations"] += len(stale)
+            return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_s": self.ttl_s,
+                **self._stats,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            }
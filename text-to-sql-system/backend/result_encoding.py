@@ -0,0 +1,217 @@
+# result_encoding.py
+import datetime
+import json
+import sys
+import uuid
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+# Values json.dumps writes without help (json columns arrive as already-parsed dicts)
+JSON_SCALAR_TYPES = (str, int, float, bool, type(None))
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def _to_float(value):
+    return float(value) if value is not None else None
+
+
+def _to_str(value):
+    return str(value) if value is not None else None
+
+
+def _decode_bytes(value):
+    return bytes(value).decode("utf-8", errors="replace") if value is not None else None
+
+
+def json_value(value: Any) -> Any:
+    """
+    JSON-ready form of a single value of a type without a per-column converter
+    (mirrors CustomJSONEncoder)
+    """
+    if isinstance(value, JSON_SCALAR_TYPES) or isinstance(value, dict):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [json_value(item) for item in value]
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value).decode("utf-8", errors="replace")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+# PostgreSQL type OIDs whose psycopg2 values need converting, and how
+CONVERTERS_BY_OID: Dict[int, Callable[[Any], Any]] = {
+    1700: _to_float,      # numeric -> Decimal
+    1082: _isoformat,     # date
+    1083: _isoformat,     # time
+    1266: _isoformat,     # timetz
+    1114: _isoformat,     # timestamp
+    1184: _isoformat,     # timestamptz
+    2950: _to_str,        # uuid
+    1186: _to_str,        # interval -> timedelta
+    17: _decode_bytes,    # bytea -> memoryview
+}
+
+
+class ResultSet:
+    """
+    Query result held by column: the column names and, per column, a list of
+    JSON-ready values. Values are converted once per column, picked by the column's
+    PostgreSQL type, instead of per value during encoding.
+    """
+
+    __slots__ = ("columns", "data")
+
+    def __init__(self, columns: List[str], data: List[List[Any]]):
+        self.columns = columns
+        self.data = data
+
+    @classmethod
+    def from_rows(cls, description: Sequence[Any], rows: Sequence[Sequence[Any]]) -> "ResultSet":
+        """
+        Build from a cursor description and tuple rows (a plain, non-dict cursor)
+        """
+        columns = [col.name for col in description]
+        if not rows:
+            return cls(columns, [[] for _ in columns])
+        data = []
+        for col, values in zip(description, zip(*rows)):
+            converter = CONVERTERS_BY_OID.get(col.type_code)
+            if converter is not None:
+                data.append(list(map(converter, values)))
+            elif all(type(v) in JSON_SCALAR_TYPES for v in values):
+                data.append(list(values))
+            else:
+                data.append(list(map(json_value, values)))
+        return cls(columns, data)
+
+    @classmethod
+    def from_cursor(cls, cursor) -> "ResultSet":
+        return cls.from_rows(cursor.description or [], cursor.fetchall())
+
+    def __len__(self) -> int:
+        return len(self.data[0]) if self.data else 0
+
+    def approx_bytes(self) -> int:
+        """
+        Rough in-memory size of the values (nested lists and dicts counted shallowly)
+        """
+        getsizeof = sys.getsizeof
+        return sum(8 * len(values) + sum(map(getsizeof, values)) for values in self.data)
+
+    def rows(self, limit: Optional[int] = None) -> List[List[Any]]:
+        data = self.data if limit is None else [values[:limit] for values in self.data]
+        return [list(row) for row in zip(*data)]
+
+    def records(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Rows as {column: value} dicts (a repeated column name keeps its last value)
+        """
+        columns = self.columns
+        return [dict(zip(columns, row)) for row in zip(*(
+            self.data if limit is None else [values[:limit] for values in self.data]
+        ))]
+
+    def payload(self, shape: str = "records") -> Any:
+        """
+        The `data` member of a response: a list of records, or with shape="columns"
+        {"columns": [...], "rows": [[...], ...]} without the repeated key names
+        """
+        if shape == "columns":
+            return {"columns": self.columns, "rows": self.rows()}
+        return self.records()
+
+    def ndjson(self) -> bytes:
+        """
+        One JSON object per row, newline-terminated
+        """
+        dumps = json.JSONEncoder(ensure_ascii=False).encode
+        return "".join(dumps(record) + "\n" for record in self.records()).encode()
+
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+
+
+def require_pyarrow():
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise RuntimeError(f"Arrow and Parquet output need pyarrow: {str(e)}. Run: pip install pyarrow")
+    return pyarrow
+
+
+def _arrow_type(pa, col):
+    """
+    Arrow type of a result column from its PostgreSQL type, or None to let pyarrow
+    infer it from the values
+    """
+    simple = {
+        16: pa.bool_(), 21: pa.int16(), 23: pa.int32(), 20: pa.int64(),
+        700: pa.float32(), 701: pa.float64(),
+        25: pa.string(), 1043: pa.string(), 1042: pa.string(), 19: pa.string(),
+        1082: pa.date32(), 1114: pa.timestamp("us"), 1184: pa.timestamp("us", tz="UTC"),
+        1083: pa.time64("us"), 1186: pa.duration("us"), 17: pa.binary(),
+    }
+    if col.type_code in simple:
+        return simple[col.type_code]
+    if col.type_code == 1700 and col.precision and col.precision <= 76 and col.scale is not None:
+        # numeric(p, s); unconstrained numeric (e.g. SUM, AVG) is inferred from its values
+        return (pa.decimal128 if col.precision <= 38 else pa.decimal256)(col.precision, col.scale)
+    return None
+
+
+def _arrow_array(pa, col, values: Sequence[Any]):
+    arrow_type = _arrow_type(pa, col)
+    if col.type_code == 17:
+        values = [bytes(v) if v is not None else None for v in values]
+    elif col.type_code in (2950, 114, 3802):  # uuid, json, jsonb
+        values = [(str(v) if col.type_code == 2950 else json.dumps(v)) if v is not None else None for v in values]
+        arrow_type = pa.string()
+    try:
+        return pa.array(values, type=arrow_type, from_pandas=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Types pyarrow cannot take natively fall back to their JSON/text form
+        return pa.array([_to_str(json_value(v)) if v is not None else None for v in values], type=pa.string())
+
+
+def arrow_table(description: Sequence[Any], rows: Sequence[Sequence[Any]]):
+    """
+    pyarrow Table built column by column from a cursor description and tuple rows,
+    typed from the PostgreSQL column types (numeric(p, s) as decimals, timestamps as
+    microsecond timestamps, timestamptz in UTC)
+    """
+    pa = require_pyarrow()
+    columns = list(zip(*rows)) if rows else [() for _ in description]
+    arrays = [_arrow_array(pa, col, values) for col, values in zip(description, columns)]
+    names = [col.name for col in description]
+    return pa.Table.from_arrays(arrays, names=names)
+
+
+def arrow_ipc_bytes(table) -> bytes:
+    """
+    The table as an Arrow IPC stream
+    """
+    pa = require_pyarrow()
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def parquet_bytes(table) -> bytes:
+    pa = require_pyarrow()
+    import pyarrow.parquet as pq
+    sink = pa.BufferOutputStream()
+    pq.write_table(table, sink)
+    return sink.getvalue().to_pybytes()
@@ -1,12 +1,39 @@
 # schema_analyzer.py
-from typing import Dict, List, Tuple, Any
+from typing import Dict, List, Tuple, Any, Optional, Callable
 import psycopg2
 import psycopg2.extras
+from psycopg2 import sql as pg_sql
 import pandas as pd
 import numpy as np
 from collections import defaultdict
 import json
+import logging
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from catalog_snapshot import CatalogSnapshot
+from sql_stats import SqlStatsEngine, EMAIL_PATTERN, URL_PATTERN, NAME_INDICATORS
+from sketches import SketchIndex
+
+logger = logging.getLogger(__name__)
+
+# Common date patterns (also used by type_inference to detect date columns at ingest)
+DATE_PATTERNS = [
+    r'^\d{4}-\d{2}-\d{2}',  # YYYY-MM-DD
+    r'^\d{2}/\d{2}/\d{4}',  # MM/DD/YYYY
+    r'^\d{2}-\d{2}-\d{4}',  # DD-MM-YYYY
+    r'^\d{2}\.\d{2}\.\d{4}', # DD.MM.YYYY
+]
+
+# Compiled once: the date patterns as one alternation, and the text pattern checks
+DATE_PATTERN = re.compile("|".join(f"(?:{pattern})" for pattern in DATE_PATTERNS))
+# Email and URL checks as one pattern, run line-anchored over the newline-joined values of a
+# column, so the whole column is matched in a single regex scan
+TEXT_PATTERNS = re.compile(
+    "^(?:(?P<email>" + EMAIL_PATTERN[1:-1] + ")$|(?P<url>" + URL_PATTERN[1:] + ").*$)", re.MULTILINE
+)
 
 
 class SchemaAnalyzer:
@@ -14,59 +41,67 @@ class SchemaAnalyzer:
     Analyzes PostgreSQL database schema and data to provide insights for text-to-SQL conversion
     """
     
-    def __init__(self, db_connection):
+    # Rows the pandas engine analyzes
+    SAMPLE_ROWS = 1000
+    # Statement timeout of one column overlap counted in the tables (join candidates)
+    OVERLAP_CHECK_TIMEOUT_MS = 2000
+    
+    def __init__(self, db_connection, stats_engine: str = "sql", exact_stats_max_rows: int = 500000,
+                 sketch_index: Optional[SketchIndex] = None):
         self.connection = db_connection
+        # "sql" computes column statistics in PostgreSQL; "pandas" analyzes a 1000-row sample
+        self.stats_engine = stats_engine
+        self.exact_stats_max_rows = exact_stats_max_rows
+        # Column sketches of the uploaded tables: value-overlap join candidates and
+        # distinct counts for columns whose statistics come from a sample
+        self.sketch_index = sketch_index
     
-    def analyze_table(self, table_name: str) -> Dict[str, Any]:
+    def analyze_table(self, table_name: str, columns: Optional[List[str]] = None,
+                      catalog: Optional[CatalogSnapshot] = None) -> Dict[str, Any]:
         """
-        Perform comprehensive analysis of a table's structure and data
+        Perform comprehensive analysis of a table's structure and data.
+        If `columns` is given, column statistics are only computed for those columns.
+        `catalog` lets callers analyzing several tables share one catalog snapshot.
         """
         cursor = self.connection.cursor()
+        catalog = catalog or CatalogSnapshot.load(self.connection)
         
-        # Get basic table info from PostgreSQL information_schema
-        cursor.execute("""
-            SELECT column_name, data_type, is_nullable
-            FROM information_schema.columns
-            WHERE table_name = %s
-            ORDER BY ordinal_position
-        """, (table_name,))
-        columns_info = cursor.fetchall()
-        
-        # Get row count
-        cursor.execute(f"SELECT COUNT(*) as count FROM {table_name}")
-        row_count = cursor.fetchone()['count']  # FIXED: Access using column name 'count'
-        
-        # Get primary key information
-        cursor.execute("""
-            SELECT a.attname as column_name
-            FROM pg_index i
-            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
-            WHERE i.indrelid = %s::regclass AND i.indisprimary
-        """, (table_name,))
-        primary_keys = [row["column_name"] for row in cursor.fetchall()]
-        
-        # Get sample data (for data type inference and statistics)
-        cursor.execute(f"SELECT * FROM {table_name} LIMIT 1000")
-        sample_data = cursor.fetchall()
-        column_names = [desc[0] for desc in cursor.description]
+        # Get basic table info from the catalog snapshot
+        columns_info = catalog.columns(table_name)
         
-        # Convert to DataFrame for easier analysis
-        df = pd.DataFrame(sample_data)
-        
-        # Analyze each column
-        column_analysis = []
-        for col_name in column_names:
-            analysis = self._analyze_column(df, col_name)
-            column_analysis.append({
-                "name": col_name,
-                "analysis": analysis
-            })
+        # Column statistics, computed in PostgreSQL unless the pandas engine is selected
+        # (or the SQL engine fails, e.g. on a type it cannot aggregate)
+        stats_by_column = None
+        if self.stats_engine == "sql":
+            try:
+                engine = SqlStatsEngine(self.connection, exact_max_rows=self.exact_stats_max_rows)
+                row_count, stats_by_column = engine.analyze(table_name, columns_info, columns)
+                sampled = engine.sampled
+            except Exception as e:
+                logger.warning(f"SQL statistics failed for {table_name}, using pandas sample: {str(e)}")
+                self.connection.rollback()
+                cursor = self.connection.cursor()
+        if stats_by_column is None:
+            row_count, stats_by_column = self._sample_stats(cursor, table_name, columns)
+            sampled = row_count > self.SAMPLE_ROWS
+        if sampled:
+            self._apply_sketch_distinct_counts(table_name, stats_by_column)
+        
+        return self._compile_analysis(table_name, catalog, row_count, stats_by_column)
+
+    def _compile_analysis(self, table_name: str, catalog: CatalogSnapshot, row_count: int,
+                          stats_by_column: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Combine column statistics with the catalog-derived parts of the analysis
+        """
+        columns_info = catalog.columns(table_name)
+        primary_keys = catalog.primary_keys(table_name)
         
         # Find potential relationships
-        relationships = self._detect_relationships(table_name)
+        relationships = self._detect_relationships(table_name, catalog)
         
         # Identify foreign keys
-        foreign_keys = self._identify_foreign_keys(table_name)
+        foreign_keys = self._identify_foreign_keys(table_name, catalog)
         
         # Compile full analysis
         full_analysis = {
@@ -78,7 +113,7 @@ class SchemaAnalyzer:
                     "type": col["data_type"],
                     "nullable": col["is_nullable"] == "YES",
                     "is_primary_key": col["column_name"] in primary_keys,
-                    "stats": next((c["analysis"] for c in column_analysis if c["name"] == col["column_name"]), {})
+                    "stats": stats_by_column.get(col["column_name"], {})
                 }
                 for col in columns_info
             ],
@@ -87,10 +122,62 @@ class SchemaAnalyzer:
                 "primary_keys": primary_keys,
                 "foreign_keys": foreign_keys
             },
-            "sample_queries": self._generate_sample_queries(table_name, column_names)
+            "sample_queries": self._generate_sample_queries(table_name, [col["column_name"] for col in columns_info], catalog)
         }
         
         return full_analysis
+
+    def _apply_sketch_distinct_counts(self, table_name: str, stats_by_column: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Replace sample-based distinct counts with the HyperLogLog estimates built over every
+        row at ingest
+        """
+        sketches = self.sketch_index.table(table_name) if self.sketch_index else {}
+        for col, stats in stats_by_column.items():
+            if col in sketches and "unique_values" in stats:
+                stats["unique_values"] = sketches[col].distinct()
+                stats["unique_values_estimated"] = True
+
+    def refresh_columns(self, table_name: str, previous: Dict[str, Any], columns: List[str],
+                        catalog: Optional[CatalogSnapshot] = None) -> Dict[str, Any]:
+        """
+        Re-analyze a table after an incremental load, recomputing statistics only for
+        `columns` and reusing the previously stored stats of every other column
+        """
+        fresh = self.analyze_table(table_name, columns=columns, catalog=catalog)
+        previous_stats = {col.get("name"): col.get("stats", {}) for col in previous.get("columns", [])}
+        for col in fresh["columns"]:
+            if col["name"] not in columns:
+                col["stats"] = previous_stats.get(col["name"], {})
+        return fresh
+    
+    def _sample_stats(self, cursor, table_name: str, columns: Optional[List[str]] = None) -> Tuple[int, Dict[str, Dict[str, Any]]]:
+        """
+        Pandas statistics engine: exact row count plus column stats from the first 1000 rows
+        """
+        # Get row count
+        cursor.execute(f"SELECT COUNT(*) as count FROM {table_name}")
+        row_count = cursor.fetchone()['count']  # FIXED: Access using column name 'count'
+        
+        # Get sample data (for data type inference and statistics)
+        if columns is not None:
+            selected = ", ".join(f'"{col}"' for col in columns) or "NULL AS no_columns"
+            cursor.execute(f"SELECT {selected} FROM {table_name} LIMIT {self.SAMPLE_ROWS}")
+        else:
+            cursor.execute(f"SELECT * FROM {table_name} LIMIT {self.SAMPLE_ROWS}")
+        sample_data = cursor.fetchall()
+        column_names = [desc[0] for desc in cursor.description if columns is None or desc[0] in columns]
+        
+        # Convert to DataFrame for easier analysis
+        df = pd.DataFrame(sample_data)
+        
+        return row_count, self._analyze_columns(df, column_names)
+    
+    def _analyze_columns(self, df: pd.DataFrame, column_names: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Analyze each column of a sample
+        """
+        return {col_name: self._analyze_column(df, col_name) for col_name in column_names}
     
     def _analyze_column(self, df: pd.DataFrame, column_name: str) -> Dict[str, Any]:
         """
@@ -100,53 +187,64 @@ class SchemaAnalyzer:
             return {"error": "Column not found in dataframe"}
             
         series = df[column_name]
-        
+
+        # Non-null values are computed once and shared by the analyzers below
+        non_null = series.dropna()
+        # NUMERIC columns arrive as Decimal objects
+        if not non_null.empty and isinstance(non_null.iloc[0], Decimal):
+            try:
+                series = series.astype(np.float64)
+            except (TypeError, ValueError):
+                series = pd.to_numeric(series, errors='coerce')
+            non_null = series.dropna()
+
         # Try to determine the data type
         if pd.api.types.is_numeric_dtype(series):
-            return self._analyze_numeric_column(series)
-        elif pd.api.types.is_datetime64_dtype(series) or self._looks_like_date(series):
+            return self._analyze_numeric_column(series, non_null)
+        elif pd.api.types.is_datetime64_dtype(series) or self._looks_like_date(series, non_null):
             return self._analyze_datetime_column(series)
         else:
-            return self._analyze_text_column(series)
+            return self._analyze_text_column(series, non_null)
     
-    def _looks_like_date(self, series: pd.Series) -> bool:
+    def _looks_like_date(self, series: pd.Series, non_null: Optional[pd.Series] = None) -> bool:
         """
         Check if a series might contain dates even if not detected as datetime
         """
         # Sample some non-null values
-        sample = series.dropna().head(5).astype(str)
-        
-        # Common date patterns
-        date_patterns = [
-            r'^\d{4}-\d{2}-\d{2}',  # YYYY-MM-DD
-            r'^\d{2}/\d{2}/\d{4}',  # MM/DD/YYYY
-            r'^\d{2}-\d{2}-\d{4}',  # DD-MM-YYYY
-            r'^\d{2}\.\d{2}\.\d{4}', # DD.MM.YYYY
-        ]
-        
-        # Check if most values match date patterns
-        pattern_matches = 0
-        for val in sample:
-            if any(re.match(pattern, val) for pattern in date_patterns):
-                pattern_matches += 1
-                
-        return pattern_matches >= len(sample) * 0.8 if len(sample) > 0 else False
+        non_null = series.dropna() if non_null is None else non_null
+        sample = [str(value) for value in non_null.head(5)]
+        if not sample:
+            return False
+        
+        # Check if most values match date patterns (one combined pattern per value)
+        return sum(1 for value in sample if DATE_PATTERN.match(value)) >= len(sample) * 0.8
+    
+    @staticmethod
+    def _null_and_unique_counts(series: pd.Series, non_null: pd.Series) -> Dict[str, Any]:
+        null_count = len(series) - len(non_null)
+        return {
+            "null_count": null_count,
+            "null_percentage": float(null_count / len(series) * 100) if len(series) else float("nan"),
+            "unique_values": len(pd.unique(non_null.to_numpy())),
+        }
     
-    def _analyze_numeric_column(self, series: pd.Series) -> Dict[str, Any]:
+    def _analyze_numeric_column(self, series: pd.Series, non_null: Optional[pd.Series] = None) -> Dict[str, Any]:
         """
         Analyze a numeric column
         """
+        non_null = series.dropna() if non_null is None else non_null
+        values = non_null.to_numpy(dtype=np.float64)
+        has_values = len(values) > 0
         stats = {
             "data_type": "numeric",
-            "min": float(series.min()) if not pd.isna(series.min()) else None,
-            "max": float(series.max()) if not pd.isna(series.max()) else None,
-            "mean": float(series.mean()) if not pd.isna(series.mean()) else None,
-            "median": float(series.median()) if not pd.isna(series.median()) else None,
-            "std_dev": float(series.std()) if not pd.isna(series.std()) else None,
-            "null_count": int(series.isna().sum()),
-            "null_percentage": float(series.isna().mean() * 100),
-            "unique_values": int(series.nunique()),
-            "is_integer": pd.api.types.is_integer_dtype(series) or all(float(x).is_integer() for x in series.dropna() if pd.notna(x)),
+            "min": float(values.min()) if has_values else None,
+            "max": float(values.max()) if has_values else None,
+            "mean": float(values.mean()) if has_values else None,
+            "median": float(np.median(values)) if has_values else None,
+            "std_dev": float(values.std(ddof=1)) if len(values) > 1 else None,
+            **self._null_and_unique_counts(series, non_null),
+            "is_integer": bool(pd.api.types.is_integer_dtype(series)
+                               or np.all(np.isfinite(values) & (values == np.floor(values)))),
         }
         
         # Check if it might be a categorical column despite being numeric
@@ -163,7 +261,7 @@ class SchemaAnalyzer:
         Analyze a datetime column
         """
         # Try to convert to datetime if not already
-        if not pd.api.types.is_datetime64_dtype(series):
+        if not pd.api.types.is_datetime64_any_dtype(series):
             try:
                 series = pd.to_datetime(series)
             except:
@@ -171,57 +269,53 @@ class SchemaAnalyzer:
                 return self._analyze_text_column(series)
         
         try:
+            non_null = series.dropna()
+            earliest = non_null.min() if not non_null.empty else None
+            latest = non_null.max() if not non_null.empty else None
             stats = {
                 "data_type": "datetime",
-                "min": series.min().isoformat() if not pd.isna(series.min()) else None,
-                "max": series.max().isoformat() if not pd.isna(series.max()) else None,
-                "null_count": int(series.isna().sum()),
-                "null_percentage": float(series.isna().mean() * 100),
-                "unique_values": int(series.nunique()),
+                "min": earliest.isoformat() if earliest is not None else None,
+                "max": latest.isoformat() if latest is not None else None,
+                **self._null_and_unique_counts(series, non_null),
             }
             
             # Calculate time span in days if possible
-            try:
-                if not pd.isna(series.min()) and not pd.isna(series.max()):
-                    stats["time_span_days"] = (series.max() - series.min()).days
-            except:
-                pass
+            if earliest is not None:
+                stats["time_span_days"] = (latest - earliest).days
             
             # Detect if this might be a time series column
             if stats["unique_values"] > 10:
-                # Check if values are evenly spaced
-                sorted_dates = sorted(series.dropna().unique())
-                if len(sorted_dates) > 2:
-                    try:
-                        diffs = [(sorted_dates[i] - sorted_dates[i-1]).total_seconds() for i in range(1, min(10, len(sorted_dates)))]
-                        std_diff = np.std(diffs)
-                        mean_diff = np.mean(diffs)
-                        if std_diff / mean_diff < 0.2 or all(d == diffs[0] for d in diffs):
-                            stats["appears_to_be_time_series"] = True
-                            stats["approximate_frequency"] = str(pd.Timedelta(seconds=mean_diff))
-                    except:
-                        pass
+                # Check if the first distinct values are evenly spaced
+                if non_null.dt.tz is not None:
+                    non_null = non_null.dt.tz_convert(None)
+                first_dates = np.sort(pd.unique(non_null.to_numpy()))[:10]
+                diffs = (np.diff(first_dates) / np.timedelta64(1, "s")).astype(np.float64)
+                mean_diff = diffs.mean()
+                if mean_diff > 0 and (diffs.std() / mean_diff < 0.2 or np.all(diffs == diffs[0])):
+                    stats["appears_to_be_time_series"] = True
+                    stats["approximate_frequency"] = str(pd.Timedelta(seconds=mean_diff))
             
             return stats
         except Exception as e:
             # Fallback to text analysis if datetime analysis fails
             return self._analyze_text_column(series)
     
-    def _analyze_text_column(self, series: pd.Series) -> Dict[str, Any]:
+    def _analyze_text_column(self, series: pd.Series, non_null: Optional[pd.Series] = None) -> Dict[str, Any]:
         """
         Analyze a text column
         """
         # Get cleaned series without NaN values
-        clean_series = series.dropna().astype(str)
+        non_null = series.dropna() if non_null is None else non_null
+        clean_series = non_null.astype(str)
+        lengths = np.fromiter(map(len, clean_series), dtype=np.int64, count=len(clean_series))
         
+        counts = self._null_and_unique_counts(series, non_null)
         stats = {
             "data_type": "text",
-            "min_length": min((len(str(x)) for x in clean_series), default=0) if not clean_series.empty else 0,
-            "max_length": max((len(str(x)) for x in clean_series), default=0) if not clean_series.empty else 0,
-            "null_count": int(series.isna().sum()),
-            "null_percentage": float(series.isna().mean() * 100),
-            "unique_values": int(series.nunique()),
-            "is_unique": series.nunique() == len(series)
+            "min_length": int(lengths.min()) if len(lengths) else 0,
+            "max_length": int(lengths.max()) if len(lengths) else 0,
+            **counts,
+            "is_unique": counts["unique_values"] == len(series)
         }
         
         # Check if it might be a categorical column
@@ -234,38 +328,42 @@ class SchemaAnalyzer:
         if clean_series.empty:
             return stats
             
-        # Email pattern check
-        email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        email_matches = clean_series.str.match(email_pattern)
-        if email_matches.mean() > 0.7:  # If >70% match email pattern
+        # Email / URL pattern checks (>70% of values must match)
+        matches = self._count_text_patterns(clean_series)
+        if matches["email"] / len(clean_series) > 0.7:
             stats["appears_to_be_email"] = True
-        
-        # URL pattern check
-        url_pattern = r'^(http|https)://[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
-        url_matches = clean_series.str.match(url_pattern)
-        if url_matches.mean() > 0.7:  # If >70% match URL pattern
+        if matches["url"] / len(clean_series) > 0.7:
             stats["appears_to_be_url"] = True
             
         # Check if it might be a name column
-        name_indicators = ['name', 'person', 'customer', 'employee', 'user']
-        if any(ind in series.name.lower() for ind in name_indicators) and stats["max_length"] < 100:
+        if any(ind in series.name.lower() for ind in NAME_INDICATORS) and stats["max_length"] < 100:
             stats["might_be_name"] = True
             
         return stats
     
-    def _detect_relationships(self, table_name: str) -> List[Dict[str, Any]]:
+    @staticmethod
+    def _count_text_patterns(values: pd.Series) -> Dict[str, int]:
+        """
+        Number of values matching each TEXT_PATTERNS group
+        """
+        blob = "\n".join(values)
+        if blob.count("\n") != len(values) - 1:
+            # A value spans lines, so line anchors no longer separate values
+            return {
+                "email": int(values.str.match(EMAIL_PATTERN).sum()),
+                "url": int(values.str.match(URL_PATTERN).sum()),
+            }
+        counts = {"email": 0, "url": 0}
+        for match in TEXT_PATTERNS.finditer(blob):
+            counts["email" if match.group("email") is not None else "url"] += 1
+        return counts
+    
+    def _detect_relationships(self, table_name: str, catalog: CatalogSnapshot) -> List[Dict[str, Any]]:
         """
         Detect potential relationships with other tables in PostgreSQL
         """
-        cursor = self.connection.cursor()
-        
         # Get all tables in the database
-        cursor.execute("""
-            SELECT table_name 
-            FROM information_schema.tables 
-            WHERE table_schema = 'public'
-        """)
-        all_tables = [row["table_name"] for row in cursor.fetchall()]  # FIXED: Access using column name
+        all_tables = catalog.table_names()
         
         # Remove the current table from the list
         other_tables = [t for t in all_tables if t != table_name]
@@ -273,30 +371,10 @@ class SchemaAnalyzer:
         relationships = []
         
         # Get columns from current table
-        cursor.execute("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = %s
-        """, (table_name,))
-        table_columns = [row["column_name"] for row in cursor.fetchall()]  # FIXED: Access using column name
+        table_columns = catalog.column_names(table_name)
         
         # Check for foreign key constraints
-        cursor.execute("""
-            SELECT
-                kcu.column_name,
-                ccu.table_name AS foreign_table_name,
-                ccu.column_name AS foreign_column_name
-            FROM
-                information_schema.table_constraints AS tc
-                JOIN information_schema.key_column_usage AS kcu
-                  ON tc.constraint_name = kcu.constraint_name
-                  AND tc.table_schema = kcu.table_schema
-                JOIN information_schema.constraint_column_usage AS ccu
-                  ON ccu.constraint_name = tc.constraint_name
-                  AND ccu.table_schema = tc.table_schema
-            WHERE tc.constraint_type = 'FOREIGN KEY' AND tc.table_name = %s
-        """, (table_name,))
-        fk_constraints = cursor.fetchall()
+        fk_constraints = catalog.foreign_keys(table_name)
         
         # Add foreign key relationships
         for fk in fk_constraints:
@@ -308,62 +386,95 @@ class SchemaAnalyzer:
                 "to_column": fk["foreign_column_name"]  # FIXED: Access using column name
             })
         
-        # Look for naming pattern relationships
+        # Look for naming pattern relationships (column named like other_table_id)
+        tables_by_id_column = {f"{other_table.lower()}_id": other_table for other_table in other_tables}
         for col in table_columns:
-            for other_table in other_tables:
-                # Check if column name is like other_table_id
-                if col.lower() == f"{other_table.lower()}_id":
-                    # Check if this is already covered by an FK constraint
-                    if not any(rel["from_column"] == col and rel["to_table"] == other_table for rel in relationships):
+            other_table = tables_by_id_column.get(col.lower())
+            # Check if this is already covered by an FK constraint
+            if other_table and not any(rel["from_column"] == col and rel["to_table"] == other_table for rel in relationships):
+                relationships.append({
+                    "type": "naming_pattern",
+                    "from_table": table_name,
+                    "from_column": col,
+                    "to_table": other_table,
+                    "to_column": "id"  # Assuming the other table has an id column
+                })
+        
+        # Check for potential many-to-many relationships through junction tables
+        # (few columns, at least 2 of which look like foreign keys)
+        other_table_set = set(other_tables)
+        fk_like_columns = [c for c in table_columns if c.endswith('_id')]
+        if len(table_columns) <= 3 and len(other_tables) >= 2 and len(fk_like_columns) >= 2:
+            for i, fk1 in enumerate(fk_like_columns):
+                for fk2 in fk_like_columns[i+1:]:
+                    # Try to extract table names from column names
+                    table1 = fk1.replace('_id', '')
+                    table2 = fk2.replace('_id', '')
+                    if table1 in other_table_set and table2 in other_table_set:
                         relationships.append({
-                            "type": "naming_pattern",
-                            "from_table": table_name,
-                            "from_column": col,
-                            "to_table": other_table,
-                            "to_column": "id"  # Assuming the other table has an id column
+                            "type": "junction_table",
+                            "junction_table": table_name,
+                            "table1": table1,
+                            "column1": fk1,
+                            "table2": table2,
+                            "column2": fk2
                         })
-                
-                # Check for potential many-to-many relationships through junction tables
-                if len(table_columns) <= 3 and len(other_tables) >= 2:
-                    # This might be a junction table if it has few columns and at least 2 look like foreign keys
-                    fk_like_columns = [c for c in table_columns if c.endswith('_id')]
-                    if len(fk_like_columns) >= 2:
-                        for i, fk1 in enumerate(fk_like_columns):
-                            for fk2 in fk_like_columns[i+1:]:
-                                # Try to extract table names from column names
-                                table1 = fk1.replace('_id', '')
-                                table2 = fk2.replace('_id', '')
-                                if table1 in other_tables and table2 in other_tables:
-                                    relationships.append({
-                                        "type": "junction_table",
-                                        "junction_table": table_name,
-                                        "table1": table1,
-                                        "column1": fk1,
-                                        "table2": table2,
-                                        "column2": fk2
-                                    })
+        
+        # Join candidates from value overlap between column sketches (uploads have no FKs)
+        if self.sketch_index:
+            known = {(rel.get("from_table"), rel.get("from_column"), rel.get("to_table")) for rel in relationships}
+            for candidate in self.sketch_index.join_candidates(table_name, self._exact_overlap):
+                if (candidate["from_table"], candidate["from_column"], candidate["to_table"]) not in known \
+                        and catalog.has_table(candidate["to_table"]) and catalog.has_table(candidate["from_table"]):
+                    relationships.append(candidate)
         
         return relationships
     
-    def _identify_foreign_keys(self, table_name: str) -> List[str]:
+    def _exact_overlap(self, from_table: str, from_col: str, to_table: str, to_col: str) -> Optional[float]:
         """
-        Identify foreign keys in PostgreSQL
+        Fraction of from_col's distinct values that occur in to_col, counted in the
+        tables; None if the count fails or takes longer than OVERLAP_CHECK_TIMEOUT_MS.
+        Runs in a savepoint, so the timeout and any error stay inside it.
         """
+        autocommit = getattr(self.connection, "autocommit", False) is True
+        if autocommit:
+            # Savepoints and SET LOCAL need a transaction
+            self.connection.autocommit = False
         cursor = self.connection.cursor()
-        
-        cursor.execute("""
-            SELECT kcu.column_name
-            FROM information_schema.table_constraints AS tc
-            JOIN information_schema.key_column_usage AS kcu
-              ON tc.constraint_name = kcu.constraint_name
-              AND tc.table_schema = kcu.table_schema
-            WHERE tc.constraint_type = 'FOREIGN KEY' AND tc.table_name = %s
-        """, (table_name,))
-        
-        foreign_keys = [row["column_name"] for row in cursor.fetchall()]  # FIXED: Access using column name
-        return foreign_keys
+        cursor.execute("SAVEPOINT exact_overlap")
+        try:
+            cursor.execute("SET LOCAL statement_timeout = %s", (self.OVERLAP_CHECK_TIMEOUT_MS,))
+            cursor.execute(
+                pg_sql.SQL(
+                    "WITH f AS (SELECT DISTINCT {from_col} AS v FROM {from_table} WHERE {from_col} IS NOT NULL) "
+                    "SELECT (SELECT count(*) FROM f WHERE EXISTS "
+                    "(SELECT 1 FROM {to_table} t WHERE t.{to_col} = f.v)) AS found, "
+                    "(SELECT count(*) FROM f) AS total"
+                ).format(
+                    from_col=pg_sql.Identifier(from_col), from_table=pg_sql.Identifier(from_table),
+                    to_col=pg_sql.Identifier(to_col), to_table=pg_sql.Identifier(to_table),
+                )
+            )
+            row = cursor.fetchone()
+            return row["found"] / row["total"] if row["total"] else None
+        except Exception as e:
+            logger.warning(f"Overlap of {from_table}.{from_col} in {to_table}.{to_col} not counted: {str(e)}")
+            return None
+        finally:
+            # Also undoes the SET LOCAL
+            cursor.execute("ROLLBACK TO SAVEPOINT exact_overlap")
+            cursor.execute("RELEASE SAVEPOINT exact_overlap")
+            if autocommit:
+                self.connection.rollback()
+                self.connection.autocommit = True
+
+    def _identify_foreign_keys(self, table_name: str, catalog: CatalogSnapshot) -> List[str]:
+        """
+        Identify foreign keys in PostgreSQL
+        """
+        return [fk["column_name"] for fk in catalog.foreign_keys(table_name)]
     
-    def _generate_sample_queries(self, table_name: str, columns: List[str]) -> List[Dict[str, str]]:
+    def _generate_sample_queries(self, table_name: str, columns: List[str], catalog: CatalogSnapshot) -> List[Dict[str, str]]:
         """
         Generate sample PostgreSQL queries that demonstrate how to query this table
         """
@@ -390,16 +501,10 @@ class SchemaAnalyzer:
         
         # GROUP BY (if multiple columns)
         if len(columns) > 1:
-            numeric_columns = []
             # Try to identify numeric columns for aggregation
-            cursor = self.connection.cursor()
-            cursor.execute("""
-                SELECT column_name, data_type
-                FROM information_schema.columns
-                WHERE table_name = %s AND data_type IN 
-                ('integer', 'bigint', 'smallint', 'decimal', 'numeric', 'real', 'double precision')
-            """, (table_name,))
-            numeric_columns = [row["column_name"] for row in cursor.fetchall()]  # FIXED: Access using column name
+            numeric_columns = catalog.columns_of_type(
+                table_name, ('integer', 'bigint', 'smallint', 'decimal', 'numeric', 'real', 'double precision')
+            )
             
             # Find a good candidate for GROUP BY (non-numeric)
             groupby_candidates = [col for col in columns if col not in numeric_columns]
@@ -434,34 +539,11 @@ class SchemaAnalyzer:
         })
         
         # JOIN with related tables
-        cursor = self.connection.cursor()
-        cursor.execute("""
-            SELECT
-                kcu.column_name,
-                ccu.table_name AS foreign_table_name,
-                ccu.column_name AS foreign_column_name
-            FROM
-                information_schema.table_constraints AS tc
-                JOIN information_schema.key_column_usage AS kcu
-                  ON tc.constraint_name = kcu.constraint_name
-                  AND tc.table_schema = kcu.table_schema
-                JOIN information_schema.constraint_column_usage AS ccu
-                  ON ccu.constraint_name = tc.constraint_name
-                  AND ccu.table_schema = tc.table_schema
-            WHERE tc.constraint_type = 'FOREIGN KEY' AND tc.table_name = %s
-            LIMIT 1
-        """, (table_name,))
-        fk = cursor.fetchone()
+        fk = catalog.first_foreign_key(table_name)
         
         if fk:
             # Get a column from the foreign table for the join example
-            cursor.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name = %s 
-                LIMIT 2
-            """, (fk["foreign_table_name"],))  # FIXED: Access using column name
-            foreign_columns = [row["column_name"] for row in cursor.fetchall()]  # FIXED: Access using column name
+            foreign_columns = catalog.column_names(fk["foreign_table_name"])[:2]
             
             if foreign_columns:
                 join_col = next((col for col in foreign_columns if col != fk["foreign_column_name"]), foreign_columns[0])  # FIXED: Access using column name
@@ -472,17 +554,12 @@ class SchemaAnalyzer:
                 })
         
         # Date filtering (if we have date columns)
-        cursor.execute("""
-            SELECT column_name
-            FROM information_schema.columns
-            WHERE table_name = %s AND data_type IN 
-            ('date', 'timestamp', 'timestamp without time zone', 'timestamp with time zone')
-            LIMIT 1
-        """, (table_name,))
-        date_column = cursor.fetchone()
-        
-        if date_column:
-            date_col = date_column["column_name"]  # FIXED: Access using column name
+        date_columns = catalog.columns_of_type(
+            table_name, ('date', 'timestamp', 'timestamp without time zone', 'timestamp with time zone')
+        )
+        
+        if date_columns:
+            date_col = date_columns[0]
             samples.append({
                 "description": f"Filter by date range",
                 "sql": f'SELECT * FROM "{table_name}" WHERE "{date_col}" BETWEEN $1 AND $2'
@@ -494,17 +571,12 @@ class SchemaAnalyzer:
             })
         
         # Full text search (if we have text columns)
-        cursor.execute("""
-            SELECT column_name
-            FROM information_schema.columns
-            WHERE table_name = %s AND data_type IN 
-            ('character varying', 'varchar', 'text', 'char', 'character')
-            LIMIT 1
-        """, (table_name,))
-        text_column = cursor.fetchone()
-        
-        if text_column:
-            text_col = text_column["column_name"]  # FIXED: Access using column name
+        text_columns = catalog.columns_of_type(
+            table_name, ('character varying', 'varchar', 'text', 'char', 'character')
+        )
+        
+        if text_columns:
+            text_col = text_columns[0]
             samples.append({
                 "description": f"Text search",
                 "sql": f'SELECT * FROM "{table_name}" WHERE "{text_col}" ILIKE \'%\' || $1 || \'%\''
@@ -512,72 +584,131 @@ class SchemaAnalyzer:
         
         return samples
     
-    def get_table_columns(self, table_name: str) -> List[Dict[str, Any]]:
+    def get_table_columns(self, table_name: str, catalog: Optional[CatalogSnapshot] = None) -> List[Dict[str, Any]]:
         """
         Get detailed information about table columns
         """
-        cursor = self.connection.cursor()
-        
-        cursor.execute("""
-            SELECT 
-                c.column_name, 
-                c.data_type, 
-                c.is_nullable,
-                c.character_maximum_length,
-                c.numeric_precision,
-                c.numeric_scale,
-                pgd.description
-            FROM 
-                information_schema.columns c
-            LEFT JOIN 
-                pg_catalog.pg_statio_all_tables st ON c.table_name = st.relname
-            LEFT JOIN 
-                pg_catalog.pg_description pgd ON pgd.objoid = st.relid AND pgd.objsubid = c.ordinal_position
-            WHERE 
-                c.table_name = %s
-            ORDER BY 
-                c.ordinal_position
-        """, (table_name,))
-        
-        columns = cursor.fetchall()
-        return [dict(col) for col in columns]
+        catalog = catalog or CatalogSnapshot.load(self.connection)
+        fields = ("column_name", "data_type", "is_nullable", "character_maximum_length",
+                  "numeric_precision", "numeric_scale", "description")
+        return [{field: col[field] for field in fields} for col in catalog.columns(table_name)]
     
-    def get_schema_metadata(self) -> Dict[str, Any]:
+    def get_schema_metadata(
+        self,
+        connection_factory: Optional[Callable[[], Any]] = None,
+        max_workers: int = 4,
+        previous: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
         """
-        Get comprehensive metadata about the entire database schema
+        Get comprehensive metadata about the entire database schema.
+        With a `connection_factory`, tables are analyzed in parallel on up to `max_workers`
+        connections. Tables of a `previous` result whose signature is unchanged keep their
+        statistics; only their catalog-derived parts are rebuilt.
         """
-        cursor = self.connection.cursor()
+        # One catalog snapshot serves every table, instead of per-table catalog queries
+        catalog = CatalogSnapshot.load(self.connection)
         
         # Get all tables
-        cursor.execute("""
-            SELECT table_name 
-            FROM information_schema.tables 
-            WHERE table_schema = 'public'
-        """)
-        tables = [row["table_name"] for row in cursor.fetchall()]  # FIXED: Access using column name
-        
-        # Analyze each table
+        tables = catalog.table_names()
+        previous_tables = {t["table_name"]: t for t in (previous or {}).get("tables", [])}
+        
+        analyses: Dict[str, Dict[str, Any]] = {}
+        to_analyze = []
+        for table in tables:
+            signature = catalog.table_signature(table)
+            cached = previous_tables.get(table)
+            if signature and cached and cached.get("signature") == signature:
+                analyses[table] = self._compile_analysis(table, catalog, cached["row_count"], {
+                    col["name"]: col.get("stats", {}) for col in cached.get("columns", [])
+                })
+            else:
+                to_analyze.append(table)
+        logger.info(f"Analyzing {len(to_analyze)} of {len(tables)} tables "
+                    f"({len(tables) - len(to_analyze)} unchanged)")
+        
+        if connection_factory and max_workers > 1 and len(to_analyze) > 1:
+            analyses.update(self._analyze_tables_parallel(to_analyze, catalog, connection_factory, max_workers))
+        else:
+            for table in to_analyze:
+                analyses[table] = self._analyze_table_or_skip(table, catalog)
+        
+        # Assemble in catalog order, de-duplicating relationships through a hashed set
         schema_metadata = {
             "tables": [],
             "relationships": []
         }
-        
+        seen_relationships = set()
         for table in tables:
-            table_analysis = self.analyze_table(table)
+            table_analysis = analyses.get(table)
+            if table_analysis is None:
+                continue
+            table_analysis["signature"] = catalog.table_signature(table)
             schema_metadata["tables"].append(table_analysis)
             
             # Add relationships
             for relationship in table_analysis["relationships"]:
-                if relationship not in schema_metadata["relationships"]:
+                key = tuple(sorted(relationship.items()))
+                if key not in seen_relationships:
+                    seen_relationships.add(key)
                     schema_metadata["relationships"].append(relationship)
         
         return schema_metadata
+
+    def _analyze_table_or_skip(self, table_name: str, catalog: CatalogSnapshot) -> Optional[Dict[str, Any]]:
+        """
+        Analyze one table of a whole-schema run; a failing table is logged and left out
+        """
+        try:
+            return self.analyze_table(table_name, catalog=catalog)
+        except Exception as e:
+            logger.warning(f"Skipping table {table_name} in schema metadata: {str(e)}")
+            self.connection.rollback()
+            return None
+
+    def _analyze_tables_parallel(
+        self,
+        tables: List[str],
+        catalog: CatalogSnapshot,
+        connection_factory: Callable[[], Any],
+        max_workers: int
+    ) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Spread tables over a bounded thread pool; each worker thread opens one connection
+        and analyzes its share of the tables on it
+        """
+        local = threading.local()
+        connections = []
+        connections_lock = threading.Lock()
+        
+        def analyze(table_name: str) -> Optional[Dict[str, Any]]:
+            analyzer = getattr(local, "analyzer", None)
+            if analyzer is None:
+                conn = connection_factory()
+                with connections_lock:
+                    connections.append(conn)
+                analyzer = local.analyzer = SchemaAnalyzer(
+                    conn, stats_engine=self.stats_engine, exact_stats_max_rows=self.exact_stats_max_rows,
+                    sketch_index=self.sketch_index
+                )
+            return analyzer._analyze_table_or_skip(table_name, catalog)
+        
+        try:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(tables)),
+                                    thread_name_prefix="schema-analyzer") as executor:
+                return dict(zip(tables, executor.map(analyze, tables)))
+        finally:
+            for conn in connections:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
     
-    def generate_schema_summary(self) -> str:
+    def generate_schema_summary(self, **metadata_options) -> str:
         """
         Generate a human-readable summary of the database schema
+        (`metadata_options` are passed to get_schema_metadata)
         """
-        metadata = self.get_schema_metadata()
+        metadata = self.get_schema_metadata(**metadata_options)
         
         summary = "# Database Schema Summary\n\n"
         
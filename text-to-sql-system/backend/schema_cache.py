@@ -0,0 +1,120 @@
+# schema_cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+
+class FrozenDict(dict):
+    """
+    Read-only dict: changes raise TypeError. Being a dict, it still JSON-encodes and
+    works with code that reads dicts.
+    """
+
+    __slots__ = ()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("FrozenDict is read-only")
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+def freeze(value: Any) -> Any:
+    """
+    Deeply read-only copy of JSON-like data: dicts become FrozenDicts, lists tuples
+    """
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class SchemaCache:
+    """
+    Thread-safe LRU cache of table schemas (with their annotations), stored frozen so
+    that every request can share one object.
+
+    Uploads, renames and annotation saves in this process invalidate a table's entry; a
+    time-to-live bounds how long a change made by another process goes unseen.
+    """
+
+    def __init__(self, max_entries: int = 128, ttl_s: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._entries: "OrderedDict[str, Tuple[FrozenDict, float]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "loads": 0, "evictions": 0, "invalidations": 0}
+
+    def generation(self, table_name: str) -> int:
+        """
+        Current invalidation count of a table; pass it to put() so that a schema read
+        before an invalidation is not stored
+        """
+        with self._lock:
+            return self._generations.get(table_name, 0)
+
+    def get(self, table_name: str) -> Optional[FrozenDict]:
+        with self._lock:
+            entry = self._entries.get(table_name)
+            if entry is None or time.monotonic() >= entry[1]:
+                if entry is not None:
+                    del self._entries[table_name]
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(table_name)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def put(self, table_name: str, schema: Dict[str, Any], generation: Optional[int] = None) -> FrozenDict:
+        """
+        Freeze and store a schema; returns the frozen schema
+        """
+        frozen = freeze(schema)
+        if self.max_entries <= 0:
+            return frozen
+        with self._lock:
+            if generation is not None and generation != self._generations.get(table_name, 0):
+                return frozen
+            self._entries[table_name] = (frozen, time.monotonic() + self.ttl_s)
+            self._entries.move_to_end(table_name)
+            self._stats["loads"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+        return frozen
+
+    def put_many(self, schemas: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        count = 0
+        for table_name, schema in schemas:
+            if count >= self.max_entries:
+                break
+            self.put(table_name, schema)
+            count += 1
+        return count
+
+    def invalidate(self, table_name: str) -> None:
+        with self._lock:
+            self._generations[table_name] = self._generations.get(table_name, 0) + 1
+            if self._entries.pop(table_name, None) is not None:
+                self._stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            for table_name in self._entries:
+                self._generations[table_name] = self._generations.get(table_name, 0) + 1
+            self._entries.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_s": self.ttl_s,
+                **self._stats,
+            }
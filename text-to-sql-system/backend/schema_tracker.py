@@ -0,0 +1,185 @@
+# schema_tracker.py
+import json
+import logging
+from typing import Dict, Any, Callable, List, Optional
+
+from psycopg2 import sql as pg_sql
+
+from catalog_snapshot import CatalogSnapshot
+from schema_analyzer import SchemaAnalyzer
+from sketches import SketchIndex
+
+logger = logging.getLogger(__name__)
+
+
+class SchemaTracker:
+    """
+    Keeps the schemas stored in uploaded_tables in step with the table data.
+
+    Every stored schema records the table's data signature (CatalogSnapshot.table_signature)
+    and a fingerprint of each column's planner statistics. A refresh pass re-analyzes only
+    tables whose signature moved, and within them only columns whose fingerprint moved.
+    Each schema write takes a new value from schema_version_seq, so the sequence position
+    is a schema version that caches can key on.
+    """
+
+    # Changes when ANALYZE sees a different value distribution in the column
+    COLUMN_FINGERPRINTS_QUERY = """
+        SELECT attname, md5(concat_ws('|', null_frac, n_distinct, avg_width, correlation,
+                                      most_common_vals::text, most_common_freqs::text,
+                                      histogram_bounds::text)) AS fingerprint
+        FROM pg_stats
+        WHERE schemaname = %s AND tablename = %s
+    """
+
+    def __init__(self, connection_factory: Callable[[], Any], schema: str = "public", **analyzer_options):
+        self.connection_factory = connection_factory
+        self.schema = schema
+        self.analyzer_options = analyzer_options
+
+    @staticmethod
+    def ensure_tables(cursor) -> None:
+        cursor.execute("CREATE SEQUENCE IF NOT EXISTS schema_version_seq")
+        cursor.execute("""
+        ALTER TABLE uploaded_tables
+            ADD COLUMN IF NOT EXISTS version BIGINT,
+            ADD COLUMN IF NOT EXISTS data_signature TEXT,
+            ADD COLUMN IF NOT EXISTS column_fingerprints JSONB,
+            ADD COLUMN IF NOT EXISTS analyzed_at TIMESTAMP,
+            ADD COLUMN IF NOT EXISTS column_sketches JSONB
+        """)
+
+    @staticmethod
+    def schema_version(cursor) -> int:
+        cursor.execute("SELECT last_value, is_called FROM schema_version_seq")
+        row = cursor.fetchone()
+        return row["last_value"] if row["is_called"] else 0
+
+    @staticmethod
+    def table_versions(cursor) -> Dict[str, int]:
+        cursor.execute("SELECT table_name, version FROM uploaded_tables")
+        return {row["table_name"]: row["version"] for row in cursor.fetchall()}
+
+    @classmethod
+    def column_fingerprints(cls, cursor, table_name: str, schema: str = "public") -> Dict[str, str]:
+        cursor.execute(cls.COLUMN_FINGERPRINTS_QUERY, (schema, table_name))
+        return {row["attname"]: row["fingerprint"] for row in cursor.fetchall()}
+
+    @staticmethod
+    def changed_columns(previous: Optional[Dict[str, str]], current: Dict[str, str], columns: List[str]) -> List[str]:
+        """
+        Columns whose fingerprint differs from (or is missing in) the previous one; a column
+        without planner statistics counts as changed
+        """
+        previous = previous or {}
+        return [col for col in columns
+                if col not in current or col not in previous or previous[col] != current[col]]
+
+    @classmethod
+    def save(cls, cursor, table_name: str, schema: Dict[str, Any],
+             catalog: Optional[CatalogSnapshot] = None, sketches: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Store a freshly analyzed schema with the table's current signature and column
+        fingerprints under a new version; run after ANALYZE so the fingerprints are current.
+        Serialized column `sketches` replace the stored ones when given.
+        """
+        catalog = catalog or CatalogSnapshot.load(cursor.connection)
+        cursor.execute(
+            """
+            INSERT INTO uploaded_tables
+                (table_name, schema, version, data_signature, column_fingerprints, analyzed_at, column_sketches)
+            VALUES (%s, %s, nextval('schema_version_seq'), %s, %s, CURRENT_TIMESTAMP, %s)
+            ON CONFLICT (table_name) DO UPDATE SET
+                schema = EXCLUDED.schema,
+                version = EXCLUDED.version,
+                data_signature = EXCLUDED.data_signature,
+                column_fingerprints = EXCLUDED.column_fingerprints,
+                analyzed_at = EXCLUDED.analyzed_at,
+                column_sketches = COALESCE(EXCLUDED.column_sketches, uploaded_tables.column_sketches)
+            RETURNING version
+            """,
+            (table_name, json.dumps(schema), catalog.table_signature(table_name),
+             json.dumps(cls.column_fingerprints(cursor, table_name)),
+             json.dumps(sketches) if sketches is not None else None)
+        )
+        return cursor.fetchone()["version"]
+
+    def refresh_all(self) -> Dict[str, Any]:
+        """
+        One refresh pass over every uploaded table; returns what was refreshed and the
+        resulting schema version
+        """
+        conn = self.connection_factory()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT table_name, schema, data_signature, column_fingerprints FROM uploaded_tables"
+            )
+            stored = cursor.fetchall()
+            catalog = CatalogSnapshot.load(conn, self.schema)
+            sketch_index = None
+            conn.commit()
+
+            summary = {"checked": len(stored), "refreshed": {}, "skipped": []}
+            for row in stored:
+                table_name = row["table_name"]
+                if not catalog.has_table(table_name) or catalog.table_signature(table_name) == row["data_signature"]:
+                    continue
+                try:
+                    sketch_index = sketch_index or SketchIndex.load(cursor)
+                    columns = self.refresh_table(conn, row, sketch_index)
+                except Exception as e:
+                    conn.rollback()
+                    logger.warning(f"Schema refresh of {table_name} failed: {str(e)}")
+                    summary["skipped"].append(table_name)
+                    continue
+                if columns is None:
+                    summary["skipped"].append(table_name)
+                else:
+                    summary["refreshed"][table_name] = columns
+            summary["schema_version"] = self.schema_version(cursor)
+            conn.commit()
+            return summary
+        finally:
+            conn.close()
+
+    def refresh_table(self, conn, stored: Dict[str, Any],
+                      sketch_index: Optional[SketchIndex] = None) -> Optional[List[str]]:
+        """
+        Re-analyze the changed columns of one table and store the result under a new
+        version. Returns the re-analyzed columns, or None when an upload of the table is
+        in progress (it stores its own schema when it finishes).
+        """
+        table_name = stored["table_name"]
+        cursor = conn.cursor()
+        # Same lock as the upload pipeline, without waiting for it
+        cursor.execute("SELECT pg_try_advisory_lock(hashtext(%s)) AS locked", (f"ingest:{table_name}",))
+        if not cursor.fetchone()["locked"]:
+            return None
+        try:
+            cursor.execute(pg_sql.SQL("ANALYZE {}").format(pg_sql.Identifier(table_name)))
+            conn.commit()
+            catalog = CatalogSnapshot.load(conn, self.schema)
+            previous = stored["schema"] or {}
+            if isinstance(previous, str):
+                previous = json.loads(previous)
+            changed = self.changed_columns(
+                stored["column_fingerprints"],
+                self.column_fingerprints(cursor, table_name, self.schema),
+                catalog.column_names(table_name),
+            )
+
+            analyzer = SchemaAnalyzer(conn, sketch_index=sketch_index, **self.analyzer_options)
+            schema = analyzer.refresh_columns(table_name, previous, changed, catalog=catalog)
+            # Keep what the upload pipeline added on top of the analysis
+            for key, value in previous.items():
+                schema.setdefault(key, value)
+            version = self.save(cursor, table_name, schema, catalog)
+            conn.commit()
+            logger.info(f"Refreshed schema of {table_name} (version {version}); "
+                        f"re-analyzed {len(changed)} column(s): {', '.join(changed) or 'none'}")
+            return changed
+        finally:
+            conn.rollback()
+            cursor.execute("SELECT pg_advisory_unlock(hashtext(%s))", (f"ingest:{table_name}",))
+            conn.commit()
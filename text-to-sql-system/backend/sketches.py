@@ -0,0 +1,397 @@
+# sketches.py
+import base64
+import logging
+import zlib
+from collections import defaultdict
+from typing import Callable, Dict, Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Only columns that can plausibly be join keys are sketched; values of different kinds never match
+SKETCH_KINDS = {
+    'SMALLINT': 'integer',
+    'INTEGER': 'integer',
+    'BIGINT': 'integer',
+    'TEXT': 'text',
+}
+
+
+def sketch_kind(pg_type: Optional[str]) -> Optional[str]:
+    return SKETCH_KINDS.get(pg_type)
+
+
+def hash_values(series: pd.Series, kind: str) -> np.ndarray:
+    """
+    64-bit hashes of the non-null values; the pandas hash key is fixed, so hashes are
+    stable across processes and uploads
+    """
+    values = series.dropna()
+    if kind == 'integer':
+        return pd.util.hash_array(values.to_numpy(dtype='int64'))
+    return pd.util.hash_array(values.astype(str).str.strip().to_numpy(dtype=object))
+
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    result = np.zeros(len(values), dtype=np.uint8)
+    remaining = values.copy()
+    for shift in (32, 16, 8, 4, 2, 1):
+        wide = remaining >= np.uint64(1 << shift)
+        result[wide] += shift
+        remaining[wide] >>= np.uint64(shift)
+    return result + (remaining > 0).astype(np.uint8)
+
+
+def _encode(array: np.ndarray) -> str:
+    return base64.b64encode(zlib.compress(array.tobytes())).decode('ascii')
+
+
+def _decode(data: str, dtype) -> np.ndarray:
+    return np.frombuffer(zlib.decompress(base64.b64decode(data)), dtype=dtype).copy()
+
+
+class HyperLogLog:
+    """
+    Distinct-count sketch: 2**precision one-byte registers (about 1.04 / sqrt(2**precision)
+    relative error, 1.6% at the default precision)
+    """
+
+    def __init__(self, precision: int = 12, registers: Optional[np.ndarray] = None):
+        self.precision = precision
+        self.registers = registers if registers is not None else np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes: np.ndarray) -> None:
+        if not len(hashes):
+            return
+        rest_bits = 64 - self.precision
+        index = (hashes >> np.uint64(rest_bits)).astype(np.intp)
+        rest = hashes & np.uint64((1 << rest_bits) - 1)
+        rank = (rest_bits + 1 - _bit_length(rest)).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> float:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            # Linear counting is more accurate while many registers are still empty
+            return m * np.log(m / zeros)
+        return float(raw)
+
+
+class MinHash:
+    """
+    One-permutation (bottom-k) MinHash: the k smallest distinct value hashes. Any value
+    hashing below the largest kept hash is known exactly to be in the set or not, which
+    makes the sketch usable for containment as well as Jaccard similarity.
+    """
+
+    def __init__(self, k: int = 256, mins: Optional[np.ndarray] = None):
+        self.k = k
+        self.mins = mins if mins is not None else np.empty(0, dtype=np.uint64)
+
+    @property
+    def threshold(self) -> int:
+        """
+        Largest hash value the sketch covers exhaustively
+        """
+        return int(self.mins[-1]) if len(self.mins) >= self.k else (1 << 64) - 1
+
+    def add_hashes(self, hashes: np.ndarray) -> None:
+        if len(self.mins) >= self.k:
+            hashes = hashes[hashes < self.mins[-1]]
+        if len(hashes):
+            self.mins = np.union1d(self.mins, hashes)[:self.k]
+
+    def merge(self, other: "MinHash") -> None:
+        self.add_hashes(other.mins)
+
+    def containment_in(self, other: "MinHash", min_sample: int = 8) -> Optional[float]:
+        """
+        Estimated fraction of this set's values that are also in `other`, from this
+        sketch's values that fall in the range `other` covers; None if too few do
+        """
+        sample = self.mins[self.mins <= np.uint64(other.threshold)]
+        if len(sample) < min(min_sample, len(self.mins)) or not len(sample):
+            return None
+        return float(np.isin(sample, other.mins, assume_unique=True).mean())
+
+
+class ColumnSketch:
+    """
+    HyperLogLog plus MinHash of one column's values, with its non-null value count
+    """
+
+    def __init__(self, kind: str, hll: Optional[HyperLogLog] = None, minhash: Optional[MinHash] = None,
+                 count: int = 0):
+        self.kind = kind
+        self.hll = hll or HyperLogLog()
+        self.minhash = minhash or MinHash()
+        self.count = count
+
+    def add(self, series: pd.Series) -> None:
+        hashes = hash_values(series, self.kind)
+        self.hll.add_hashes(hashes)
+        self.minhash.add_hashes(hashes)
+        self.count += len(hashes)
+
+    def merge(self, other: "ColumnSketch") -> None:
+        self.hll.merge(other.hll)
+        self.minhash.merge(other.minhash)
+        self.count += other.count
+
+    def distinct(self) -> int:
+        # A set smaller than k is held in the MinHash in full, so its count is exact
+        if len(self.minhash.mins) < self.minhash.k:
+            return len(self.minhash.mins)
+        return int(round(min(self.hll.estimate(), self.count)))
+
+    def looks_like_key(self, min_uniqueness: float) -> bool:
+        return self.count > 0 and self.distinct() >= min_uniqueness * self.count
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "count": self.count,
+            "hll_precision": self.hll.precision,
+            "hll": _encode(self.hll.registers),
+            "minhash_k": self.minhash.k,
+            "minhash": _encode(self.minhash.mins),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ColumnSketch":
+        return cls(
+            data["kind"],
+            HyperLogLog(data["hll_precision"], _decode(data["hll"], np.uint8)),
+            MinHash(data["minhash_k"], _decode(data["minhash"], np.uint64)),
+            data["count"],
+        )
+
+
+class ColumnSketchBuilder:
+    """
+    Sketches the key-like columns of a table chunk by chunk during ingest. A column whose
+    type changes kind mid-load (e.g. INTEGER widened to NUMERIC) is dropped.
+    """
+
+    def __init__(self):
+        self.sketches: Dict[str, ColumnSketch] = {}
+        self._dropped: set = set()
+
+    def update(self, df: pd.DataFrame, column_types: Dict[str, str]) -> None:
+        for col in df.columns:
+            if col in self._dropped:
+                continue
+            kind = sketch_kind(column_types.get(col))
+            sketch = self.sketches.get(col)
+            if kind is None or (sketch and sketch.kind != kind):
+                self._drop(col)
+                continue
+            if sketch is None:
+                sketch = self.sketches[col] = ColumnSketch(kind)
+            sketch.add(df[col])
+
+    def merge(self, previous: Dict[str, ColumnSketch], counts: Optional[Dict[str, int]] = None) -> None:
+        """
+        Fold in the stored sketches of the rows already in the table (append / upsert).
+        An upsert rewrites rows that were already counted, so it passes the table's
+        non-null counts after the load in `counts` instead of summing the two.
+        """
+        for col, sketch in previous.items():
+            if col in self._dropped:
+                continue
+            current = self.sketches.get(col)
+            if current is None:
+                self.sketches[col] = sketch
+            elif current.kind == sketch.kind:
+                current.merge(sketch)
+            else:
+                self._drop(col)
+        for col, count in (counts or {}).items():
+            if col in self.sketches:
+                self.sketches[col].count = count
+
+    def _drop(self, col: str) -> None:
+        self._dropped.add(col)
+        self.sketches.pop(col, None)
+
+    def finish(self, column_types: Dict[str, str]) -> Dict[str, ColumnSketch]:
+        return {col: sketch for col, sketch in self.sketches.items()
+                if sketch_kind(column_types.get(col)) == sketch.kind}
+
+
+class SketchIndex:
+    """
+    Column sketches of every uploaded table with an inverted index from MinHash values to
+    columns, so join candidates for a column are found without comparing it to every
+    other column (or touching any table data)
+    """
+
+    # A column is proposed as a join target when it is (nearly) unique...
+    MIN_KEY_UNIQUENESS = 0.9
+    # ... and this fraction of the referencing column's distinct values occurs in it
+    MIN_OVERLAP = 0.8
+    MIN_DISTINCT = 2
+    # Small integer ranges overlap by coincidence, so integer pairs also need a key-like name
+    KEY_NAME_SUFFIXES = ("id", "_key", "_code", "_no", "_num", "_number")
+    # Overlaps counted in the tables themselves (see join_candidates) per call
+    MAX_EXACT_CHECKS = 16
+
+    def __init__(self, tables: Optional[Dict[str, Dict[str, ColumnSketch]]] = None):
+        self.tables: Dict[str, Dict[str, ColumnSketch]] = dict(tables or {})
+        self._postings: Optional[Dict[int, List[Tuple[str, str]]]] = None
+
+    @classmethod
+    def load(cls, cursor) -> "SketchIndex":
+        cursor.execute("SELECT table_name, column_sketches FROM uploaded_tables WHERE column_sketches IS NOT NULL")
+        return cls({
+            row["table_name"]: cls.deserialize(row["column_sketches"])
+            for row in cursor.fetchall()
+        })
+
+    @staticmethod
+    def serialize(sketches: Dict[str, ColumnSketch]) -> Dict[str, Any]:
+        return {col: sketch.to_dict() for col, sketch in sketches.items()}
+
+    @staticmethod
+    def deserialize(data: Dict[str, Any]) -> Dict[str, ColumnSketch]:
+        return {col: ColumnSketch.from_dict(sketch) for col, sketch in (data or {}).items()}
+
+    def table(self, table_name: str) -> Dict[str, ColumnSketch]:
+        return self.tables.get(table_name, {})
+
+    def set_table(self, table_name: str, sketches: Dict[str, ColumnSketch]) -> None:
+        self.tables[table_name] = sketches
+        self._postings = None
+
+    def _index(self) -> Dict[int, List[Tuple[str, str]]]:
+        if self._postings is None:
+            postings = defaultdict(list)
+            for table_name, sketches in self.tables.items():
+                for col, sketch in sketches.items():
+                    for value in sketch.minhash.mins.tolist():
+                        postings[value].append((table_name, col))
+            self._postings = postings
+        return self._postings
+
+    def _candidate_columns(self, table_name: str, sketch: ColumnSketch) -> Iterable[Tuple[str, str]]:
+        postings = self._index()
+        seen = set()
+        for value in sketch.minhash.mins.tolist():
+            for other in postings.get(value, ()):
+                if other[0] != table_name and other not in seen:
+                    seen.add(other)
+                    yield other
+
+    def _named_candidate_columns(self, table_name: str, col: str, sketch: ColumnSketch) -> Iterable[Tuple[str, str]]:
+        """
+        Columns of other tables that pair with `col` by name (see _named_after). The
+        postings miss these pairs when one column is much larger than the other: their
+        bottom-k samples then rarely share a value.
+        """
+        for other_table, sketches in self.tables.items():
+            if other_table == table_name:
+                continue
+            for other_col, other in sketches.items():
+                if other.kind == sketch.kind and (self._named_after(col, other_table, other_col)
+                                                  or self._named_after(other_col, table_name, col)):
+                    yield other_table, other_col
+
+    @staticmethod
+    def _named_after(from_col: str, to_table: str, to_col: str) -> bool:
+        """
+        Whether from_col is named after to_col: the same name, or to_col prefixed with
+        part of to_table's name (customer_id -> customers.id)
+        """
+        from_col, to_col = from_col.lower(), to_col.lower()
+        if from_col == to_col:
+            return True
+        stem = from_col[:-len(to_col)].rstrip("_") if from_col.endswith(to_col) else ""
+        return len(stem) >= 3 and stem in to_table.lower()
+
+    @classmethod
+    def _key_like_name(cls, name: str) -> bool:
+        return name.lower().endswith(cls.KEY_NAME_SUFFIXES)
+
+    def _join(self, from_table: str, from_col: str, from_sketch: ColumnSketch,
+              to_table: str, to_col: str, to_sketch: ColumnSketch,
+              exact_overlap: Optional[Callable[[str, str, str, str], Optional[float]]] = None
+              ) -> Optional[Dict[str, Any]]:
+        """
+        A from -> to join candidate if to_col looks like a key holding most of from_col's values
+        """
+        if from_sketch.distinct() < self.MIN_DISTINCT or not to_sketch.looks_like_key(self.MIN_KEY_UNIQUENESS):
+            return None
+        if from_sketch.kind == "integer" and not (
+                self._key_like_name(from_col) or from_col.lower() == to_col.lower()):
+            return None
+        overlap = from_sketch.minhash.containment_in(to_sketch.minhash)
+        if overlap is None and exact_overlap is not None and self._named_after(from_col, to_table, to_col):
+            # Too few of from_col's sampled values fall in the hash range to_col's sketch
+            # covers (a small column against a much larger key), so count in the tables
+            overlap = exact_overlap(from_table, from_col, to_table, to_col)
+        if overlap is None or overlap < self.MIN_OVERLAP:
+            return None
+        return {
+            "type": "value_overlap",
+            "from_table": from_table,
+            "from_column": from_col,
+            "to_table": to_table,
+            "to_column": to_col,
+            "overlap": round(overlap, 3),
+        }
+
+    def _orientation_key(self, relationship: Dict[str, Any]) -> Tuple[bool, str, str]:
+        """
+        When both directions qualify (e.g. two key columns), prefer a non-key column referencing
+        a key, then name order, so both tables of a pair pick the same direction
+        """
+        from_sketch = self.tables[relationship["from_table"]][relationship["from_column"]]
+        return (from_sketch.looks_like_key(self.MIN_KEY_UNIQUENESS),
+                relationship["from_table"], relationship["from_column"])
+
+    def join_candidates(self, table_name: str,
+                        exact_overlap: Optional[Callable[[str, str, str, str], Optional[float]]] = None
+                        ) -> List[Dict[str, Any]]:
+        """
+        Join candidates between `table_name` and other tables, in either direction, strongest
+        overlap first; both tables of a pair produce the same relationship.
+
+        `exact_overlap(from_table, from_col, to_table, to_col)` returns the fraction of
+        from_col's distinct values found in to_col, counted in the tables (None if it
+        cannot tell). When given, it decides the name-matched pairs whose sketches share
+        too few sampled values to estimate an overlap, up to MAX_EXACT_CHECKS per call.
+        """
+        checks = []
+
+        def limited_overlap(*pair: str) -> Optional[float]:
+            if len(checks) >= self.MAX_EXACT_CHECKS:
+                return None
+            checks.append(pair)
+            return exact_overlap(*pair)
+
+        verify = limited_overlap if exact_overlap is not None else None
+        candidates = []
+        for col, sketch in self.table(table_name).items():
+            others = dict.fromkeys(self._candidate_columns(table_name, sketch))
+            if verify is not None:
+                others.update(dict.fromkeys(self._named_candidate_columns(table_name, col, sketch)))
+            for other_table, other_col in others:
+                other = self.tables[other_table][other_col]
+                if other.kind != sketch.kind:
+                    continue
+                joins = [rel for rel in (
+                    self._join(table_name, col, sketch, other_table, other_col, other, verify),
+                    self._join(other_table, other_col, other, table_name, col, sketch, verify),
+                ) if rel]
+                if joins:
+                    candidates.append(min(joins, key=self._orientation_key))
+        candidates.sort(key=lambda rel: -rel["overlap"])
+        return candidates
@@ -0,0 +1,260 @@
+# sql_stats.py
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+import pandas as pd
+from psycopg2 import sql as pg_sql
+
+logger = logging.getLogger(__name__)
+
+NUMERIC_TYPES = {'smallint', 'integer', 'bigint', 'numeric', 'decimal', 'real', 'double precision', 'boolean'}
+DATETIME_TYPES = {'date', 'timestamp', 'timestamp without time zone', 'timestamp with time zone'}
+
+EMAIL_PATTERN = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+URL_PATTERN = r'^(http|https)://[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
+NAME_INDICATORS = ['name', 'person', 'customer', 'employee', 'user']
+
+
+class SqlStatsEngine:
+    """
+    Computes the SchemaAnalyzer column statistics inside PostgreSQL.
+    Tables up to `exact_max_rows` are aggregated exactly in a single pass; larger tables
+    use reltuples for the row count, pg_stats (kept current by ANALYZE) for null and
+    distinct counts, and a TABLESAMPLE SYSTEM sample for the remaining aggregates.
+    The per-column output has the same shape as the pandas analyzers.
+    """
+
+    def __init__(self, db_connection, exact_max_rows: int = 500000, sample_rows: int = 100000,
+                 pattern_sample_rows: int = 10000):
+        self.connection = db_connection
+        self.exact_max_rows = exact_max_rows
+        self.sample_rows = sample_rows
+        self.pattern_sample_rows = pattern_sample_rows
+        # Whether the last analyze() estimated from a sample rather than aggregating every row
+        self.sampled = False
+
+    def analyze(self, table_name: str, columns_info: List[Dict[str, Any]],
+                columns: Optional[List[str]] = None) -> Tuple[int, Dict[str, Dict[str, Any]]]:
+        """
+        Return (row_count, {column: stats}) for `columns` (default: every column in `columns_info`)
+        """
+        cursor = self.connection.cursor()
+        table = pg_sql.Identifier(table_name)
+        targets = [col for col in columns_info if columns is None or col["column_name"] in columns]
+
+        estimated_rows = self._reltuples(cursor, table_name)
+        approximate = estimated_rows > self.exact_max_rows
+        self.sampled = approximate
+        if approximate:
+            source = pg_sql.SQL("{} TABLESAMPLE SYSTEM ({})").format(
+                table, pg_sql.Literal(self._sample_percent(estimated_rows, self.sample_rows))
+            )
+        else:
+            source = table
+
+        aggregates = self._aggregate(cursor, source, targets)
+        scanned_rows = aggregates["total"]
+        row_count = estimated_rows if approximate else scanned_rows
+        pg_stats = self._pg_stats(cursor, table_name) if approximate else {}
+        patterns = self._pattern_matches(cursor, table, estimated_rows or scanned_rows, targets)
+
+        stats_by_column = {}
+        for i, col in enumerate(targets):
+            name = col["column_name"]
+            kind = self._kind(col["data_type"])
+            non_null = aggregates[f"c{i}_count"]
+            unique_values = aggregates[f"c{i}_distinct"]
+            null_count = scanned_rows - non_null
+            if approximate and name in pg_stats:
+                null_count = pg_stats[name]["null_frac"] * row_count
+                n_distinct = pg_stats[name]["n_distinct"]
+                unique_values = n_distinct if n_distinct >= 0 else -n_distinct * row_count
+            stats = {
+                "null_count": int(null_count),
+                "null_percentage": float(null_count / row_count * 100) if row_count else 0.0,
+                "unique_values": int(unique_values),
+            }
+
+            if kind == "numeric":
+                stats = {
+                    "data_type": "numeric",
+                    "min": self._float(aggregates[f"c{i}_min"]),
+                    "max": self._float(aggregates[f"c{i}_max"]),
+                    "mean": self._float(aggregates[f"c{i}_mean"]),
+                    "median": self._float(aggregates[f"c{i}_median"]),
+                    "std_dev": self._float(aggregates[f"c{i}_std"]),
+                    **stats,
+                    "is_integer": bool(aggregates[f"c{i}_integral"]) if aggregates[f"c{i}_integral"] is not None else True,
+                }
+                if stats["unique_values"] < 10 and row_count > stats["unique_values"] * 2:
+                    stats["appears_to_be_categorical"] = True
+                    stats["value_counts"] = {
+                        str(value): count
+                        for value, count in self._value_counts(cursor, source, name, scale=self._scale(row_count, scanned_rows))
+                    }
+            elif kind == "datetime":
+                stats = self._datetime_stats(cursor, source, name, aggregates[f"c{i}_min"], aggregates[f"c{i}_max"], stats)
+            else:
+                stats = {
+                    "data_type": "text",
+                    "min_length": aggregates[f"c{i}_min_length"] or 0,
+                    "max_length": aggregates[f"c{i}_max_length"] or 0,
+                    **stats,
+                    "is_unique": stats["unique_values"] == row_count,
+                }
+                if stats["unique_values"] < 20 and row_count > stats["unique_values"] * 2:
+                    stats["appears_to_be_categorical"] = True
+                    stats["value_counts"] = dict(
+                        self._value_counts(cursor, source, name, scale=self._scale(row_count, scanned_rows), as_text=True)
+                    )
+                if (patterns.get(f"c{i}_email") or 0) > 0.7:
+                    stats["appears_to_be_email"] = True
+                if (patterns.get(f"c{i}_url") or 0) > 0.7:
+                    stats["appears_to_be_url"] = True
+                if any(ind in name.lower() for ind in NAME_INDICATORS) and stats["max_length"] < 100:
+                    stats["might_be_name"] = True
+
+            stats_by_column[name] = stats
+
+        logger.info(f"Computed SQL statistics for {len(targets)} columns of {table_name} "
+                    f"({'sampled' if approximate else 'exact'}, {row_count} rows)")
+        return int(row_count), stats_by_column
+
+    @staticmethod
+    def _kind(data_type: str) -> str:
+        if data_type in NUMERIC_TYPES:
+            return "numeric"
+        if data_type in DATETIME_TYPES:
+            return "datetime"
+        return "text"
+
+    @staticmethod
+    def _float(value) -> Optional[float]:
+        return float(value) if value is not None else None
+
+    @staticmethod
+    def _scale(row_count: int, scanned_rows: int) -> float:
+        return row_count / scanned_rows if scanned_rows else 1.0
+
+    @staticmethod
+    def _sample_percent(total_rows: int, wanted_rows: int) -> float:
+        return round(min(100.0, max(0.01, wanted_rows / total_rows * 100)), 4)
+
+    @staticmethod
+    def _reltuples(cursor, table_name: str) -> int:
+        """
+        Planner row estimate; -1 (never analyzed) is reported as 0
+        """
+        cursor.execute(
+            "SELECT reltuples::bigint AS estimate FROM pg_class WHERE oid = %s::regclass",
+            (pg_sql.Identifier("public", table_name).as_string(cursor),)
+        )
+        row = cursor.fetchone()
+        return max(0, row["estimate"]) if row else 0
+
+    def _aggregate(self, cursor, source: pg_sql.Composable, targets: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        All column aggregates in one scan of `source`
+        """
+        expressions = [pg_sql.SQL("count(*) AS total")]
+        for i, col in enumerate(targets):
+            column = pg_sql.Identifier(col["column_name"])
+            kind = self._kind(col["data_type"])
+            # Text-like columns are compared as text so types without equality (json, ...) still work
+            distinct = column if kind != "text" else pg_sql.SQL("{}::text").format(column)
+            expressions.append(pg_sql.SQL("count({c}) AS c{i}_count, count(DISTINCT {d}) AS c{i}_distinct").format(
+                c=column, d=distinct, i=pg_sql.SQL(str(i))
+            ))
+            if kind == "numeric":
+                value = pg_sql.SQL("{}::int::double precision" if col["data_type"] == "boolean" else "{}::double precision").format(column)
+                expressions.append(pg_sql.SQL(
+                    "min({v}) AS c{i}_min, max({v}) AS c{i}_max, avg({v}) AS c{i}_mean, "
+                    "stddev_samp({v}) AS c{i}_std, "
+                    "percentile_cont(0.5) WITHIN GROUP (ORDER BY {v}) AS c{i}_median, "
+                    "bool_and({v} = trunc({v})) AS c{i}_integral"
+                ).format(v=value, i=pg_sql.SQL(str(i))))
+            elif kind == "datetime":
+                expressions.append(pg_sql.SQL("min({c}) AS c{i}_min, max({c}) AS c{i}_max").format(
+                    c=column, i=pg_sql.SQL(str(i))
+                ))
+            else:
+                expressions.append(pg_sql.SQL(
+                    "min(length({c}::text)) AS c{i}_min_length, max(length({c}::text)) AS c{i}_max_length"
+                ).format(c=column, i=pg_sql.SQL(str(i))))
+
+        cursor.execute(pg_sql.SQL("SELECT {} FROM {}").format(pg_sql.SQL(", ").join(expressions), source))
+        return cursor.fetchone()
+
+    @staticmethod
+    def _pg_stats(cursor, table_name: str) -> Dict[str, Dict[str, float]]:
+        cursor.execute(
+            """
+            SELECT attname, null_frac, n_distinct
+            FROM pg_stats
+            WHERE schemaname = 'public' AND tablename = %s
+            """,
+            (table_name,)
+        )
+        return {row["attname"]: row for row in cursor.fetchall()}
+
+    def _pattern_matches(self, cursor, table: pg_sql.Identifier, total_rows: int,
+                         targets: List[Dict[str, Any]]) -> Dict[str, Optional[float]]:
+        """
+        Fraction of non-null values matching the email / URL patterns, per text column,
+        measured on a TABLESAMPLE SYSTEM sample once the table outgrows `pattern_sample_rows`
+        """
+        expressions = []
+        params = []
+        for i, col in enumerate(targets):
+            if self._kind(col["data_type"]) != "text":
+                continue
+            column = pg_sql.Identifier(col["column_name"])
+            expressions.append(pg_sql.SQL(
+                "avg(({c}::text ~ %s)::int) AS c{i}_email, avg(({c}::text ~ %s)::int) AS c{i}_url"
+            ).format(c=column, i=pg_sql.SQL(str(i))))
+            params.extend([EMAIL_PATTERN, URL_PATTERN])
+        if not expressions:
+            return {}
+
+        source = table
+        if total_rows > self.pattern_sample_rows:
+            source = pg_sql.SQL("{} TABLESAMPLE SYSTEM ({})").format(
+                table, pg_sql.Literal(self._sample_percent(total_rows, self.pattern_sample_rows))
+            )
+        cursor.execute(pg_sql.SQL("SELECT {} FROM {}").format(pg_sql.SQL(", ").join(expressions), source), params)
+        return cursor.fetchone() or {}
+
+    @staticmethod
+    def _value_counts(cursor, source: pg_sql.Composable, column_name: str, scale: float = 1.0,
+                      as_text: bool = False) -> List[Tuple[Any, int]]:
+        value = pg_sql.SQL("{}::text" if as_text else "{}").format(pg_sql.Identifier(column_name))
+        cursor.execute(pg_sql.SQL(
+            "SELECT {v} AS value, count(*) AS n FROM {source} WHERE {c} IS NOT NULL GROUP BY 1 ORDER BY 2 DESC LIMIT 10"
+        ).format(v=value, c=pg_sql.Identifier(column_name), source=source))
+        return [(row["value"], int(round(row["n"] * scale))) for row in cursor.fetchall()]
+
+    @staticmethod
+    def _datetime_stats(cursor, source: pg_sql.Composable, column_name: str, min_value, max_value,
+                        counts: Dict[str, Any]) -> Dict[str, Any]:
+        stats = {
+            "data_type": "datetime",
+            "min": min_value.isoformat() if min_value is not None else None,
+            "max": max_value.isoformat() if max_value is not None else None,
+            **counts,
+        }
+        if min_value is not None and max_value is not None:
+            stats["time_span_days"] = (max_value - min_value).days
+
+        # Time series if the first distinct values are (nearly) evenly spaced
+        if stats["unique_values"] > 10:
+            cursor.execute(pg_sql.SQL(
+                "SELECT DISTINCT {c} AS value FROM {source} WHERE {c} IS NOT NULL ORDER BY 1 LIMIT 10"
+            ).format(c=pg_sql.Identifier(column_name), source=source))
+            values = [row["value"] for row in cursor.fetchall()]
+            if len(values) > 2:
+                diffs = pd.Series([(values[i] - values[i - 1]).total_seconds() for i in range(1, len(values))])
+                mean_diff = diffs.mean()
+                if mean_diff > 0 and (diffs.std(ddof=0) / mean_diff < 0.2 or (diffs == diffs.iloc[0]).all()):
+                    stats["appears_to_be_time_series"] = True
+                    stats["approximate_frequency"] = str(pd.Timedelta(seconds=mean_diff))
+        return stats
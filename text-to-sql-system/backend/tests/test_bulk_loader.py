@@ -0,0 +1,72 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from bulk_loader import BulkLoader, CsvChunkReader
+
+
+class FakeCursor:
+    def __init__(self):
+        self.copies = []
+
+    def copy_expert(self, statement, buffer):
+        self.copies.append((statement, buffer.read()))
+
+
+class FakeConnection:
+    def __init__(self):
+        self.cursor_obj = FakeCursor()
+
+    def cursor(self):
+        return self.cursor_obj
+
+
+class TestBulkLoader(unittest.TestCase):
+    def _loader(self, chunk_size=2):
+        loader = BulkLoader(FakeConnection(), chunk_size=chunk_size)
+        # Rendering the COPY statement needs a live connection; stub it out
+        statement = mock.Mock()
+        statement.as_string.return_value = "COPY t FROM STDIN"
+        loader._copy_statement = mock.Mock(return_value=statement)
+        return loader
+
+    def test_copy_streams_in_chunks(self):
+        df = pd.DataFrame({"a": [1, 2, 3, 4, 5], "b": ["x", "y", "z", "w", "v"]})
+        loader = self._loader(chunk_size=2)
+        stats = loader.load("t", df)
+        copies = loader.connection.cursor_obj.copies
+        self.assertEqual(stats["engine"], "copy")
+        self.assertEqual(stats["rows"], 5)
+        self.assertEqual(len(copies), 3)
+        self.assertEqual(copies[0][1], "1,x\n2,y\n")
+
+    def test_nan_written_as_empty_field(self):
+        df = pd.DataFrame({"a": [1.5, np.nan], "b": ["x", None], "c": pd.to_datetime(["2024-01-01", None])})
+        loader = self._loader(chunk_size=10)
+        loader.load("t", df)
+        payload = loader.connection.cursor_obj.copies[0][1]
+        self.assertEqual(payload.splitlines()[1], ",,")
+
+    def test_timedelta_not_copy_safe(self):
+        df = pd.DataFrame({"d": pd.to_timedelta([1, 2], unit="h")})
+        self.assertFalse(BulkLoader(FakeConnection()).supports_copy(df))
+        self.assertTrue(BulkLoader(FakeConnection()).supports_copy(pd.DataFrame({"a": [1], "b": ["x"]})))
+
+
+class TestCsvChunkReader(unittest.TestCase):
+    def test_chunks_respect_max_rows(self):
+        payload = "a,b\n" + "".join(f"{i},x{i}\n" for i in range(2500))
+        reader = CsvChunkReader(payload.encode(), memory_budget_bytes=64 * 1024 * 1024, max_chunk_rows=1000)
+        sizes = [len(chunk) for chunk in reader]
+        self.assertEqual(sizes, [1000, 1000, 500])
+
+    def test_budget_shrinks_chunks(self):
+        payload = "a,b\n" + "".join(f"{i},{'x' * 200}\n" for i in range(5000))
+        reader = CsvChunkReader(payload.encode(), memory_budget_bytes=1024 * 1024)
+        self.assertLess(reader.estimate_chunk_rows(), 5000)
+
+
+if __name__ == "__main__":
+    unittest.main()
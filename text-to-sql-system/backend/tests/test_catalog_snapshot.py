@@ -0,0 +1,45 @@
+import unittest
+
+from catalog_snapshot import CatalogSnapshot
+
+
+def _column(table, name, data_type):
+    return {"table_name": table, "column_name": name, "data_type": data_type, "is_nullable": "YES",
+            "character_maximum_length": None, "numeric_precision": None, "numeric_scale": None,
+            "description": None}
+
+
+class TestCatalogSnapshot(unittest.TestCase):
+    def setUp(self):
+        columns = [
+            _column("orders", "id", "integer"),
+            _column("orders", "customer_id", "integer"),
+            _column("orders", "placed_at", "timestamp without time zone"),
+            _column("customers", "id", "integer"),
+            _column("customers", "name", "text"),
+        ]
+        keys = [
+            {"contype": "p", "table_name": "orders", "column_name": "id",
+             "foreign_table_name": None, "foreign_column_name": None},
+            {"contype": "f", "table_name": "orders", "column_name": "customer_id",
+             "foreign_table_name": "customers", "foreign_column_name": "id"},
+        ]
+        self.catalog = CatalogSnapshot(columns, keys)
+
+    def test_tables_and_columns(self):
+        self.assertEqual(self.catalog.table_names(), ["orders", "customers"])
+        self.assertEqual(self.catalog.column_names("orders"), ["id", "customer_id", "placed_at"])
+        self.assertEqual(self.catalog.columns_of_type("orders", ["timestamp without time zone"]), ["placed_at"])
+        self.assertEqual(self.catalog.columns("missing"), [])
+
+    def test_keys(self):
+        self.assertEqual(self.catalog.primary_keys("orders"), ["id"])
+        self.assertEqual(self.catalog.primary_keys("customers"), [])
+        self.assertEqual(self.catalog.first_foreign_key("orders"), {
+            "column_name": "customer_id", "foreign_table_name": "customers", "foreign_column_name": "id",
+        })
+        self.assertIsNone(self.catalog.first_foreign_key("customers"))
+
+
+if __name__ == "__main__":
+    unittest.main()
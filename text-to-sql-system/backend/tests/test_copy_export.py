@@ -0,0 +1,67 @@
+import gzip
+import threading
+import unittest
+
+from copy_export import CopyExport, ExportBudgetExceeded
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def copy_expert(self, sql, file):
+        self.conn.sql = sql
+        for i in range(self.conn.rows):
+            if self.conn.cancelled.is_set():
+                raise RuntimeError("canceling statement due to user request")
+            file.write(f"{i},row {i}\n")
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.sql = None
+        self.cancelled = threading.Event()
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def cancel(self):
+        self.cancelled.set()
+
+
+class TestCopyExport(unittest.TestCase):
+    def expected(self, rows):
+        return "".join(f"{i},row {i}\n" for i in range(rows)).encode()
+
+    def test_output_is_gzipped_in_chunks(self):
+        conn = FakeConnection(rows=5000)
+        export = CopyExport(conn, "COPY (SELECT 1) TO STDOUT", max_bytes=10 ** 6, chunk_bytes=1024).start()
+        chunks = list(export.chunks())
+        export.join()
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(gzip.decompress(b"".join(chunks)), self.expected(5000))
+        self.assertEqual(export.bytes_copied, len(self.expected(5000)))
+        self.assertEqual(conn.sql, "COPY (SELECT 1) TO STDOUT")
+
+    def test_uncompressed_output(self):
+        export = CopyExport(FakeConnection(rows=10), "COPY", max_bytes=10 ** 6, compress=False).start()
+        self.assertEqual(b"".join(export.chunks()), self.expected(10))
+
+    def test_byte_budget_aborts_the_export(self):
+        export = CopyExport(FakeConnection(rows=5000), "COPY", max_bytes=1000, chunk_bytes=100).start()
+        with self.assertRaises(ExportBudgetExceeded):
+            list(export.chunks())
+
+    def test_cancel_stops_a_blocked_export(self):
+        conn = FakeConnection(rows=10 ** 6)
+        export = CopyExport(conn, "COPY", max_bytes=10 ** 9, compress=False, chunk_bytes=64, queue_chunks=1).start()
+        self.assertIsNotNone(export.next_chunk())
+        export.cancel()
+        export.join(timeout=5)
+        self.assertFalse(export._thread.is_alive())
+        self.assertTrue(conn.cancelled.is_set())
+
+
+if __name__ == "__main__":
+    unittest.main()
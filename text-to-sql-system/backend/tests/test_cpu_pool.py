@@ -0,0 +1,84 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from cpu_pool import CpuPoolBusy, CpuTaskCancelled, CpuWorkerPool, MemoryAdmission
+
+
+def _square(value, channel):
+    channel.report(stage="squaring")
+    return value * value
+
+
+def _spin(channel):
+    while True:
+        channel.report(stage="spinning", rows_loaded=1)
+        time.sleep(0.01)
+
+
+class TestMemoryAdmission(unittest.TestCase):
+    def test_tasks_wait_for_budget(self):
+        admission = MemoryAdmission(100, memory_probe=lambda: None)
+        admission.acquire(80, timeout=1.0)
+        with self.assertRaises(CpuPoolBusy):
+            admission.acquire(30, timeout=0.05)
+        admission.acquire(20, timeout=0.05)
+        admission.release(80)
+        admission.release(20)
+        self.assertEqual((admission.reserved_bytes, admission.running), (0, 0))
+
+    def test_oversized_task_runs_alone(self):
+        admission = MemoryAdmission(100, memory_probe=lambda: 10)
+        admission.acquire(500, timeout=0.05)
+        with self.assertRaises(CpuPoolBusy):
+            admission.acquire(1, timeout=0.05)
+        admission.release(500)
+
+    def test_release_wakes_waiting_task(self):
+        admission = MemoryAdmission(100, memory_probe=lambda: None)
+        admission.acquire(100, timeout=1.0)
+        threading.Timer(0.05, admission.release, args=(100,)).start()
+        admission.acquire(100, timeout=2.0)
+        self.assertEqual(admission.running, 1)
+
+
+class TestCpuWorkerPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = CpuWorkerPool(max_workers=0, memory_budget_bytes=1000, poll_interval_s=0.01)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test_run_blocking_forwards_progress(self):
+        updates = []
+        result = self.pool.run_blocking(_square, 7, memory_bytes=10, progress=lambda **kw: updates.append(kw))
+        self.assertEqual(result, 49)
+        self.assertEqual(updates, [{"stage": "squaring"}])
+        self.assertEqual(self.pool.admission.reserved_bytes, 0)
+
+    def test_run_blocking_cancels_task(self):
+        deadline = time.monotonic() + 0.1
+        with self.assertRaises(CpuTaskCancelled):
+            self.pool.run_blocking(_spin, memory_bytes=10, is_cancelled=lambda: time.monotonic() > deadline)
+
+    def test_run_cancels_task_when_client_disconnects(self):
+        async def disconnected():
+            return True
+
+        async def main():
+            return await self.pool.run(_spin, memory_bytes=10, is_cancelled=disconnected)
+
+        with self.assertRaises(CpuTaskCancelled):
+            asyncio.run(main())
+
+    def test_process_worker_runs_task(self):
+        pool = CpuWorkerPool(max_workers=1, memory_budget_bytes=1000)
+        try:
+            self.assertEqual(asyncio.run(pool.run(_square, 12, memory_bytes=10)), 144)
+        finally:
+            pool.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
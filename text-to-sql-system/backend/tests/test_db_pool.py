@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import psycopg2.extensions
+
+from db_pool import DatabasePool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self, healthy=True):
+        self.closed = 0
+        self.autocommit = False
+        self.info = SimpleNamespace(transaction_status=psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+        self.rollbacks = 0
+        self.healthy = healthy
+        self._checked_out = False
+
+    def cursor(self):
+        cursor = mock.Mock()
+        if not self.healthy:
+            cursor.execute.side_effect = psycopg2.OperationalError("server closed the connection")
+        return cursor
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+
+class TestDatabasePool(unittest.TestCase):
+    def make_pool(self, **kwargs):
+        pool = DatabasePool(**kwargs)
+        self.created = []
+
+        def connect():
+            conn = FakeConnection()
+            self.created.append(conn)
+            return conn
+
+        patcher = mock.patch.object(pool, "_connect", side_effect=connect)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return pool
+
+    def test_connections_are_reused(self):
+        pool = self.make_pool(max_size=2)
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            self.assertIs(second, first)
+        metrics = pool.metrics()
+        self.assertEqual((metrics["created"], metrics["acquired"], metrics["idle"], metrics["in_use"]), (1, 2, 1, 0))
+
+    def test_returned_transaction_is_rolled_back(self):
+        pool = self.make_pool()
+        with pool.connection() as conn:
+            conn.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+        self.assertEqual(conn.rollbacks, 1)
+        pool.putconn(conn)  # a second return is ignored
+        self.assertEqual(pool.metrics()["idle"], 1)
+
+    def test_acquisition_times_out_when_exhausted(self):
+        pool = self.make_pool(max_size=1)
+        held = pool.getconn()
+        with self.assertRaises(PoolTimeout):
+            pool.getconn(timeout=0.05)
+        self.assertEqual(pool.metrics()["timeouts"], 1)
+        threading.Timer(0.05, pool.putconn, args=(held,)).start()
+        self.assertIs(pool.getconn(timeout=2.0), held)
+
+    def test_broken_connections_are_replaced(self):
+        pool = self.make_pool(max_size=1, health_check_after_s=0)
+        conn = pool.getconn()
+        conn.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN
+        pool.putconn(conn)
+        self.assertEqual(pool.metrics()["size"], 0)
+
+        conn = pool.getconn()
+        pool.putconn(conn)
+        conn.healthy = False
+        replacement = pool.getconn()
+        self.assertIsNot(replacement, conn)
+        metrics = pool.metrics()
+        self.assertEqual((metrics["created"], metrics["discarded"], metrics["health_check_failures"]), (3, 2, 1))
+
+    def test_run_uses_a_pooled_connection_off_the_event_loop(self):
+        pool = self.make_pool()
+        loop_thread = threading.get_ident()
+        result = asyncio.run(pool.run(lambda conn, value: (conn, value, threading.get_ident()), 7))
+        self.assertIs(result[0], self.created[0])
+        self.assertEqual(result[1], 7)
+        self.assertNotEqual(result[2], loop_thread)
+        self.assertEqual(pool.metrics()["in_use"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+from index_planner import IndexPlanner
+
+
+def _schema(row_count, columns):
+    return {"row_count": row_count, "columns": columns}
+
+
+class TestIndexPlanner(unittest.TestCase):
+    def setUp(self):
+        self.planner = IndexPlanner(None, max_indexes=6)
+
+    def test_chooses_id_time_and_filter_columns(self):
+        schema = _schema(500000, [
+            {"name": "id", "type": "integer", "is_primary_key": True, "stats": {}},
+            {"name": "customer_id", "type": "integer", "stats": {"data_type": "numeric"}},
+            {"name": "created_at", "type": "timestamp without time zone", "stats": {"data_type": "datetime"}},
+            {"name": "ship_date", "type": "date", "stats": {"data_type": "datetime", "appears_to_be_time_series": True}},
+            {"name": "region", "type": "text", "stats": {"data_type": "text", "appears_to_be_categorical": True}},
+            {"name": "status", "type": "text", "stats": {"data_type": "text", "appears_to_be_categorical": True}},
+            {"name": "note", "type": "text", "stats": {"data_type": "text"}},
+        ])
+        pg_stats = {
+            "created_at": {"correlation": 0.99},
+            "ship_date": {"correlation": 0.1},
+            "region": {"most_common_freqs": [0.3, 0.3, 0.2, 0.05]},
+            "status": {"most_common_freqs": [0.5, 0.5]},
+        }
+        plan = self.planner.choose_indexes(schema, pg_stats, indexed_columns=[])
+        self.assertEqual(
+            [(index["column"], index["method"]) for index in plan],
+            [("customer_id", "btree"), ("created_at", "brin"), ("ship_date", "btree"), ("region", "btree")],
+        )
+
+    def test_small_tables_use_btree_and_skip_indexed_columns(self):
+        schema = _schema(20000, [
+            {"name": "order_id", "type": "integer", "stats": {}},
+            {"name": "created_at", "type": "timestamp without time zone",
+             "stats": {"data_type": "datetime", "appears_to_be_time_series": True}},
+        ])
+        plan = self.planner.choose_indexes(schema, {"created_at": {"correlation": 1.0}}, indexed_columns=["order_id"])
+        self.assertEqual([(index["column"], index["method"]) for index in plan], [("created_at", "btree")])
+
+    def test_max_indexes(self):
+        columns = [{"name": f"c{i}_id", "type": "integer", "stats": {}} for i in range(10)]
+        planner = IndexPlanner(None, max_indexes=3)
+        self.assertEqual(len(planner.choose_indexes(_schema(50000, columns), {}, [])), 3)
+
+    def test_index_names_are_distinct_for_shared_prefixes(self):
+        first = IndexPlanner.index_name("orders", "shipping_date", "btree")
+        second = IndexPlanner.index_name("orders", "shipping_datetime", "btree")
+        self.assertNotEqual(first, second)
+        long_name = IndexPlanner.index_name("t" * 63, "c" * 63, "btree")
+        self.assertLessEqual(len(long_name), 63)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import threading
+import time
+import unittest
+
+from ingestion_jobs import IngestionJobManager
+
+
+def _wait(job, timeout=5.0):
+    deadline = time.time() + timeout
+    while job.status not in ("succeeded", "failed", "cancelled") and time.time() < deadline:
+        time.sleep(0.01)
+
+
+class TestIngestionJobs(unittest.TestCase):
+    def setUp(self):
+        self.manager = IngestionJobManager(max_workers=2)
+
+    def tearDown(self):
+        self.manager.shutdown()
+
+    def test_job_reports_progress_and_result(self):
+        cleaned = []
+        running = []
+
+        def run(job):
+            running.append(job)
+            job.update(stage="loading", rows_loaded=0, rows_total_estimate=100)
+            job.update(rows_loaded=100)
+            return {"rows": 100}
+
+        # The job is still running while it cleans up; a finished status means cleanup is done
+        job = self.manager.submit("sales", "sales.csv", run, on_finish=lambda: cleaned.append(running[0].status))
+        _wait(job)
+        status = job.to_dict()
+        self.assertEqual(status["status"], "succeeded")
+        self.assertEqual(status["stage"], "done")
+        self.assertEqual(status["rows_loaded"], 100)
+        self.assertEqual(status["result"], {"rows": 100})
+        self.assertEqual(cleaned, ["running"])
+        self.assertIs(self.manager.get(job.id), job)
+
+    def test_failed_job_keeps_error(self):
+        def run(job):
+            raise ValueError("bad csv")
+
+        job = self.manager.submit("sales", "sales.csv", run)
+        _wait(job)
+        self.assertEqual(job.to_dict()["status"], "failed")
+        self.assertEqual(job.to_dict()["error"], "bad csv")
+
+    def test_cancelled_job_stops_at_next_progress_report(self):
+        started = threading.Event()
+
+        def run(job):
+            started.set()
+            while True:
+                if job.cancel_requested:
+                    raise RuntimeError("Task cancelled")
+                job.update(stage="loading")
+                time.sleep(0.01)
+
+        job = self.manager.submit("sales", "sales.csv", run)
+        started.wait(5.0)
+        self.assertIs(self.manager.cancel(job.id), job)
+        _wait(job)
+        status = job.to_dict()
+        self.assertEqual(status["status"], "cancelled")
+        self.assertIsNone(status["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
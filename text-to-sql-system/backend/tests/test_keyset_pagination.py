@@ -0,0 +1,112 @@
+import unittest
+from collections import namedtuple
+
+from keyset_pagination import PageCursorError, PagePlan, projects_table_rows, split_order_by
+
+Column = namedtuple("Column", ["name", "type_code"])
+
+DESCRIPTION = [
+    Column("region", 25),        # text
+    Column("total", 1700),       # numeric
+    Column("tags", 1009),        # text[], not usable as a key
+    Column("id", 23),            # int4
+]
+SQL = 'SELECT "region", "total", "tags", "id" FROM "sales" ORDER BY "total" DESC, 1'
+
+
+
+def _page_through(sql, description, rows, unique_indexes, page_size=2):
+    """
+    Every row returned when `rows` (the query's result) is paged the way page_query's
+    SQL does it: seek past the last key, or back into its tie group skipping `skip` rows
+    """
+    plan = PagePlan.for_result(sql, description, unique_indexes, "sales")
+    last, skip, returned = None, 0, []
+    while True:
+        key = lambda row: plan.key_values(description, row)
+        ordered = sorted(rows, key=key)
+        if last is not None:
+            ordered = [row for row in ordered if key(row) > last or (not plan.unique and key(row) == last)][skip:]
+        page = ordered[:page_size + 1]
+        returned.extend(page[:page_size])
+        if len(page) <= page_size:
+            return returned
+        token = plan.next_cursor(sql, description, page[:page_size], last, skip)
+        plan, last, skip = PagePlan.from_cursor(sql, token)
+
+
+class TestPagePlan(unittest.TestCase):
+    def test_split_order_by(self):
+        self.assertEqual(split_order_by(SQL), (
+            'SELECT "region", "total", "tags", "id" FROM "sales"',
+            [('"total"', True, True), ("1", False, False)],
+        ))
+        # An ORDER BY that picks the rows (with LIMIT) or sits in a subquery stays put
+        top = 'SELECT * FROM "sales" ORDER BY "total" LIMIT 5'
+        self.assertEqual(split_order_by(top), (top, []))
+        nested = 'SELECT * FROM (SELECT * FROM "sales" ORDER BY "total") AS s'
+        self.assertEqual(split_order_by(nested), (nested, []))
+
+    def test_sort_key_follows_order_by_then_all_columns(self):
+        plan = PagePlan.for_result(SQL, DESCRIPTION)
+        self.assertEqual([(k.column, k.descending) for k in plan.keys],
+                         [("total", True), ("region", False), ("id", False)])
+        self.assertTrue(plan.order_folded)
+        self.assertFalse(plan.unique)
+
+    def test_not_null_unique_index_ends_the_key(self):
+        plan = PagePlan.for_result('SELECT * FROM "sales"', DESCRIPTION, [[("id", True)]], "sales")
+        self.assertEqual([k.column for k in plan.keys], ["id"])
+        self.assertTrue(plan.unique)
+        # An ORDER BY on an expression cannot be followed by the seek
+        plan = PagePlan.for_result('SELECT * FROM "sales" ORDER BY lower("region")', DESCRIPTION,
+                                   [[("id", True)]], "sales")
+        self.assertFalse(plan.order_folded)
+        self.assertEqual(plan.source_sql('SELECT 1 ORDER BY 1'), 'SELECT 1 ORDER BY 1')
+
+    def test_unique_index_needs_a_plain_projection_of_the_table(self):
+        self.assertTrue(projects_table_rows('SELECT "id", s."total" FROM "sales" s WHERE "total" > 1', "sales"))
+        self.assertTrue(projects_table_rows('select distinct * from sales order by 1', "sales"))
+        for sql in (
+            'SELECT "region" AS "id" FROM "sales"',
+            'SELECT "region" "id" FROM "sales"',
+            'SELECT a."id" FROM "sales" a JOIN "sales" b ON a."region" = b."region"',
+            'SELECT "id" FROM "sales", "sales" b',
+            'SELECT "id" FROM "sales" UNION ALL SELECT "id" FROM "sales"',
+            'SELECT unnest(ARRAY[1, 1]) AS "id" FROM "sales"',
+            'SELECT "id" FROM "returns"',
+        ):
+            self.assertFalse(projects_table_rows(sql, "sales"), sql)
+
+    def test_aliased_and_joined_results_return_every_row(self):
+        description = [Column("id", 25), Column("total", 1700)]
+        rows = [("west", 1), ("west", 2), ("east", 3), ("west", 1), ("east", 3), ("west", 4), ("east", 5)]
+        for sql in (
+            'SELECT "region" AS "id", "total" FROM "sales"',
+            'SELECT a."id", b."total" FROM "sales" a JOIN "sales" b ON a."region" = b."region"',
+        ):
+            self.assertEqual(sorted(_page_through(sql, description, rows, [[("id", True)]])), sorted(rows), sql)
+
+    def test_cursor_round_trip(self):
+        plan = PagePlan.for_result(SQL, DESCRIPTION)
+        rows = [("west", 5, ["a"], 1), ("east", 3, None, 2), ("east", 3, ["b"], 2)]
+        token = plan.next_cursor(SQL, DESCRIPTION, rows)
+        restored, last, skip = PagePlan.from_cursor(SQL, token)
+        self.assertEqual([k.column for k in restored.keys], ["total", "region", "id"])
+        self.assertEqual((last, skip), (["3", "east", "2"], 2))
+
+        # A page made only of the same tie group adds to the earlier count
+        token = restored.next_cursor(SQL, DESCRIPTION, rows[1:], last, skip)
+        self.assertEqual(PagePlan.from_cursor(SQL, token)[2], 4)
+
+    def test_cursor_is_bound_to_its_query(self):
+        plan = PagePlan.for_result(SQL, DESCRIPTION)
+        token = plan.next_cursor(SQL, DESCRIPTION, [("west", 5, None, 1)])
+        with self.assertRaises(PageCursorError):
+            PagePlan.from_cursor(SQL + " ", token)
+        with self.assertRaises(PageCursorError):
+            PagePlan.from_cursor(SQL, "not-a-token")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+
+from prompting_service import PromptingService
+from schema_cache import freeze
+
+
+def make_schema(version, annotations_version=None, column="region"):
+    return freeze({
+        "table_name": "sales",
+        "row_count": 10,
+        "data_version": version,
+        "annotations_version": annotations_version,
+        "columns": [{"name": column, "type": "text", "stats": {"sample_values": ["west"]}}],
+        "annotations": {"aliases": [{"alias": "area", "column": column}], "metrics": []},
+    })
+
+
+class TestCompiledPromptContext(unittest.TestCase):
+    def test_context_is_compiled_once_per_version(self):
+        schema = make_schema(101)
+        context = PromptingService.compile(schema)
+        self.assertIs(PromptingService.compile(make_schema(101)), context)
+        self.assertIsNot(PromptingService.compile(make_schema(101, "2024-01-02")), context)
+        self.assertIsNot(PromptingService.compile(make_schema(102)), context)
+
+    def test_question_is_spliced_into_the_compiled_sections(self):
+        prompt = PromptingService.create_text_to_sql_prompt("Sales by {area}?", make_schema(103))
+        self.assertIn('"Sales by {area}?"', prompt)
+        self.assertIn("- region (text): Example values: \"west\"", prompt)
+        self.assertIn('- "area" → region', prompt)
+        self.assertLess(prompt.index("## Columns:"), prompt.index("Sales by"))
+
+    def test_prompts_share_the_prefix_up_to_the_question(self):
+        schema = make_schema(104)
+        prefix = PromptingService.text_to_sql_prefix(schema)
+        first = PromptingService.create_text_to_sql_prompt("Total sales?", schema)
+        second = PromptingService.create_text_to_sql_prompt("Sales by region?", schema)
+        self.assertTrue(first.startswith(prefix))
+        self.assertTrue(second.startswith(prefix))
+        self.assertIn("## Requirements:", prefix)
+        self.assertIn("- region (text)", prefix)
+        self.assertNotIn("Total sales", prefix)
+        self.assertTrue(prefix.endswith("\n"))
+
+    def test_unversioned_schema_is_not_cached(self):
+        first = PromptingService.create_error_analysis_prompt("error", "SELECT 1", make_schema(None))
+        second = PromptingService.create_error_analysis_prompt("error", "SELECT 1", make_schema(None, column="city"))
+        self.assertIn("- region: text", first)
+        self.assertIn("- city: text", second)
+
+
+if __name__ == "__main__":
+    unittest.main()
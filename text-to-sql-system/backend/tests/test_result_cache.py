@@ -0,0 +1,73 @@
+import unittest
+from unittest import mock
+
+from result_cache import ResultCache, normalize_sql, referenced_tables
+
+
+class TestResultCache(unittest.TestCase):
+    def test_normalized_sql_shares_an_entry(self):
+        cache = ResultCache()
+        cache.put(ResultCache.key("sales", 3, 'SELECT  "Region"\n FROM sales;'), ["rows"], 10)
+        self.assertEqual(cache.get(ResultCache.key("sales", 3, 'select "Region" from SALES')), ["rows"])
+        # Quoted text keeps its case and spacing; another data version is another entry
+        self.assertEqual(normalize_sql("SELECT 'A  b' FROM t"), "select 'A  b' from t")
+        self.assertIsNone(cache.get(ResultCache.key("sales", 4, 'SELECT "Region" FROM sales')))
+        self.assertEqual((cache.metrics()["hits"], cache.metrics()["misses"]), (1, 1))
+
+    def test_dollar_quoted_literals_keep_their_case(self):
+        upper = ResultCache.key("t", 1, 'SELECT * FROM "t" WHERE "name" = $$Abc$$')
+        lower = ResultCache.key("t", 1, 'SELECT * FROM "t" WHERE "name" = $$abc$$')
+        self.assertNotEqual(upper, lower)
+        self.assertNotEqual(normalize_sql("SELECT $q$A  B$q$"), normalize_sql("SELECT $q$a b$q$"))
+
+    def test_referenced_tables_include_unquoted_and_nested_references(self):
+        self.assertEqual(referenced_tables('SELECT * FROM "sales" s WHERE "x" = \'from b\''), {"sales"})
+        self.assertEqual(
+            referenced_tables('SELECT * FROM "sales" WHERE id IN (SELECT id FROM Returns r, other.t JOIN "X" ON 1 = 1)'),
+            {"sales", "returns", "other.t", "X"},
+        )
+        self.assertIsNone(referenced_tables('SELECT * FROM "sales" -- FROM other'))
+
+    def test_lru_eviction_by_count_and_bytes(self):
+        cache = ResultCache(max_entries=2, max_bytes=100)
+        cache.put(("t", 1, "a", None), "a", 10)
+        cache.put(("t", 1, "b", None), "b", 10)
+        cache.get(("t", 1, "a", None))
+        cache.put(("t", 1, "c", None), "c", 10)
+        self.assertIsNone(cache.get(("t", 1, "b", None)))
+        cache.put(("t", 1, "d", None), "d", 20)
+        cache.put(("t", 1, "e", None), "e", 20)
+        self.assertEqual(cache.metrics()["bytes"], 40)
+        # Too large for the budget: not cached
+        self.assertFalse(cache.put(("t", 1, "f", None), "f", 26))
+
+        cache = ResultCache(max_entries=10, max_bytes=100)
+        for name in "abcd":
+            cache.put(("t", 1, name, None), name, 25)
+        cache.put(("t", 1, "e", None), "e", 25)
+        self.assertIsNone(cache.get(("t", 1, "a", None)))
+        self.assertEqual(cache.metrics()["evictions"], 1)
+
+    def test_entries_expire(self):
+        cache = ResultCache(ttl_s=10)
+        with mock.patch("result_cache.time.monotonic", return_value=100.0):
+            cache.put(("t", 1, "a", None), "a", 1)
+        with mock.patch("result_cache.time.monotonic", return_value=111.0):
+            self.assertIsNone(cache.get(("t", 1, "a", None)))
+        self.assertEqual(cache.metrics()["entries"], 0)
+
+    def test_invalidation_drops_table_and_in_flight_results(self):
+        cache = ResultCache()
+        cache.put(("sales", 1, "a", None), "a", 1)
+        cache.put(("other", 1, "a", None), "a", 1)
+        generation = cache.generation("sales")
+        self.assertEqual(cache.invalidate_table("sales"), 1)
+        self.assertIsNone(cache.get(("sales", 1, "a", None)))
+        self.assertEqual(cache.get(("other", 1, "a", None)), "a")
+        # Computed before the invalidation
+        self.assertFalse(cache.put(("sales", 1, "a", None), "a", 1, generation))
+        self.assertTrue(cache.put(("sales", 1, "a", None), "a", 1, cache.generation("sales")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import datetime
+import json
+import unittest
+import uuid
+from collections import namedtuple
+from decimal import Decimal
+
+from result_encoding import ResultSet, arrow_ipc_bytes, arrow_table, parquet_bytes
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+Column = namedtuple("Column", ["name", "type_code", "precision", "scale"], defaults=[None, None])
+
+DESCRIPTION = [
+    Column("region", 25),          # text
+    Column("total", 1700),         # numeric
+    Column("day", 1082),           # date
+    Column("id", 2950),            # uuid
+    Column("tags", 1009),          # text[]
+    Column("ratio", 701),          # float8
+]
+ROW_ID = uuid.UUID("12345678-1234-5678-1234-567812345678")
+ROWS = [
+    ("west", Decimal("10.50"), datetime.date(2024, 1, 2), ROW_ID, ["a", "b"], 0.5),
+    ("east", None, None, None, None, None),
+]
+
+
+class TestResultSet(unittest.TestCase):
+    def test_values_are_converted_by_column_type(self):
+        result = ResultSet.from_rows(DESCRIPTION, ROWS)
+        self.assertEqual(len(result), 2)
+        self.assertEqual(result.records()[0], {
+            "region": "west", "total": 10.5, "day": "2024-01-02", "id": str(ROW_ID), "tags": ["a", "b"], "ratio": 0.5,
+        })
+        self.assertEqual(result.records()[1]["total"], None)
+        # Encodable without a custom encoder
+        json.dumps(result.payload())
+
+    def test_columns_shape_drops_repeated_keys(self):
+        result = ResultSet.from_rows(DESCRIPTION[:2], [row[:2] for row in ROWS])
+        self.assertEqual(result.payload("columns"), {
+            "columns": ["region", "total"],
+            "rows": [["west", 10.5], ["east", None]],
+        })
+
+    def test_untyped_values_fall_back_per_value(self):
+        description = [Column("mixed", 2249)]  # record
+        result = ResultSet.from_rows(description, [((1, Decimal("2")),), ("x",)])
+        self.assertEqual(result.data, [[[1, 2.0], "x"]])
+
+    def test_sample_and_empty_results(self):
+        result = ResultSet.from_rows(DESCRIPTION[:1], [("a",), ("b",), ("c",)])
+        self.assertEqual(result.records(2), [{"region": "a"}, {"region": "b"}])
+        self.assertEqual(result.ndjson(), b'{"region": "a"}\n{"region": "b"}\n{"region": "c"}\n')
+
+        empty = ResultSet.from_rows(DESCRIPTION[:2], [])
+        self.assertEqual(len(empty), 0)
+        self.assertEqual(empty.payload(), [])
+        self.assertEqual(empty.payload("columns"), {"columns": ["region", "total"], "rows": []})
+
+
+@unittest.skipUnless(pyarrow, "pyarrow not installed")
+class TestArrowResults(unittest.TestCase):
+    def test_columns_are_typed_from_postgres_types(self):
+        description = [
+            Column("region", 25),
+            Column("price", 1700, 10, 2),
+            Column("total", 1700, 65535, 65535),  # unconstrained numeric
+            Column("at", 1184),
+            Column("id", 2950),
+        ]
+        at = datetime.datetime(2024, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc)
+        rows = [("west", Decimal("1.50"), Decimal("10.125"), at, ROW_ID), ("east", None, None, None, None)]
+        table = arrow_table(description, rows)
+        self.assertEqual([str(field.type) for field in table.schema], [
+            "string", "decimal128(10, 2)", "decimal128(5, 3)", "timestamp[us, tz=UTC]", "string",
+        ])
+        self.assertEqual(table.column("price").to_pylist(), [Decimal("1.50"), None])
+        self.assertEqual(table.column("id").to_pylist(), [str(ROW_ID), None])
+
+    def test_ipc_and_parquet_round_trip(self):
+        table = arrow_table([Column("n", 23), Column("ratio", 701)], [(1, 0.5), (2, None)])
+        from_ipc = pyarrow.ipc.open_stream(arrow_ipc_bytes(table)).read_all()
+        self.assertTrue(from_ipc.equals(table))
+        from_parquet = pyarrow.parquet.read_table(pyarrow.BufferReader(parquet_bytes(table)))
+        self.assertTrue(from_parquet.equals(table))
+
+    def test_empty_result_keeps_schema(self):
+        table = arrow_table([Column("n", 20)], [])
+        self.assertEqual((table.num_rows, str(table.schema.field("n").type)), (0, "int64"))
+
+
+if __name__ == "__main__":
+    unittest.main()
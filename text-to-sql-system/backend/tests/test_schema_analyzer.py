@@ -0,0 +1,108 @@
+import unittest
+from decimal import Decimal
+from unittest import mock
+
+import pandas as pd
+
+from catalog_snapshot import CatalogSnapshot
+from schema_analyzer import SchemaAnalyzer
+
+
+def _catalog(orders_inserts=10):
+    columns = [
+        {"table_name": table, "column_name": name, "data_type": "integer", "is_nullable": "YES"}
+        for table, name in [("orders", "id"), ("orders", "customers_id"), ("customers", "id")]
+    ]
+    signatures = [
+        {"table_name": "orders", "relkind": "r", "relfilenode": 1, "n_tup_ins": orders_inserts, "n_tup_upd": 0, "n_tup_del": 0},
+        {"table_name": "customers", "relkind": "r", "relfilenode": 2, "n_tup_ins": 5, "n_tup_upd": 0, "n_tup_del": 0},
+    ]
+    return CatalogSnapshot(columns, [], signatures)
+
+
+class TestSchemaMetadata(unittest.TestCase):
+    def _analyzer(self, catalog):
+        analyzer = SchemaAnalyzer(mock.Mock())
+        analyzer._sample_stats = mock.Mock()
+
+        def analyze_table(table_name, columns=None, catalog=None):
+            return analyzer._compile_analysis(table_name, catalog, 7, {"id": {"unique_values": 7}})
+
+        analyzer.analyze_table = mock.Mock(side_effect=analyze_table)
+        patcher = mock.patch("schema_analyzer.CatalogSnapshot.load", return_value=catalog)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return analyzer
+
+    def test_relationships_deduplicated(self):
+        analyzer = self._analyzer(_catalog())
+        metadata = analyzer.get_schema_metadata()
+        self.assertEqual([t["table_name"] for t in metadata["tables"]], ["orders", "customers"])
+        self.assertEqual(len(metadata["relationships"]), 1)
+        self.assertEqual(metadata["relationships"][0]["from_column"], "customers_id")
+
+    def test_unchanged_tables_are_reused(self):
+        analyzer = self._analyzer(_catalog())
+        first = analyzer.get_schema_metadata()
+        self.assertEqual(analyzer.analyze_table.call_count, 2)
+
+        patcher = mock.patch("schema_analyzer.CatalogSnapshot.load", return_value=_catalog(orders_inserts=11))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        second = analyzer.get_schema_metadata(previous=first)
+        self.assertEqual([call.args[0] for call in analyzer.analyze_table.call_args_list[2:]], ["orders"])
+        self.assertEqual(second["tables"][1]["columns"][0]["stats"], {"unique_values": 7})
+
+    def test_parallel_mode_uses_worker_connections(self):
+        catalog = _catalog()
+        connections = []
+        factory = mock.Mock(side_effect=lambda: connections.append(mock.Mock()) or connections[-1])
+        analyzer = SchemaAnalyzer(mock.Mock())
+        with mock.patch("schema_analyzer.CatalogSnapshot.load", return_value=catalog), \
+                mock.patch.object(SchemaAnalyzer, "analyze_table",
+                                  lambda self, table, columns=None, catalog=None: {"table_name": table, "relationships": []}):
+            metadata = analyzer.get_schema_metadata(connection_factory=factory, max_workers=2)
+        self.assertEqual(sorted(t["table_name"] for t in metadata["tables"]), ["customers", "orders"])
+        self.assertTrue(connections)
+        for conn in connections:
+            conn.close.assert_called_once()
+
+
+class TestColumnAnalyzers(unittest.TestCase):
+    def setUp(self):
+        self.analyzer = SchemaAnalyzer(None, stats_engine="pandas")
+
+    def test_text_patterns_counted_in_one_scan(self):
+        values = pd.Series(["a@example.com", "https://example.com/x", "plain", "b@example.org"])
+        self.assertEqual(SchemaAnalyzer._count_text_patterns(values), {"email": 2, "url": 1})
+        # Values spanning lines fall back to per-value matching
+        values = pd.Series(["a@example.com", "two\nlines", "x@y.com\n"])
+        self.assertEqual(SchemaAnalyzer._count_text_patterns(values)["email"], 2)
+
+    def test_column_types(self):
+        df = pd.DataFrame({
+            "amount": [Decimal("1.50"), None, Decimal("2.00")],
+            "qty": [1.0, 2.0, None],
+            "day": ["2024-01-01", "2024-01-02", None],
+            "customer_name": ["Ann", "Bob", "Ann"],
+        })
+        stats = self.analyzer._analyze_columns(df, list(df.columns))
+        self.assertEqual(stats["amount"]["data_type"], "numeric")
+        self.assertFalse(stats["amount"]["is_integer"])
+        self.assertTrue(stats["qty"]["is_integer"])
+        self.assertEqual(stats["qty"]["null_count"], 1)
+        self.assertEqual(stats["day"]["data_type"], "datetime")
+        self.assertEqual(stats["day"]["time_span_days"], 1)
+        self.assertEqual((stats["customer_name"]["min_length"], stats["customer_name"]["max_length"]), (3, 3))
+        self.assertEqual(stats["customer_name"]["unique_values"], 2)
+        self.assertTrue(stats["customer_name"]["might_be_name"])
+
+    def test_time_series_detection(self):
+        series = pd.Series(pd.date_range("2024-01-01", periods=30, freq="h"), name="ts")
+        stats = self.analyzer._analyze_datetime_column(series)
+        self.assertTrue(stats["appears_to_be_time_series"])
+        self.assertEqual(stats["approximate_frequency"], "0 days 01:00:00")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import json
+import pickle
+import unittest
+from unittest import mock
+
+from schema_cache import FrozenDict, SchemaCache, freeze
+
+SCHEMA = {"table_name": "sales", "columns": [{"name": "region", "stats": {"sample_values": ["a"]}}]}
+
+
+class TestFrozenSchemas(unittest.TestCase):
+    def test_frozen_schema_is_read_only_all_the_way_down(self):
+        frozen = freeze(SCHEMA)
+        with self.assertRaises(TypeError):
+            frozen["annotations"] = {}
+        with self.assertRaises(TypeError):
+            frozen["columns"][0].setdefault("type", "text")
+        with self.assertRaises(AttributeError):
+            frozen["columns"].append({})
+        # Still reads, encodes and copies like the plain dict
+        self.assertEqual(json.loads(json.dumps(frozen)), SCHEMA)
+        self.assertEqual(pickle.loads(pickle.dumps(frozen)), frozen)
+        self.assertIsInstance(frozen, dict)
+        self.assertNotIsInstance(frozen.copy(), FrozenDict)
+
+
+class TestSchemaCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = SchemaCache(max_entries=2)
+        cache.put("a", SCHEMA)
+        cache.put("b", SCHEMA)
+        self.assertIs(cache.get("a"), cache.get("a"))
+        cache.put("c", SCHEMA)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.metrics()["evictions"], 1)
+
+    def test_entries_expire(self):
+        cache = SchemaCache(ttl_s=10)
+        with mock.patch("schema_cache.time.monotonic", return_value=100.0):
+            cache.put("sales", SCHEMA)
+        with mock.patch("schema_cache.time.monotonic", return_value=105.0):
+            self.assertIsNotNone(cache.get("sales"))
+        with mock.patch("schema_cache.time.monotonic", return_value=111.0):
+            self.assertIsNone(cache.get("sales"))
+
+    def test_invalidation_drops_entry_and_in_flight_load(self):
+        cache = SchemaCache()
+        cache.put("sales", SCHEMA)
+        generation = cache.generation("sales")
+        cache.invalidate("sales")
+        self.assertIsNone(cache.get("sales"))
+        # Loaded before the invalidation: returned to the caller, not stored
+        self.assertEqual(cache.put("sales", SCHEMA, generation)["table_name"], "sales")
+        self.assertIsNone(cache.get("sales"))
+        cache.put("sales", SCHEMA, cache.generation("sales"))
+        self.assertIsNotNone(cache.get("sales"))
+
+
+if __name__ == "__main__":
+    unittest.main()
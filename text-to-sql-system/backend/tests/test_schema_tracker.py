@@ -0,0 +1,52 @@
+import unittest
+from unittest import mock
+
+from catalog_snapshot import CatalogSnapshot
+from schema_tracker import SchemaTracker
+
+
+def _catalog(signature_inserts):
+    columns = [{"table_name": t, "column_name": "id", "data_type": "integer", "is_nullable": "YES"}
+               for t in ("orders", "customers")]
+    signatures = [
+        {"table_name": t, "relkind": "r", "relfilenode": i, "n_tup_ins": signature_inserts[t], "n_tup_upd": 0, "n_tup_del": 0}
+        for i, t in enumerate(("orders", "customers"))
+    ]
+    return CatalogSnapshot(columns, [], signatures)
+
+
+class TestSchemaTracker(unittest.TestCase):
+    def test_changed_columns(self):
+        previous = {"a": "1", "b": "2", "c": "3"}
+        current = {"a": "1", "b": "changed", "d": "4"}
+        self.assertEqual(SchemaTracker.changed_columns(previous, current, ["a", "b", "c", "d"]), ["b", "c", "d"])
+        self.assertEqual(SchemaTracker.changed_columns(None, current, ["a"]), ["a"])
+
+    def test_refresh_all_only_touches_changed_tables(self):
+        stored_catalog = _catalog({"orders": 10, "customers": 5})
+        stored = [
+            {"table_name": "orders", "schema": {}, "data_signature": stored_catalog.table_signature("orders"),
+             "column_fingerprints": {}},
+            {"table_name": "customers", "schema": {}, "data_signature": stored_catalog.table_signature("customers"),
+             "column_fingerprints": {}},
+            {"table_name": "dropped", "schema": {}, "data_signature": "x", "column_fingerprints": {}},
+        ]
+        cursor = mock.Mock()
+        cursor.fetchall.return_value = stored
+        cursor.fetchone.return_value = {"last_value": 12, "is_called": True}
+        conn = mock.Mock()
+        conn.cursor.return_value = cursor
+        tracker = SchemaTracker(lambda: conn)
+        tracker.refresh_table = mock.Mock(return_value=["id"])
+
+        with mock.patch("schema_tracker.CatalogSnapshot.load", return_value=_catalog({"orders": 11, "customers": 5})), \
+                mock.patch("schema_tracker.SketchIndex.load"):
+            summary = tracker.refresh_all()
+
+        self.assertEqual([call.args[1]["table_name"] for call in tracker.refresh_table.call_args_list], ["orders"])
+        self.assertEqual(summary, {"checked": 3, "refreshed": {"orders": ["id"]}, "skipped": [], "schema_version": 12})
+        conn.close.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
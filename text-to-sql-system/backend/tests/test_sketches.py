@@ -0,0 +1,111 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from sketches import ColumnSketch, ColumnSketchBuilder, SketchIndex
+
+
+def _sketch(values, kind="integer"):
+    sketch = ColumnSketch(kind)
+    sketch.add(pd.Series(values))
+    return sketch
+
+
+class TestColumnSketch(unittest.TestCase):
+    def test_distinct_estimates(self):
+        rng = np.random.default_rng(0)
+        self.assertEqual(_sketch([1, 2, 2, 3, None]).distinct(), 3)
+        values = rng.integers(0, 200000, size=400000)
+        exact = len(np.unique(values))
+        self.assertAlmostEqual(_sketch(values).distinct() / exact, 1.0, delta=0.05)
+
+    def test_containment(self):
+        keys = _sketch(np.arange(50000))
+        references = _sketch(np.random.default_rng(1).integers(0, 40000, size=100000))
+        unrelated = _sketch(np.arange(100000, 150000))
+        self.assertGreater(references.minhash.containment_in(keys.minhash), 0.95)
+        self.assertEqual(unrelated.minhash.containment_in(keys.minhash), 0.0)
+
+    def test_round_trip(self):
+        sketch = _sketch(["a", " b", "c"], kind="text")
+        restored = ColumnSketch.from_dict(sketch.to_dict())
+        self.assertEqual(restored.kind, "text")
+        self.assertEqual(restored.count, 3)
+        self.assertEqual(restored.distinct(), 3)
+        self.assertTrue(np.array_equal(restored.minhash.mins, sketch.minhash.mins))
+
+    def test_builder_drops_columns_that_change_kind(self):
+        builder = ColumnSketchBuilder()
+        builder.update(pd.DataFrame({"id": [1, 2], "code": ["x", "y"]}), {"id": "INTEGER", "code": "TEXT"})
+        builder.update(pd.DataFrame({"id": [3.5, 4.0], "code": ["z", "w"]}), {"id": "NUMERIC", "code": "TEXT"})
+        sketches = builder.finish({"id": "NUMERIC", "code": "TEXT"})
+        self.assertEqual(list(sketches), ["code"])
+        self.assertEqual(sketches["code"].distinct(), 4)
+
+    def test_upsert_of_existing_keys_keeps_a_key_column_key_like(self):
+        stored = {"id": _sketch(np.arange(1, 5001))}
+        builder = ColumnSketchBuilder()
+        builder.update(pd.DataFrame({"id": np.arange(4001, 6001)}), {"id": "INTEGER"})
+        builder.merge(stored, counts={"id": 6000})
+        sketch = builder.finish({"id": "INTEGER"})["id"]
+        self.assertEqual(sketch.count, 6000)
+        self.assertTrue(sketch.looks_like_key(SketchIndex.MIN_KEY_UNIQUENESS))
+
+
+class TestSketchIndex(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(2)
+        self.index = SketchIndex({
+            "customers": {"id": _sketch(np.arange(1, 5001)), "code": _sketch([f"C{i}" for i in range(5000)], "text")},
+            "orders": {
+                "customer_id": _sketch(rng.integers(1, 4001, size=20000)),
+                "qty": _sketch(rng.integers(1, 50, size=20000)),
+                "customer_code": _sketch([f"C{i}" for i in rng.integers(0, 4000, size=20000)], "text"),
+            },
+        })
+
+    def test_join_candidates_point_at_keys(self):
+        candidates = self.index.join_candidates("orders")
+        pairs = {(c["from_table"], c["from_column"], c["to_table"], c["to_column"]) for c in candidates}
+        self.assertEqual(pairs, {
+            ("orders", "customer_id", "customers", "id"),
+            ("orders", "customer_code", "customers", "code"),
+        })
+        self.assertTrue(all(c["overlap"] >= SketchIndex.MIN_OVERLAP for c in candidates))
+
+    def test_both_tables_see_the_same_relationship(self):
+        self.assertEqual(
+            sorted(self.index.join_candidates("orders"), key=lambda c: c["from_column"]),
+            sorted(self.index.join_candidates("customers"), key=lambda c: c["from_column"]),
+        )
+
+    def test_small_column_against_large_key_is_counted_exactly(self):
+        keys = np.arange(1, 200001)
+        references = np.random.default_rng(3).choice(keys, size=1000, replace=False)
+        index = SketchIndex({
+            "customers": {"id": _sketch(keys)},
+            "orders": {"customer_id": _sketch(np.repeat(references, 3))},
+        })
+        # Too few sampled values are shared to estimate the overlap from the sketches
+        self.assertEqual(index.join_candidates("orders"), [])
+
+        values = {("orders", "customer_id"): set(references.tolist()), ("customers", "id"): set(keys.tolist())}
+        checked = []
+
+        def exact_overlap(from_table, from_col, to_table, to_col):
+            checked.append((from_table, from_col, to_table, to_col))
+            found = values[(from_table, from_col)] & values[(to_table, to_col)]
+            return len(found) / len(values[(from_table, from_col)])
+
+        for table in ("orders", "customers"):
+            candidates = index.join_candidates(table, exact_overlap)
+            self.assertEqual(
+                [(c["from_table"], c["from_column"], c["to_table"], c["to_column"], c["overlap"]) for c in candidates],
+                [("orders", "customer_id", "customers", "id", 1.0)],
+            )
+        self.assertEqual(set(checked), {("orders", "customer_id", "customers", "id")})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,7 @@
 import unittest
 from fastapi import HTTPException
 
-from main import validate_and_prepare_sql
+from main import settings, validate_and_prepare_sql
 
 
 TEST_SCHEMA = {
@@ -42,6 +42,12 @@ class TestSqlSafety(unittest.TestCase):
             with self.assertRaises(HTTPException):
                 validate_and_prepare_sql(sql, TEST_SCHEMA)
 
+    def test_rejects_session_changes(self):
+        # Execution sessions are read-only by default; a query must not switch that off
+        sql = "SELECT set_config('default_transaction_read_only', 'off', false)"
+        with self.assertRaises(HTTPException):
+            validate_and_prepare_sql(sql, TEST_SCHEMA)
+
     def test_rejects_semicolon_and_comments(self):
         bad = [
             'SELECT * FROM "sales_data"; SELECT 1',
@@ -72,11 +78,22 @@ class TestSqlSafety(unittest.TestCase):
         prepared = validate_and_prepare_sql(sql, TEST_SCHEMA)
         self.assertIn('"sales_data"', prepared)
 
+    def test_limit_can_be_raised(self):
+        sql = 'SELECT "region" FROM "sales_data"'
+        prepared = validate_and_prepare_sql(sql, TEST_SCHEMA, limit=1000000)
+        self.assertTrue(prepared.endswith("LIMIT 1000000"))
+
     def test_limit_not_duplicated(self):
         sql = 'SELECT "region" FROM "sales_data" LIMIT 10'
         prepared = validate_and_prepare_sql(sql, TEST_SCHEMA)
         self.assertEqual(prepared.strip().lower().count("limit"), 1)
 
+    def test_limit_in_subquery_keeps_outer_cap(self):
+        sql = ('SELECT * FROM (SELECT "region" FROM "sales_data" ORDER BY "region" LIMIT 10) AS top '
+               'WHERE "region" <> \'limit\'')
+        prepared = validate_and_prepare_sql(sql, TEST_SCHEMA)
+        self.assertTrue(prepared.endswith(f"LIMIT {settings.DEFAULT_QUERY_LIMIT}"))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,92 @@
+import datetime
+import unittest
+from unittest import mock
+
+from sql_stats import SqlStatsEngine
+
+
+class FakeCursor:
+    """
+    Returns queued results in order; statements are recorded but not rendered
+    """
+
+    def __init__(self, results):
+        self.results = list(results)
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        self.statements.append(statement)
+        self.current = self.results.pop(0)
+
+    def fetchone(self):
+        return self.current
+
+    def fetchall(self):
+        return self.current
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self.cursor_obj = cursor
+
+    def cursor(self):
+        return self.cursor_obj
+
+
+COLUMNS_INFO = [
+    {"column_name": "amount", "data_type": "numeric"},
+    {"column_name": "day", "data_type": "date"},
+    {"column_name": "email", "data_type": "text"},
+]
+
+
+class TestSqlStatsEngine(unittest.TestCase):
+    def _engine(self, results, reltuples):
+        engine = SqlStatsEngine(FakeConnection(FakeCursor(results)), exact_max_rows=1000)
+        engine._reltuples = mock.Mock(return_value=reltuples)
+        return engine
+
+    def test_exact_stats_keep_analyzer_shape(self):
+        aggregates = {
+            "total": 100,
+            "c0_count": 90, "c0_distinct": 3, "c0_min": 1, "c0_max": 3, "c0_mean": 2.0,
+            "c0_std": 0.5, "c0_median": 2.0, "c0_integral": True,
+            "c1_count": 100, "c1_distinct": 2, "c1_min": datetime.date(2024, 1, 1), "c1_max": datetime.date(2024, 1, 31),
+            "c2_count": 100, "c2_distinct": 100, "c2_min_length": 7, "c2_max_length": 30,
+        }
+        patterns = {"c2_email": 0.95, "c2_url": 0.0}
+        value_counts = [{"value": 1, "n": 50}, {"value": 2, "n": 40}]
+        engine = self._engine([aggregates, patterns, value_counts], reltuples=100)
+
+        row_count, stats = engine.analyze("t", COLUMNS_INFO)
+
+        self.assertEqual(row_count, 100)
+        self.assertEqual(stats["amount"]["data_type"], "numeric")
+        self.assertEqual(stats["amount"]["null_count"], 10)
+        self.assertEqual(stats["amount"]["value_counts"], {"1": 50, "2": 40})
+        self.assertTrue(stats["amount"]["is_integer"])
+        self.assertEqual(stats["day"], {
+            "data_type": "datetime", "min": "2024-01-01", "max": "2024-01-31", "null_count": 0,
+            "null_percentage": 0.0, "unique_values": 2, "time_span_days": 30,
+        })
+        self.assertTrue(stats["email"]["is_unique"])
+        self.assertTrue(stats["email"]["appears_to_be_email"])
+
+    def test_large_tables_use_reltuples_and_pg_stats(self):
+        aggregates = {"total": 1000, "c0_count": 1000, "c0_distinct": 900, "c0_min_length": 1, "c0_max_length": 5}
+        pg_stats = [{"attname": "code", "null_frac": 0.25, "n_distinct": -0.5}]
+        engine = self._engine([aggregates, pg_stats, {"c0_email": 0.0, "c0_url": 0.0}], reltuples=2000000)
+
+        row_count, stats = engine.analyze("t", [{"column_name": "code", "data_type": "text"}])
+
+        self.assertEqual(row_count, 2000000)
+        self.assertEqual(stats["code"]["null_count"], 500000)
+        self.assertEqual(stats["code"]["unique_values"], 1000000)
+
+    def test_sample_percent(self):
+        self.assertEqual(SqlStatsEngine._sample_percent(1000000, 100000), 10.0)
+        self.assertEqual(SqlStatsEngine._sample_percent(50000, 100000), 100.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
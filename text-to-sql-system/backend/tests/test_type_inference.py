@@ -0,0 +1,77 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from type_inference import ColumnTypeInference, infer_pg_type, widen_pg_type
+
+
+class TestInferPgType(unittest.TestCase):
+    def test_integer_width(self):
+        self.assertEqual(infer_pg_type(pd.Series([1, 2, 300]))[0], "SMALLINT")
+        self.assertEqual(infer_pg_type(pd.Series([1, 70000]))[0], "INTEGER")
+        self.assertEqual(infer_pg_type(pd.Series([1, 2 ** 40]))[0], "BIGINT")
+        # Integral floats only become floats because of missing values
+        self.assertEqual(infer_pg_type(pd.Series([1.0, np.nan, 3.0]))[0], "SMALLINT")
+
+    def test_decimals(self):
+        self.assertEqual(infer_pg_type(pd.Series([19.99, 5.5, np.nan]))[0], "NUMERIC")
+        self.assertEqual(infer_pg_type(pd.Series([3.14159265, 2.718281828]))[0], "FLOAT")
+
+    def test_dates_and_timestamps(self):
+        self.assertEqual(infer_pg_type(pd.Series(["2024-01-31", "2024-02-01", None])), ("DATE", "ISO8601"))
+        self.assertEqual(infer_pg_type(pd.Series(["2024-01-31 10:15:00", "2024-02-01 08:00:00"]))[0], "TIMESTAMP")
+        self.assertEqual(infer_pg_type(pd.Series(["2024-01-31T10:15:00Z"]))[0], "TIMESTAMPTZ")
+        self.assertEqual(infer_pg_type(pd.Series(["01/31/2024", "02/01/2024"])), ("DATE", "%m/%d/%Y"))
+        self.assertEqual(infer_pg_type(pd.Series(["31/01/2024", "01/02/2024"])), ("DATE", "%d/%m/%Y"))
+
+    def test_booleans_and_text(self):
+        self.assertEqual(infer_pg_type(pd.Series(["yes", "No", None]))[0], "BOOLEAN")
+        self.assertEqual(infer_pg_type(pd.Series([True, False]))[0], "BOOLEAN")
+        self.assertEqual(infer_pg_type(pd.Series(["abc", "2024-01-01"]))[0], "TEXT")
+        self.assertEqual(infer_pg_type(pd.Series([np.nan, np.nan]))[0], None)
+
+    def test_widen_pg_type(self):
+        self.assertEqual(widen_pg_type("INTEGER", "INTEGER"), "INTEGER")
+        self.assertEqual(widen_pg_type("SMALLINT", "BIGINT"), "BIGINT")
+        self.assertEqual(widen_pg_type("FLOAT", "INTEGER"), "FLOAT")
+        self.assertEqual(widen_pg_type("DATE", "TIMESTAMP"), "TIMESTAMP")
+        self.assertEqual(widen_pg_type("BOOLEAN", "INTEGER"), "TEXT")
+        self.assertEqual(widen_pg_type("TIMESTAMP", "TEXT"), "TEXT")
+
+
+class TestColumnTypeInference(unittest.TestCase):
+    def test_conform_converts_values(self):
+        inference = ColumnTypeInference()
+        first = pd.DataFrame({"n": [1.0, np.nan], "d": ["2024-01-31", None], "b": ["true", "false"]})
+        inference.infer(first)
+        converted, changes = inference.conform(first)
+        self.assertEqual(changes, {})
+        self.assertEqual(str(converted["n"].dtype), "Int64")
+        self.assertEqual(converted.to_csv(index=False, header=False, na_rep=""), "1,2024-01-31,true\n,,false\n")
+
+    def test_non_iso_dates_are_parsed(self):
+        inference = ColumnTypeInference()
+        frame = pd.DataFrame({"d": ["31/01/2024", "01/02/2024"]})
+        inference.infer(frame)
+        converted, _ = inference.conform(frame)
+        self.assertEqual(converted.to_csv(index=False, header=False), "2024-01-31\n2024-02-01\n")
+
+    def test_later_chunk_widens(self):
+        inference = ColumnTypeInference()
+        inference.infer(pd.DataFrame({"n": [1, 2], "d": ["2024-01-31", "2024-02-01"], "x": [np.nan, np.nan]}))
+        _, changes = inference.conform(pd.DataFrame({
+            "n": [1, 100000],
+            "d": ["2024-03-01 10:00:00", "oops"],
+            "x": [5.0, 6.0],
+        }))
+        self.assertEqual(changes, {"n": "INTEGER", "d": "TEXT", "x": "SMALLINT"})
+
+    def test_existing_types_are_kept(self):
+        inference = ColumnTypeInference()
+        types = inference.infer(pd.DataFrame({"a": [1, 2], "b": ["x", "y"]}), existing_types={"a": "FLOAT"})
+        self.assertEqual(types, {"a": "FLOAT", "b": "TEXT"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,301 @@
+# type_inference.py
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from schema_analyzer import DATE_PATTERN
+
+logger = logging.getLogger(__name__)
+
+# Fallback mapping for dtypes that are not inferred further (e.g. timedelta)
+PG_DTYPE_MAP = {
+    'int64': 'INTEGER',
+    'int32': 'INTEGER',
+    'float64': 'FLOAT',
+    'float32': 'FLOAT',
+    'bool': 'BOOLEAN',
+    'datetime64[ns]': 'TIMESTAMP',
+    'timedelta64[ns]': 'INTERVAL',
+    'object': 'TEXT',
+    'category': 'TEXT'
+}
+
+# format_type() names of existing columns mapped back onto the types used above
+CATALOG_TYPE_MAP = {
+    'smallint': 'SMALLINT',
+    'integer': 'INTEGER',
+    'bigint': 'BIGINT',
+    'numeric': 'NUMERIC',
+    'double precision': 'FLOAT',
+    'real': 'FLOAT',
+    'boolean': 'BOOLEAN',
+    'date': 'DATE',
+    'timestamp without time zone': 'TIMESTAMP',
+    'timestamp with time zone': 'TIMESTAMPTZ',
+    'interval': 'INTERVAL',
+    'text': 'TEXT',
+}
+
+# Types in widening order; types from different chains widen to TEXT
+_NUMERIC_WIDENING = ['SMALLINT', 'INTEGER', 'BIGINT', 'NUMERIC', 'FLOAT']
+_TEMPORAL_WIDENING = ['DATE', 'TIMESTAMP']
+
+INTEGER_RANGES = {
+    'SMALLINT': (-2 ** 15, 2 ** 15 - 1),
+    'INTEGER': (-2 ** 31, 2 ** 31 - 1),
+    'BIGINT': (-2 ** 63, 2 ** 63 - 1),
+}
+
+BOOLEAN_VALUES = {'true': True, 'false': False, 'yes': True, 'no': False}
+
+# Decimal places up to which a float column is stored as exact NUMERIC (prices, rates, ...)
+MAX_NUMERIC_SCALE = 4
+
+_TZ_SUFFIX = re.compile(r"(?:Z|[+-]\d{2}:?\d{2})$")
+
+# Candidate parse formats, tried in order against a sample; ISO8601 covers
+# YYYY-MM-DD with or without a time part and offset
+_DATE_FORMATS = ['%m/%d/%Y', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y']
+DATETIME_FORMATS = ['ISO8601'] + [
+    date_format + time_format
+    for date_format in _DATE_FORMATS
+    for time_format in ('', ' %H:%M', ' %H:%M:%S')
+]
+
+SAMPLE_SIZE = 1000
+
+
+def pg_type_for_dtype(dtype) -> str:
+    return PG_DTYPE_MAP.get(str(dtype), 'TEXT')
+
+
+def pg_type_from_catalog(type_name: str) -> str:
+    if type_name.startswith('numeric'):
+        return 'NUMERIC'
+    return CATALOG_TYPE_MAP.get(type_name, type_name.upper())
+
+
+def widen_pg_type(current: str, incoming: str) -> str:
+    """
+    Return the narrowest PostgreSQL type able to hold values of both types
+    """
+    if current == incoming:
+        return current
+    for chain in (_NUMERIC_WIDENING, _TEMPORAL_WIDENING):
+        if current in chain and incoming in chain:
+            return max(current, incoming, key=chain.index)
+    return 'TEXT'
+
+
+def _wider_types(pg_type: str) -> List[str]:
+    """
+    Types to fall back to, in order, when a chunk does not fit `pg_type`
+    """
+    for chain in (_NUMERIC_WIDENING, _TEMPORAL_WIDENING):
+        if pg_type in chain:
+            return chain[chain.index(pg_type) + 1:] + ['TEXT']
+    return [] if pg_type == 'TEXT' else ['TEXT']
+
+
+def _integer_type(values: pd.Series) -> Optional[str]:
+    low, high = values.min(), values.max()
+    for pg_type, (type_low, type_high) in INTEGER_RANGES.items():
+        if low >= type_low and high <= type_high:
+            return pg_type
+    return None
+
+
+def _is_integral(values: pd.Series) -> bool:
+    return bool((values == np.floor(values)).all())
+
+
+def _has_small_scale(values: pd.Series) -> bool:
+    if not np.isfinite(values).all():
+        return False
+    return bool(np.allclose(values, values.round(MAX_NUMERIC_SCALE), rtol=0, atol=1e-9))
+
+
+def detect_datetime_format(values: pd.Series) -> Optional[str]:
+    """
+    First candidate format that parses every value of a string sample, or None
+    """
+    sample = values.dropna().astype(str).str.strip().head(SAMPLE_SIZE)
+    if sample.empty or not sample.str.match(DATE_PATTERN).all():
+        return None
+    for fmt in DATETIME_FORMATS:
+        parsed = pd.to_datetime(sample, format=fmt, errors='coerce', utc=True)
+        if parsed.notna().all():
+            return fmt
+    return None
+
+
+def infer_pg_type(series: pd.Series) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Guess the PostgreSQL type of a column from its values.
+    Returns (pg_type, datetime_format); pg_type is None when the column holds no values yet.
+    Numeric and boolean dtypes are inspected in full; string columns from a sample.
+    """
+    values = series.dropna()
+    if values.empty:
+        return None, None
+
+    kind = series.dtype.kind
+    if kind == 'b':
+        return 'BOOLEAN', None
+    if kind in 'iu':
+        return _integer_type(values) or 'NUMERIC', None
+    if kind == 'f':
+        if _is_integral(values):
+            integer_type = _integer_type(values)
+            if integer_type:
+                return integer_type, None
+        return ('NUMERIC' if _has_small_scale(values) else 'FLOAT'), None
+    if kind == 'M':
+        if getattr(series.dtype, 'tz', None) is not None:
+            return 'TIMESTAMPTZ', None
+        return ('DATE' if (values == values.dt.normalize()).all() else 'TIMESTAMP'), None
+    if kind != 'O':
+        return pg_type_for_dtype(series.dtype), None
+
+    sample = values.head(SAMPLE_SIZE).astype(str).str.strip()
+    if sample.str.lower().isin(BOOLEAN_VALUES.keys()).all():
+        return 'BOOLEAN', None
+
+    fmt = detect_datetime_format(sample)
+    if fmt:
+        if sample.str.contains(_TZ_SUFFIX).any():
+            return 'TIMESTAMPTZ', fmt
+        parsed = pd.to_datetime(sample, format=fmt)
+        return ('DATE' if (parsed == parsed.dt.normalize()).all() else 'TIMESTAMP'), fmt
+    return 'TEXT', None
+
+
+def _numeric_values(series: pd.Series) -> Optional[pd.Series]:
+    if series.dtype.kind in 'iuf':
+        return series
+    if series.dtype.kind == 'b':
+        return None
+    numbers = pd.to_numeric(series, errors='coerce')
+    if (numbers.isna() & series.notna()).any():
+        return None
+    return numbers
+
+
+def convert_series(series: pd.Series, pg_type: str, datetime_format: Optional[str] = None) -> Optional[pd.Series]:
+    """
+    Convert a chunk column to the representation COPY expects for `pg_type`,
+    or return None if any non-null value does not fit the type
+    """
+    if pg_type in INTEGER_RANGES:
+        numbers = _numeric_values(series)
+        if numbers is None:
+            return None
+        values = numbers.dropna()
+        if not values.empty:
+            type_low, type_high = INTEGER_RANGES[pg_type]
+            if not _is_integral(values) or values.min() < type_low or values.max() > type_high:
+                return None
+        return numbers.astype('Int64')
+
+    if pg_type in ('NUMERIC', 'FLOAT'):
+        return _numeric_values(series)
+
+    if pg_type == 'BOOLEAN':
+        if series.dtype.kind == 'b':
+            return series
+        present = series.notna()
+        mapped = series[present].astype(str).str.strip().str.lower().map(BOOLEAN_VALUES)
+        if mapped.isna().any():
+            return None
+        # PostgreSQL reads true/false/yes/no itself, so validated values are sent unchanged
+        return series
+
+    if pg_type in ('DATE', 'TIMESTAMP', 'TIMESTAMPTZ'):
+        utc = pg_type == 'TIMESTAMPTZ'
+        fmt = None
+        if series.dtype.kind == 'M':
+            parsed = series
+        else:
+            fmt = datetime_format or detect_datetime_format(series)
+            if fmt is None and series.notna().any():
+                return None
+            parsed = pd.to_datetime(series, format=fmt, errors='coerce', utc=utc)
+            if (parsed.isna() & series.notna()).any():
+                return None
+        # Mixed offsets parse to objects; offsets only belong in TIMESTAMPTZ columns
+        if parsed.dtype.kind != 'M' or (not utc and getattr(parsed.dtype, 'tz', None) is not None):
+            return None
+        if pg_type == 'DATE' and not (parsed.dropna() == parsed.dropna().dt.normalize()).all():
+            return None
+        # ISO 8601 input is read natively whatever the DateStyle; other layouts
+        # (e.g. DD/MM/YYYY) are sent as parsed datetimes
+        return series if fmt == 'ISO8601' else parsed
+
+    # TEXT and types that are passed through for PostgreSQL to parse
+    return series
+
+
+class ColumnTypeInference:
+    """
+    Tracks the PostgreSQL type of every column of a chunked CSV load.
+    The first chunk decides the types; each later chunk is validated against them
+    in full and columns are widened when a chunk does not fit.
+    """
+
+    def __init__(self):
+        self.column_types: Dict[str, str] = {}
+        self.datetime_formats: Dict[str, Optional[str]] = {}
+        # Columns that have only seen NULLs so far; created as TEXT until a value arrives
+        self._untyped: set = set()
+
+    def infer(self, df: pd.DataFrame, existing_types: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """
+        Decide column types from the first chunk; types of `existing_types` are kept as-is
+        """
+        existing_types = existing_types or {}
+        for col in df.columns:
+            if col in existing_types:
+                self.column_types[col] = existing_types[col]
+                continue
+            pg_type, fmt = infer_pg_type(df[col])
+            if pg_type is None:
+                self._untyped.add(col)
+                pg_type = 'TEXT'
+            self.column_types[col] = pg_type
+            self.datetime_formats[col] = fmt
+        logger.info(f"Inferred column types: {self.column_types}")
+        return dict(self.column_types)
+
+    def conform(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, str]]:
+        """
+        Convert a chunk to the tracked types.
+        Returns the converted frame and {column: new_type} for columns whose type changed.
+        """
+        converted = {}
+        changes = {}
+        for col in df.columns:
+            series = df[col]
+            pg_type = self.column_types[col]
+            fmt = self.datetime_formats.get(col)
+
+            if col in self._untyped and series.notna().any():
+                pg_type, fmt = infer_pg_type(series)
+                self._untyped.discard(col)
+
+            result = convert_series(series, pg_type, fmt)
+            if result is None:
+                for wider in _wider_types(pg_type):
+                    result = convert_series(series, wider)
+                    if result is not None:
+                        pg_type, fmt = wider, None
+                        break
+
+            if pg_type != self.column_types[col]:
+                changes[col] = pg_type
+                self.column_types[col] = pg_type
+                self.datetime_formats[col] = fmt
+            converted[col] = result
+        return pd.DataFrame(converted, index=df.index), changes